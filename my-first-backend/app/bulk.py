@@ -0,0 +1,123 @@
+import json
+import sqlite3
+from typing import Sequence
+
+from pydantic import BaseModel, ValidationError
+
+from app.config import settings
+from app.schemas.user import BulkItemResult, BulkResult
+
+
+def parse_bulk_body(body: bytes, content_type: str = "") -> list:
+    """
+    解析批量导入请求体
+
+    - application/json：JSON 数组
+    - application/x-ndjson：每行一个 JSON 对象，空行忽略
+
+    :raises ValueError: 请求体格式不合法或超过 bulk_max_rows
+    """
+    try:
+        if "ndjson" in content_type or "jsonlines" in content_type:
+            items = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            items = json.loads(body or b"[]")
+    except ValueError as e:
+        raise ValueError(f"请求体不是合法的 JSON/NDJSON: {e}") from e
+    if not isinstance(items, list):
+        raise ValueError("请求体必须是 JSON 数组或 NDJSON")
+    if len(items) > settings.bulk_max_rows:
+        raise ValueError(f"单次最多导入 {settings.bulk_max_rows} 条")
+    return items
+
+
+def _format_validation_error(e: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(x) for x in err['loc']) or 'row'}: {err['msg']}" for err in e.errors()
+    )
+
+
+def validate_bulk(items: list, model: type[BaseModel]) -> tuple[list[tuple[int, dict]], list[BulkItemResult]]:
+    """
+    逐行校验，返回 (合法行 [(下标, 数据)], 校验失败的结果)
+    """
+    valid = []
+    errors = []
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, model.model_validate(item).model_dump()))
+        except ValidationError as e:
+            errors.append(BulkItemResult(index=index, error=_format_validation_error(e)))
+    return valid, errors
+
+
+def bulk_insert(conn, insert_sql: str, param_rows: Sequence[tuple]) -> list[tuple[int | None, str | None]]:
+    """
+    在当前事务中批量插入，返回每行的 (新主键, 冲突原因)
+
+    先用 executemany 一次写入；若有约束冲突则回滚这一步，
+    改为逐行插入（每行一个 SAVEPOINT）以定位冲突行，其余行照常写入。
+    需要在写线程（run_write）中调用，由写线程统一提交。
+    """
+    if not param_rows:
+        return []
+    cur = conn.cursor()
+    conn.execute("SAVEPOINT bulk_insert")
+    try:
+        cur.executemany(insert_sql, param_rows)
+    except sqlite3.IntegrityError:
+        conn.execute("ROLLBACK TO bulk_insert")
+        conn.execute("RELEASE bulk_insert")
+    else:
+        # 单写线程 + AUTOINCREMENT：同一事务内连续插入的主键是连续的
+        last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        conn.execute("RELEASE bulk_insert")
+        first_id = last_id - len(param_rows) + 1
+        return [(first_id + i, None) for i in range(len(param_rows))]
+
+    results = []
+    for params in param_rows:
+        conn.execute("SAVEPOINT bulk_row")
+        try:
+            cur.execute(insert_sql, params)
+        except sqlite3.IntegrityError as e:
+            conn.execute("ROLLBACK TO bulk_row")
+            results.append((None, str(e)))
+        else:
+            results.append((cur.lastrowid, None))
+        conn.execute("RELEASE bulk_row")
+    return results
+
+
+def merge_bulk_results(
+    valid: list[tuple[int, dict]],
+    outcomes: list[tuple[int | None, str | None]],
+    errors: list[BulkItemResult],
+) -> BulkResult:
+    # 合并校验失败与写入结果，按原始下标排序
+    rows = list(errors)
+    for (index, _), (new_id, error) in zip(valid, outcomes):
+        rows.append(BulkItemResult(index=index, id=new_id, error=error))
+    rows.sort(key=lambda r: r.index)
+    created = sum(1 for r in rows if r.id is not None)
+    return BulkResult(created=created, failed=len(rows) - created, rows=rows)
+
+
+def bulk_openapi_extra(schema_name: str) -> dict:
+    # 批量接口直接读取原始请求体，这里补充 OpenAPI 文档
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {
+                        "type": "array",
+                        "items": {"$ref": f"#/components/schemas/{schema_name}"},
+                    }
+                },
+                "application/x-ndjson": {
+                    "schema": {"type": "string", "description": f"每行一个 {schema_name} JSON 对象"}
+                },
+            },
+        }
+    }
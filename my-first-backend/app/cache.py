@@ -0,0 +1,163 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+_MISSING = object()
+
+# 已命名的缓存，用于统一输出统计（见 cache_stats）
+_registry: dict[str, "TTLCache"] = {}
+_registry_lock = threading.Lock()
+
+
+class TTLCache:
+    """
+    线程安全的有界缓存：LRU 淘汰 + 过期时间
+
+    :param maxsize: 最大条目数，超出后淘汰最久未使用的条目
+    :param ttl: 默认过期时间（秒）
+    :param name: 缓存名称；指定后注册到 cache_stats() 的输出中
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0, name: str | None = None):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self.name = name
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        # 每次失效 +1；回源期间发生过失效时不回填，避免把旧数据写回缓存
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0  # 容量满时按 LRU 淘汰的条目数
+        self.expirations = 0  # 过期被清除的条目数
+        if name:
+            with _registry_lock:
+                _registry[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = item
+            if expires_at <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._store(key, value, expires_at)
+
+    def _store(self, key: Hashable, value: Any, expires_at: float) -> None:
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        读穿透：命中直接返回，否则调用 loader() 回源并写入缓存
+
+        loader 返回 None（记录不存在）时不缓存，新建的记录能立即查到。
+        回源不持有锁，并发未命中时可能重复回源，但不会阻塞其他 key 的读取。
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        with self._lock:
+            generation = self._generation
+        value = loader()
+        if value is not None:
+            expires_at = time.monotonic() + self.ttl
+            with self._lock:
+                if generation == self._generation:
+                    self._store(key, value, expires_at)
+        return value
+
+    def get_many_or_load(
+        self, keys: list, loader: Callable[[list], dict[Hashable, Any]]
+    ) -> dict[Hashable, Any]:
+        """
+        批量读穿透：命中的直接返回，未命中的 key 一次交给 loader(keys) 回源
+
+        :param loader: 接收未命中的 key 列表，返回 {key: value}，不存在的 key 不出现在结果中
+        :return: {key: value}，不存在的 key 不出现在结果中
+        """
+        found = {}
+        missing = []
+        for key in keys:
+            value = self.get(key, _MISSING)
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        if not missing:
+            return found
+        with self._lock:
+            generation = self._generation
+        loaded = loader(missing)
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            if generation == self._generation:
+                for key, value in loaded.items():
+                    self._store(key, value, expires_at)
+        found.update(loaded)
+        return found
+
+    def invalidate(self, key: Hashable) -> None:
+        # 写入后调用：删除条目，并让正在回源的旧数据不再回填
+        with self._lock:
+            self._generation += 1
+            self._data.pop(key, None)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, _MISSING)
+        return default if item is _MISSING else item[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+def cache_stats() -> dict[str, dict]:
+    # 所有已命名缓存的统计
+    with _registry_lock:
+        caches = list(_registry.items())
+    return {name: cache.stats() for name, cache in caches}
+
+
+def clear_caches() -> None:
+    # 清空所有已命名缓存（切换数据库文件时调用）
+    with _registry_lock:
+        caches = list(_registry.values())
+    for cache in caches:
+        cache.clear()
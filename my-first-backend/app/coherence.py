@@ -0,0 +1,180 @@
+import logging
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Callable
+
+from app import db
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 每张表保留的本进程写入区间数上限；丢弃的区间对应的变化按其他进程的写入处理（整表清空）
+_MAX_LOCAL_RANGES = 1024
+
+# 表名 -> 该表数据变化时要执行的回调（通常是清空相关缓存）
+_listeners: dict[str, list[Callable[[], None]]] = defaultdict(list)
+
+
+def on_table_change(table: str, callback: Callable[[], None]) -> None:
+    # 注册回调：其他进程（或本进程）修改了该表后调用
+    _listeners[table].append(callback)
+
+
+class VersionWatcher:
+    """
+    多进程（多个 uvicorn worker）间的缓存一致性检查
+
+    - 专用连接上执行 PRAGMA data_version：只要有其他连接提交过事务，返回值就会变化，
+      没有变化时一条 PRAGMA 即可确认缓存有效
+    - 变化时再读 table_versions（触发器在增删改时 +1），只通知版本号变化的表
+    - 本进程的写入在提交时记录版本号区间（note_local_write），这些写入已按主键失效缓存；
+      版本变化全部来自本进程时不整表清空，否则写入频繁时缓存几乎总被清空
+    - 检查按 interval 节流，缓存最多落后 interval 秒
+    """
+
+    def __init__(self, db_path, interval: float):
+        self.db_path = db_path
+        self.interval = interval
+        self._conn: sqlite3.Connection | None = None
+        self._data_version: int | None = None
+        self._versions: dict[str, int] = {}
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        # 表名 -> {写入前版本号: 写入后版本号}，本进程提交的写入
+        self._local: dict[str, dict[int, int]] = defaultdict(dict)
+        self._local_lock = threading.Lock()
+        self.checks = 0
+        self.invalidations = 0
+        self.local_skips = 0  # 只有本进程写入、未整表清空的次数
+
+    def check(self) -> None:
+        if time.monotonic() < self._next_check:
+            return
+        # 其他线程正在检查时直接跳过，不排队等待
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._next_check = time.monotonic() + self.interval
+            self._check()
+        except sqlite3.Error as e:
+            logger.warning(f"缓存版本检查失败，下次重连: {e}")
+            self._close_conn()
+        finally:
+            self._lock.release()
+
+    def _check(self) -> None:
+        if self._conn is None:
+            self._conn = db.connect(self.db_path)
+        self.checks += 1
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return
+        self._data_version = data_version
+
+        versions = read_versions(self._conn)
+        changed = [t for t, v in versions.items() if self._versions.get(t) != v]
+        previous, self._versions = self._versions, versions
+        for table in changed:
+            if self._only_local(table, previous.get(table), versions[table]):
+                self.local_skips += 1
+                continue
+            self.invalidations += 1
+            for callback in _listeners.get(table, ()):
+                callback()
+
+    def note_local_write(self, before: dict[str, int], after: dict[str, int]) -> None:
+        """
+        记录本进程提交的写入：before / after 为同一写事务（持有写锁）内开始和提交前的表版本号
+        """
+        with self._local_lock:
+            for table, version in after.items():
+                start = before.get(table, version)
+                if version == start:
+                    continue
+                ranges = self._local[table]
+                ranges[start] = version
+                # 只写不读的 worker 很少触发 check()，在这里同样清理：
+                # 早于上次检查时版本号的区间已不会再用到，其余按写入顺序只保留最近的 _MAX_LOCAL_RANGES 个
+                observed = self._versions.get(table)
+                if observed is not None:
+                    for old in [old for old in ranges if old < observed]:
+                        del ranges[old]
+                while len(ranges) > _MAX_LOCAL_RANGES:
+                    del ranges[next(iter(ranges))]
+
+    def _only_local(self, table: str, old: int | None, new: int) -> bool:
+        # (old, new] 之间的版本号是否全部由本进程的写入产生
+        with self._local_lock:
+            ranges = self._local.get(table)
+            if not ranges or old is None:
+                return False
+            current = old
+            while current != new and current in ranges:
+                current = ranges[current]
+            # 已检查过的区间不再需要
+            for start in [start for start in ranges if start < new]:
+                del ranges[start]
+            return current == new
+
+    def _close_conn(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_conn()
+
+    def stats(self) -> dict:
+        return {
+            "interval": self.interval,
+            "checks": self.checks,
+            "invalidations": self.invalidations,
+            "local_skips": self.local_skips,
+            "versions": dict(self._versions),
+        }
+
+
+_watcher: VersionWatcher | None = None
+_watcher_lock = threading.Lock()
+
+
+def get_watcher() -> VersionWatcher:
+    # 懒加载；DB_PATH 变化时重建
+    global _watcher
+    watcher = _watcher
+    if watcher is not None and watcher.db_path == db.DB_PATH:
+        return watcher
+    with _watcher_lock:
+        if _watcher is None or _watcher.db_path != db.DB_PATH:
+            if _watcher is not None:
+                _watcher.close()
+            _watcher = VersionWatcher(db.DB_PATH, settings.cache_coherence_interval)
+        return _watcher
+
+
+def close_watcher() -> None:
+    global _watcher
+    with _watcher_lock:
+        if _watcher is not None:
+            _watcher.close()
+            _watcher = None
+
+
+def read_versions(conn: sqlite3.Connection) -> dict[str, int]:
+    # 各表当前的版本号
+    return dict(conn.execute("SELECT table_name, version FROM table_versions"))
+
+
+def note_local_write(before: dict[str, int], after: dict[str, int]) -> None:
+    # 写事务提交后调用，见 VersionWatcher.note_local_write
+    if settings.cache_coherence_enabled:
+        get_watcher().note_local_write(before, after)
+
+
+def check_versions() -> None:
+    # 读缓存前调用；未到检查间隔时只做一次时间比较
+    if settings.cache_coherence_enabled:
+        get_watcher().check()
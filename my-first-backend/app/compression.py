@@ -0,0 +1,194 @@
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Content-Encoding -> zlib wbits：31 为 gzip 格式，15 为 zlib 格式（HTTP 的 deflate）
+_WBITS = {"gzip": 31, "deflate": 15}
+
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    """
+    按 Accept-Encoding 选择压缩算法：q 值最高者优先，相同时优先 gzip；q=0 表示不接受
+
+    :return: "gzip" / "deflate"，都不接受时返回 None
+    """
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name.strip()] = q
+    best, best_q = None, 0.0
+    for name in _WBITS:
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def encode_etag(etag: str, encoding: str) -> str:
+    """
+    压缩后的强 ETag 加上编码后缀（'"x"' -> '"x-gzip"'）：强校验器必须随内容编码不同而不同；
+    弱 ETag 原样返回
+    """
+    if len(etag) >= 2 and etag.startswith('"') and etag.endswith('"'):
+        return f'{etag[:-1]}-{encoding}"'
+    return etag
+
+
+def decode_etag(etag: str) -> str:
+    # 去掉 encode_etag 添加的编码后缀，得到未压缩表示的 ETag
+    for encoding in _WBITS:
+        suffix = f'-{encoding}"'
+        if etag.endswith(suffix):
+            return f'{etag[: -len(suffix)]}"'
+    return etag
+
+
+class CompressionMiddleware:
+    """
+    响应压缩中间件（纯 ASGI，最多缓冲 minimum_size 字节）
+
+    先缓冲响应体，达到 minimum_size 或响应结束时再决定是否压缩：
+    - 结束时不足 minimum_size：原样发送
+    - 结束时已全部缓冲：一次压缩，并改写 Content-Length
+    - 超过 minimum_size 仍未结束（流式导出等）：去掉 Content-Length，逐段压缩
+    - text/event-stream：不缓冲，每段以 Z_SYNC_FLUSH 结束，客户端收到即可解压出完整事件，
+      不增加推送延迟
+    已设置 Content-Encoding 或 Content-Type 不在 content_types 中的响应原样发送。
+    压缩时强 ETag 加上编码后缀（见 encode_etag）；304 响应沿用客户端 If-None-Match 中的形式。
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        level: int = 6,
+        content_types: tuple[str, ...] = ("application/json",),
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+        self.content_types = frozenset(content_types)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressionResponder(send, encoding, self, Headers(scope=scope))
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    # 单个请求的压缩状态
+
+    def __init__(self, send: Send, encoding: str, options: CompressionMiddleware, request_headers: Headers):
+        self._send = send
+        self.encoding = encoding
+        self.options = options
+        self.request_headers = request_headers
+        self.start: Message | None = None
+        self.media_type = ""
+        self.buffer = bytearray()
+        self.compressor = None
+        self.flush_mode = zlib.Z_NO_FLUSH
+        self.passthrough = False
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            # 先暂存，等响应体到达后再决定是否压缩
+            self.start = message
+            headers = Headers(raw=message.get("headers", []))
+            self.media_type = headers.get("content-type", "").split(";", 1)[0].strip().lower()
+            self.passthrough = (
+                "content-encoding" in headers or self.media_type not in self.options.content_types
+            )
+            if message.get("status") == 304 and "etag" in headers:
+                self._not_modified_etag()
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._flush_start()
+            await self._send(message)
+            return
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is not None:
+            await self._send_chunk(body, more_body)
+            return
+
+        # 经过其他中间件后完整响应也可能被拆成多段，先攒到 minimum_size 再决定；
+        # SSE 不等待，第一个事件就开始压缩
+        self.buffer += body
+        if self.media_type == "text/event-stream":
+            await self._begin_stream(more_body)
+        elif not more_body:
+            if len(self.buffer) < self.options.minimum_size:
+                self.passthrough = True
+                await self._flush_start()
+                await self._send({"type": "http.response.body", "body": bytes(self.buffer)})
+            else:
+                await self._send_whole()
+        elif len(self.buffer) >= self.options.minimum_size:
+            await self._begin_stream(more_body)
+
+    async def _flush_start(self) -> None:
+        if self.start is not None:
+            start, self.start = self.start, None
+            await self._send(start)
+
+    def _not_modified_etag(self) -> None:
+        # 304 没有响应体，无法判断完整响应是否会被压缩：客户端缓存的是压缩表示时返回同样的 ETag
+        headers = MutableHeaders(scope=self.start)
+        encoded = encode_etag(headers["etag"], self.encoding)
+        if encoded in self.request_headers.get("if-none-match", ""):
+            headers["ETag"] = encoded
+        headers.add_vary_header("Accept-Encoding")
+
+    def _start_compression(self) -> MutableHeaders:
+        self.compressor = zlib.compressobj(self.options.level, zlib.DEFLATED, _WBITS[self.encoding])
+        headers = MutableHeaders(scope=self.start)
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        if "etag" in headers:
+            headers["ETag"] = encode_etag(headers["etag"], self.encoding)
+        return headers
+
+    async def _send_whole(self) -> None:
+        # 完整响应：一次压缩，改写 Content-Length
+        headers = self._start_compression()
+        data = self.compressor.compress(bytes(self.buffer)) + self.compressor.flush()
+        headers["Content-Length"] = str(len(data))
+        await self._flush_start()
+        await self._send({"type": "http.response.body", "body": data, "more_body": False})
+
+    async def _begin_stream(self, more_body: bool) -> None:
+        # 流式响应：总长度未知，逐段压缩
+        headers = self._start_compression()
+        if "content-length" in headers:
+            del headers["Content-Length"]
+        if self.media_type == "text/event-stream":
+            self.flush_mode = zlib.Z_SYNC_FLUSH
+        await self._flush_start()
+        body, self.buffer = bytes(self.buffer), bytearray()
+        await self._send_chunk(body, more_body)
+
+    async def _send_chunk(self, body: bytes, more_body: bool) -> None:
+        data = self.compressor.compress(body)
+        if not more_body:
+            data += self.compressor.flush()
+        elif self.flush_mode != zlib.Z_NO_FLUSH:
+            data += self.compressor.flush(self.flush_mode)
+        # Z_NO_FLUSH 时压缩器可能暂不输出，空段不发送
+        if data or not more_body:
+            await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
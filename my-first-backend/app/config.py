@@ -1,11 +1,33 @@
 from pydantic_settings import BaseSettings
 from pathlib import Path
+from typing import Any, Literal
 
 class Settings(BaseSettings):
     """应用配置"""
     # 数据库配置
     db_path: str = str(Path(__file__).parent.parent / "clinic.db")
-    
+
+    # 连接池配置
+    db_pool_size: int = 8  # 最大连接数
+    db_pool_timeout: float = 10.0  # 等待空闲连接的超时时间（秒）
+    db_pool_max_lifetime: int = 1800  # 连接最长存活时间（秒），超过后回收重建
+    db_pool_pre_ping: bool = True  # 取出连接时先做健康检查
+    db_pool_wait_warn_ms: int = 100  # 等待连接超过该耗时（毫秒）记录告警，0 表示不记录
+    db_executor_workers: int = 8  # 数据库线程池大小（async 路由的阻塞 IO 在这里执行），建议与连接池大小一致
+
+    # 存储性能配置（每个连接建立时统一应用）
+    db_journal_mode: Literal["WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY"] = "WAL"
+    db_synchronous: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"  # WAL 下 NORMAL 足够安全
+    db_cache_size: int = -16000  # 页缓存大小，负数表示 KiB
+    db_mmap_size: int = 128 * 1024 * 1024  # 内存映射读取大小（字节），0 表示关闭
+    db_temp_store: Literal["DEFAULT", "FILE", "MEMORY"] = "MEMORY"
+    db_busy_timeout: int = 5000  # 遇到写锁时的等待时间（毫秒）
+
+    # 单写线程配置（组提交）
+    db_writer_enabled: bool = True  # 关闭后写操作直接在连接池连接上提交
+    db_writer_batch_size: int = 64  # 每次提交最多合并的写操作数
+    db_writer_batch_wait_ms: float = 0  # 凑批等待窗口（毫秒），0 表示只合并已排队的操作
+
     # API 配置
     api_title: str = "Clinic Management API"
     api_version: str = "1.0.0"
@@ -18,6 +40,73 @@ class Settings(BaseSettings):
     # 分页配置
     default_page_size: int = 10
     max_page_size: int = 100
+    # 列表总数模式：exact 精确 / approx 带筛选时使用短期缓存 / none 不返回总数
+    page_total_mode: Literal["exact", "approx", "none"] = "exact"
+    count_cache_ttl: float = 5.0  # 带筛选条件总数的缓存时间（秒）
+    count_cache_size: int = 1024  # 缓存的筛选组合数量上限
+
+    # 单条记录缓存（get_*_by_id 读穿透，update/delete 时失效）
+    entity_cache_enabled: bool = True
+    entity_cache_size: int = 4096  # 每张表缓存的记录数上限
+    entity_cache_ttl: float = 30.0  # 记录缓存时间（秒）
+    # 多 worker 缓存一致性：按 PRAGMA data_version + 表版本号检测其他进程的写入，
+    # 表有变化时清空该表的缓存；检查间隔即缓存最多落后的时间
+    cache_coherence_enabled: bool = True
+    cache_coherence_interval: float = 0.2  # 检查间隔（秒）
+
+    # 批量导入配置
+    bulk_max_rows: int = 100_000  # 单次批量导入的最大行数
+
+    # 增量同步配置（GET /{entity}/changes）
+    changes_page_size: int = 500  # 默认每次返回的变更条数
+    changes_max_page_size: int = 5000
+
+    # 导出配置
+    export_batch_size: int = 1000  # 流式导出每次从游标读取的行数
+
+    # 聊天流 delta 合并：窗口内连续的 delta 合并为一帧，减少小帧的分帧、系统调用和代理开销；
+    # tool / final / error 前立即发送已合并的内容
+    chat_coalesce_window_ms: float = 0  # 合并窗口（毫秒），从缓冲第一个 delta 开始计时；0 表示不合并
+    chat_coalesce_max_bytes: int = 0  # 已缓冲内容达到该字节数（UTF-8）时立即发送，0 表示不限
+    # 按业务场景覆盖，如 {"mobile_consult": {"window_ms": 80, "max_bytes": 2048}}；请求参数优先
+    chat_coalesce_scenarios: dict[str, dict[str, float]] = {}
+
+    # 聊天流保活与断开检测
+    chat_ping_interval: float = 15.0  # 超过该秒数没有输出时发送 ping 事件，0 表示不发送
+    chat_disconnect_poll_interval: float = 0.5  # 检查客户端是否断开的间隔（秒）
+
+    # 聊天模型后端（OpenAI 兼容的流式接口），按 ChatRequest.model_id 选择；未配置的 model_id 返回 error 事件
+    # 如 {1: {"base_url": "http://llm:8000/v1", "model": "qwen2.5-72b-instruct", "api_key": "", "max_concurrency": 32}}
+    # 可选项：max_concurrency（同时生成数上限，连接池大小与之一致）、queue_timeout、extra_body，以及下面的超时设置
+    chat_backends: dict[int, dict[str, Any]] = {}
+    chat_prompts: dict[int, str] = {}  # prompt_id -> 系统提示词
+    # 未配置任何后端（chat_backends 为空）时所有 model_id 使用模拟输出（固定的示例回答），并记录警告；
+    # 配置了后端后，未配置的 model_id 返回 error 事件。开启本项则未配置的 model_id 也使用模拟输出，生产环境不要开启
+    chat_dev_mock_backend: bool = False
+    chat_backend_connect_timeout: float = 5.0  # 建立连接的超时时间（秒）
+    chat_backend_read_timeout: float = 60.0  # 两次收到数据之间的最长间隔（秒）
+    chat_backend_keepalive_expiry: float = 30.0  # 空闲连接保留时间（秒），期间的请求复用连接
+
+    # 聊天流断线续传（GET /chat/{request_id}/resume，按 Last-Event-ID 回放）
+    chat_resume_buffer_size: int = 1024  # 每个流缓冲的帧数，更早的帧无法回放
+    chat_resume_ttl: float = 300.0  # 生成结束后缓冲保留的时间（秒）
+    chat_resume_max_streams: int = 1024  # 已结束的流保留数量上限，超出后淘汰最久未访问的（生成中的流不受限）
+    # 所有连接断开后继续生成的时间（秒），期间重连可续传；超时无人重连则停止生成，0 表示立即停止
+    chat_resume_grace_seconds: float = 15.0
+
+    # 响应压缩（按 Accept-Encoding 选择 gzip / deflate）
+    compression_enabled: bool = True
+    compression_minimum_size: int = 1024  # 小于该大小（字节）的完整响应不压缩；流式响应总是压缩
+    compression_level: int = 6  # zlib 压缩级别 1-9，越大压缩率越高、CPU 开销越大
+    # 只压缩这些 Content-Type（不含参数），图片等已压缩的内容不再压缩
+    compression_types: tuple[str, ...] = (
+        "application/json",
+        "application/x-ndjson",
+        "text/csv",
+        "text/plain",
+        "text/html",
+        "text/event-stream",
+    )
     
     class Config:
         env_file = ".env"
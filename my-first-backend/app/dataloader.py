@@ -0,0 +1,32 @@
+from typing import Callable, Generic, Hashable, Iterable, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class DataLoader(Generic[K, V]):
+    """
+    请求级批量加载器，用于展开关联数据时避免 N+1 查询
+
+    收集要加载的 key，去重后一次交给 batch_fn 批量查询（如 WHERE id IN (...)），
+    同一 key 在一次请求内只查一次。每个请求新建一个实例，结果不跨请求共享。
+
+    :param batch_fn: 接收 key 列表，返回 {key: value}；不存在的 key 不出现在结果中
+    """
+
+    def __init__(self, batch_fn: Callable[[list[K]], dict[K, V]]):
+        self._batch_fn = batch_fn
+        self._results: dict[K, Optional[V]] = {}
+
+    def load_many(self, keys: Iterable[Optional[K]]) -> list[Optional[V]]:
+        # 返回与 keys 一一对应的结果；key 为 None 或记录不存在时为 None
+        keys = list(keys)
+        pending = [k for k in dict.fromkeys(keys) if k is not None and k not in self._results]
+        if pending:
+            loaded = self._batch_fn(pending)
+            for key in pending:
+                self._results[key] = loaded.get(key)
+        return [self._results.get(k) if k is not None else None for k in keys]
+
+    def load(self, key: Optional[K]) -> Optional[V]:
+        return self.load_many([key])[0]
@@ -1,20 +1,414 @@
+import asyncio
+import functools
+import logging
 import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+from app.cache import clear_caches
+from app.config import settings
+from app.search import ensure_fts_tables
+
+logger = logging.getLogger(__name__)
+
 # 数据库文件路径：指向项目根目录下的 clinic.db
 DB_PATH = Path(__file__).resolve().parent.parent / "clinic.db"
 
 
-def get_connection():
-    # 建立 SQLite 连接
-    conn = sqlite3.connect(DB_PATH)
+# SQLite 3.35+ 支持 INSERT/UPDATE ... RETURNING，写入后不必再回查一次
+SUPPORTS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+
+class PoolTimeoutError(sqlite3.OperationalError):
+    """等待连接池空闲连接超时"""
+
+
+def _apply_storage_profile(conn: sqlite3.Connection) -> None:
+    # 连接级别的存储参数（journal_mode 是持久化的库级设置，在 init_db 中设置）
+    conn.execute(f"PRAGMA busy_timeout = {int(settings.db_busy_timeout)}")
+    conn.execute(f"PRAGMA synchronous = {settings.db_synchronous}")
+    conn.execute(f"PRAGMA cache_size = {int(settings.db_cache_size)}")
+    conn.execute(f"PRAGMA mmap_size = {int(settings.db_mmap_size)}")
+    conn.execute(f"PRAGMA temp_store = {settings.db_temp_store}")
+
+
+def execute_returning(cur, sql: str, params, table: str, row_id=None, returning: str = "*"):
+    """
+    执行单行 INSERT/UPDATE 并返回写入后的整行
+
+    - SQLite 3.35+：追加 RETURNING *，一条语句完成写入和读取
+    - 旧版本：执行后按主键回查（INSERT 用 lastrowid，UPDATE 用传入的 row_id）
+
+    :param returning: 返回的列，默认整行
+    :return: 游标 row_factory 构造的行；UPDATE 未命中任何行时返回 None
+    """
+    if SUPPORTS_RETURNING:
+        # fetchall 让语句执行完毕并复位，避免在事务中残留未完成的语句
+        rows = cur.execute(f"{sql} RETURNING {returning}", params).fetchall()
+        return rows[0] if rows else None
+
+    cur.execute(sql, params)
+    if cur.rowcount == 0:
+        return None
+    cur.execute(f"SELECT {returning} FROM {table} WHERE id = ?", (row_id or cur.lastrowid,))
+    return cur.fetchone()
+
+
+def connect(db_path=None) -> sqlite3.Connection:
+    # 建立 SQLite 连接（不经过连接池）
+    # 连接会在线程池的不同线程间复用，因此关闭同线程检查
+    conn = sqlite3.connect(
+        db_path or DB_PATH,
+        timeout=settings.db_busy_timeout / 1000,
+        check_same_thread=False,
+    )
     # 将查询结果映射成字典样式，便于序列化
     conn.row_factory = sqlite3.Row
     # SQLite 默认不启用外键，这里显式开启
     conn.execute("PRAGMA foreign_keys = ON")
+    _apply_storage_profile(conn)
     return conn
 
 
+class _PoolRecord:
+    """连接池内部记录：真实连接 + 生命周期信息"""
+
+    __slots__ = ("conn", "created_at", "refcount", "owner")
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.refcount = 0
+        self.owner = None
+
+
+class PooledConnection:
+    """
+    连接池借出的连接代理
+
+    用法与 sqlite3.Connection 一致，close() 会把连接归还给连接池而不是真正关闭，
+    重复 close() 是安全的。
+
+    也可用作上下文管理器，退出时归还连接：
+
+        with get_connection() as conn:
+            conn.execute(...)
+
+    同一线程嵌套借出时拿到的是同一个连接，因此只有持有最后一个引用的 with（最外层）
+    才像 sqlite3.Connection 一样正常退出时提交、异常时回滚；内层 with 不结束外层调用方的事务。
+    归还后不能再使用，与已关闭的 sqlite3.Connection 一样抛出 ProgrammingError。
+    """
+
+    __slots__ = ("_pool", "_record", "_closed")
+
+    def __init__(self, pool: "ConnectionPool", record: _PoolRecord):
+        self._pool = pool
+        self._record = record
+        self._closed = False
+
+    def __getattr__(self, name):
+        # 已归还的连接可能正被其他线程使用，不能再转发
+        if self._closed:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed connection.")
+        return getattr(self._record.conn, name)
+
+    # with 语句在类型上查找 __enter__/__exit__，不会经过 __getattr__，需要显式定义
+    def __enter__(self) -> "PooledConnection":
+        if self._closed:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed connection.")
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        try:
+            if self._record.refcount == 1:
+                # 最后一个引用：提交或回滚交给原始连接处理
+                return self._record.conn.__exit__(exc_type, exc, tb)
+            return False
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._pool._release(self._record)
+
+
+class ConnectionPool:
+    """
+    有界 SQLite 连接池
+
+    - 按线程借出：同一线程内嵌套调用 get_connection() 会拿到同一个连接（引用计数）
+    - 健康检查：取出空闲连接时执行 SELECT 1，失效则丢弃重建
+    - 生命周期回收：连接存活超过 max_lifetime 秒后关闭重建
+    """
+
+    def __init__(
+        self,
+        db_path,
+        size: int,
+        timeout: float,
+        max_lifetime: int,
+        pre_ping: bool = True,
+        wait_warn_ms: int = 0,
+    ):
+        self.db_path = db_path
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.pre_ping = pre_ping
+        self.wait_warn_ms = wait_warn_ms
+
+        self._cond = threading.Condition()
+        self._idle: deque[_PoolRecord] = deque()
+        # 线程ID -> 该线程当前持有的连接
+        self._held: dict[int, _PoolRecord] = {}
+        self._open = 0
+        self._closed = False
+
+        # 统计指标
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_total_ms = 0.0
+        self._wait_max_ms = 0.0
+        self._timeouts = 0
+        self._recycled = 0
+        self._ping_failures = 0
+
+    def acquire(self) -> PooledConnection:
+        tid = threading.get_ident()
+        with self._cond:
+            if self._closed:
+                raise sqlite3.ProgrammingError("connection pool is closed")
+            record = self._held.get(tid)
+            if record is not None:
+                # 同一线程重入：复用已借出的连接
+                record.refcount += 1
+                return PooledConnection(self, record)
+
+        record = self._checkout()
+        with self._cond:
+            record.refcount = 1
+            record.owner = tid
+            self._held[tid] = record
+            self._checkouts += 1
+        return PooledConnection(self, record)
+
+    def _checkout(self) -> _PoolRecord:
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        while True:
+            record = None
+            create = False
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise sqlite3.ProgrammingError("connection pool is closed")
+                    if self._idle:
+                        record = self._idle.pop()
+                        break
+                    if self._open < self.size:
+                        # 先占位，真正建连放到锁外
+                        self._open += 1
+                        create = True
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(
+                            f"timed out after {self.timeout}s waiting for a database connection"
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+
+            if create:
+                try:
+                    record = _PoolRecord(connect(self.db_path))
+                except Exception:
+                    with self._cond:
+                        self._open -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_usable(record):
+                self._discard(record)
+                continue
+
+            if waited:
+                self._record_wait((time.monotonic() - start) * 1000)
+            return record
+
+    def _is_usable(self, record: _PoolRecord) -> bool:
+        # 超过最长存活时间的连接直接回收
+        if self.max_lifetime and time.monotonic() - record.created_at > self.max_lifetime:
+            with self._cond:
+                self._recycled += 1
+            return False
+        if self.pre_ping:
+            try:
+                record.conn.execute("SELECT 1")
+            except sqlite3.Error:
+                with self._cond:
+                    self._ping_failures += 1
+                return False
+        return True
+
+    def _record_wait(self, wait_ms: float) -> None:
+        with self._cond:
+            self._waits += 1
+            self._wait_total_ms += wait_ms
+            self._wait_max_ms = max(self._wait_max_ms, wait_ms)
+        if self.wait_warn_ms and wait_ms >= self.wait_warn_ms:
+            logger.warning(f"等待数据库连接耗时 {wait_ms:.1f}ms (pool size={self.size})")
+
+    def _discard(self, record: _PoolRecord) -> None:
+        try:
+            record.conn.close()
+        except sqlite3.Error:
+            pass
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+    def _release(self, record: _PoolRecord) -> None:
+        with self._cond:
+            record.refcount -= 1
+            if record.refcount > 0:
+                return
+            self._held.pop(record.owner, None)
+            record.owner = None
+
+        # 与直接 close() 的语义保持一致：未提交的事务被丢弃
+        try:
+            if record.conn.in_transaction:
+                record.conn.rollback()
+        except sqlite3.Error:
+            self._discard(record)
+            return
+
+        expired = (
+            self.max_lifetime
+            and time.monotonic() - record.created_at > self.max_lifetime
+        )
+        if self._closed or expired:
+            if expired:
+                with self._cond:
+                    self._recycled += 1
+            self._discard(record)
+            return
+        with self._cond:
+            self._idle.append(record)
+            self._cond.notify()
+
+    def close(self) -> None:
+        # 关闭所有空闲连接；借出中的连接在归还时关闭
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+        for record in idle:
+            self._discard(record)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self.size,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self._open - len(self._idle),
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_avg_ms": round(self._wait_total_ms / self._waits, 3) if self._waits else 0.0,
+                "wait_max_ms": round(self._wait_max_ms, 3),
+                "timeouts": self._timeouts,
+                "recycled": self._recycled,
+                "ping_failures": self._ping_failures,
+            }
+
+
+_pool: ConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    # 懒加载连接池；DB_PATH 变化（如测试切换临时库）时重建
+    global _pool
+    pool = _pool
+    if pool is not None and pool.db_path == DB_PATH:
+        return pool
+    with _pool_lock:
+        if _pool is None or _pool.db_path != DB_PATH:
+            if _pool is not None:
+                _pool.close()
+            # 换了数据库文件，之前缓存的查询结果都不再有效
+            clear_caches()
+            _pool = ConnectionPool(
+                DB_PATH,
+                size=settings.db_pool_size,
+                timeout=settings.db_pool_timeout,
+                max_lifetime=settings.db_pool_max_lifetime,
+                pre_ping=settings.db_pool_pre_ping,
+                wait_warn_ms=settings.db_pool_wait_warn_ms,
+            )
+        return _pool
+
+
+def close_pool() -> None:
+    # 应用关闭时释放所有连接
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+        clear_caches()
+
+
+def get_connection():
+    # 从连接池借出连接，用完后调用 close() 归还
+    return get_pool().acquire()
+
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    # 数据库专用线程池：阻塞的 sqlite 调用都在这里执行，不占用请求线程池
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.db_executor_workers,
+                    thread_name_prefix="db",
+                )
+    return _executor
+
+
+def close_db_executor() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+async def run_in_db(fn, *args, **kwargs):
+    """
+    异步数据访问入口：在数据库线程池中执行同步的仓储/服务函数
+
+    :param fn: 同步函数，如 doctor_repo.get_doctor_by_id 或 get_doctor_by_id_service
+    :return: fn 的返回值（异常原样抛出）
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_db_executor(), functools.partial(fn, *args, **kwargs)
+    )
+
+
 def _get_user_version(conn: sqlite3.Connection) -> int:
     # 读取数据库的迁移版本号
     cur = conn.cursor()
@@ -105,10 +499,152 @@ def _migration_2(conn:sqlite3.Connection) -> None:
         "CREATE UNIQUE INDEX IF NOT EXISTS idx_users_phone_unique ON users(phone)"
     )
 
+def _set_journal_mode(conn: sqlite3.Connection) -> None:
+    # WAL 模式下读写互不阻塞；journal_mode 会持久化到数据库文件
+    mode = conn.execute(f"PRAGMA journal_mode = {settings.db_journal_mode}").fetchone()[0]
+    if mode.upper() != settings.db_journal_mode:
+        logger.warning(f"journal_mode 设置为 {settings.db_journal_mode} 失败，当前为 {mode}")
+
+
+# 维护行数的表：列表接口的无筛选总数直接读计数表，不再 COUNT(1) 全表扫描
+COUNTED_TABLES = ("users", "doctors", "patients")
+
+
+def _migration_3(conn: sqlite3.Connection) -> None:
+    # 版本3：行数计数表 + 触发器维护
+    cur = conn.cursor()
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS table_counts (
+            table_name TEXT PRIMARY KEY,
+            row_count INTEGER NOT NULL
+        )
+        """
+    )
+    for table in COUNTED_TABLES:
+        # 用现有数据初始化计数
+        cur.execute(
+            f"INSERT OR REPLACE INTO table_counts (table_name, row_count) "
+            f"SELECT '{table}', COUNT(1) FROM {table}"
+        )
+        cur.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_count_insert AFTER INSERT ON {table}
+            BEGIN
+                UPDATE table_counts SET row_count = row_count + 1 WHERE table_name = '{table}';
+            END
+            """
+        )
+        cur.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_count_delete AFTER DELETE ON {table}
+            BEGIN
+                UPDATE table_counts SET row_count = row_count - 1 WHERE table_name = '{table}';
+            END
+            """
+        )
+
+
+def _migration_4(conn: sqlite3.Connection) -> None:
+    # 版本4：医生列表按科室/职称筛选的索引（带 id 便于按主键倒序分页）
+    cur = conn.cursor()
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_doctors_department ON doctors(department, id)"
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_doctors_title ON doctors(title, id)")
+
+
+def _migration_5(conn: sqlite3.Connection) -> None:
+    # 版本5：FTS5 全文检索表（trigram 分词，支持中文子串检索）
+    # SQLite < 3.34 不支持 trigram 时跳过建表，检索回退到 LIKE；之后每次启动由 init_db 重试
+    ensure_fts_tables(conn)
+
+
+def _migration_6(conn: sqlite3.Connection) -> None:
+    # 版本6：表版本号，增删改时 +1，供多进程间判断缓存是否过期（见 app/coherence.py）
+    cur = conn.cursor()
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS table_versions (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+        """
+    )
+    for table in COUNTED_TABLES:
+        cur.execute(
+            "INSERT OR IGNORE INTO table_versions (table_name, version) VALUES (?, 0)", (table,)
+        )
+        for event, name in (("INSERT", "insert"), ("UPDATE", "update"), ("DELETE", "delete")):
+            cur.execute(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{name} AFTER {event} ON {table}
+                BEGIN
+                    UPDATE table_versions SET version = version + 1 WHERE table_name = '{table}';
+                END
+                """
+            )
+
+
+def _migration_7(conn: sqlite3.Connection) -> None:
+    # 版本7：行版本号，每次 UPDATE +1，用于 ETag 和 If-Match 乐观并发控制
+    cur = conn.cursor()
+    for table in COUNTED_TABLES:
+        columns = {row[1] for row in cur.execute(f"PRAGMA table_info({table})")}
+        if "row_version" not in columns:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN row_version INTEGER NOT NULL DEFAULT 1")
+
+
+def _migration_8(conn: sqlite3.Connection) -> None:
+    # 版本8：updated_at + 变更日志（删除保留墓碑），供 GET /{entity}/changes 增量同步
+    cur = conn.cursor()
+    # AUTOINCREMENT 保证 seq 只增不减，删除日志后也不会复用
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            changed_at TEXT NOT NULL
+        )
+        """
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_change_log_row ON change_log(table_name, row_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_change_log_seq ON change_log(table_name, seq)")
+    for table in COUNTED_TABLES:
+        columns = {row[1] for row in cur.execute(f"PRAGMA table_info({table})")}
+        if "updated_at" not in columns:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN updated_at TEXT")
+            cur.execute(f"UPDATE {table} SET updated_at = created_at")
+        # 现有数据各记一条 insert，客户端从 since=0 开始同步能拿到全量
+        cur.execute(
+            f"INSERT INTO change_log (table_name, row_id, op, changed_at) "
+            f"SELECT '{table}', id, 'insert', updated_at FROM {table} ORDER BY id"
+        )
+        # 每行只保留最新一条日志：日志大小与变更过的行数有关，与写入次数无关
+        for event, name, ref in (
+            ("INSERT", "insert", "new"),
+            ("UPDATE", "update", "new"),
+            ("DELETE", "delete", "old"),
+        ):
+            cur.execute(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_changes_{name} AFTER {event} ON {table}
+                BEGIN
+                    DELETE FROM change_log WHERE table_name = '{table}' AND row_id = {ref}.id;
+                    INSERT INTO change_log (table_name, row_id, op, changed_at)
+                    VALUES ('{table}', {ref}.id, '{name}', strftime('%Y-%m-%dT%H:%M:%f', 'now'));
+                END
+                """
+            )
+
+
 def init_db():
     # 初始化数据库（按版本执行迁移）
     conn = get_connection()
     try:
+        _set_journal_mode(conn)
         version = _get_user_version(conn)
         if version < 1:
             _migration_1(conn)
@@ -116,6 +652,27 @@ def init_db():
         if version < 2:
             _migration_2(conn)
             _set_user_version(conn, 2)
+        if version < 3:
+            _migration_3(conn)
+            _set_user_version(conn, 3)
+        if version < 4:
+            _migration_4(conn)
+            _set_user_version(conn, 4)
+        if version < 5:
+            _migration_5(conn)
+            _set_user_version(conn, 5)
+        if version < 6:
+            _migration_6(conn)
+            _set_user_version(conn, 6)
+        if version < 7:
+            _migration_7(conn)
+            _set_user_version(conn, 7)
+        if version < 8:
+            _migration_8(conn)
+            _set_user_version(conn, 8)
+        if version >= 5:
+            # 版本5 的迁移可能因 SQLite 不支持 trigram 跳过了建表，升级 SQLite 后在这里补建
+            ensure_fts_tables(conn)
         conn.commit()
     finally:
         conn.close()
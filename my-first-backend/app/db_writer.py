@@ -0,0 +1,226 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable
+
+from app import db
+from app.coherence import note_local_write, read_versions
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 写操作：接收写连接，返回结果；不要在函数内部 commit
+WriteOp = Callable[..., Any]
+
+_STOP = object()
+
+
+class WriteQueue:
+    """
+    单写线程 + 组提交
+
+    所有写操作放入队列，由唯一的写线程按批执行：
+    每个操作包在 SAVEPOINT 中（失败只回滚自己），整批只 COMMIT 一次。
+    调用方拿到 Future，提交成功后才会得到结果。
+    """
+
+    def __init__(self, db_path, batch_size: int = 64, batch_wait_ms: float = 0):
+        self.db_path = db_path
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = max(0.0, batch_wait_ms) / 1000
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._started = False
+        self._lock = threading.Lock()
+
+        # 统计指标
+        self._batches = 0
+        self._ops = 0
+        self._failed_batches = 0
+
+    def submit(self, fn: WriteOp, *args, **kwargs) -> Future:
+        future: Future = Future()
+        with self._lock:
+            if not self._started:
+                self._thread.start()
+                self._started = True
+        self._queue.put((fn, args, kwargs, future))
+        return future
+
+    def in_writer_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def _run(self) -> None:
+        conn = db.connect(self.db_path)
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _STOP:
+                    break
+                batch = [item]
+                stop = self._fill_batch(batch)
+                self._execute(conn, batch)
+                if stop:
+                    break
+        finally:
+            conn.close()
+
+    def _fill_batch(self, batch: list) -> bool:
+        # 先取走队列里已经排队的写操作，必要时再等待一个很短的窗口
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return True
+            batch.append(item)
+        return False
+
+    def _execute(self, conn: sqlite3.Connection, batch: list) -> None:
+        # 已被调用方取消的操作直接跳过
+        batch = [item for item in batch if item[3].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            before = _local_versions(conn)
+            for fn, args, kwargs, future in batch:
+                conn.execute("SAVEPOINT write_op")
+                try:
+                    result = fn(conn, *args, **kwargs)
+                except Exception as exc:
+                    # 只回滚当前操作，不影响同批次的其他写入
+                    conn.execute("ROLLBACK TO write_op")
+                    conn.execute("RELEASE write_op")
+                    results.append((future, None, exc))
+                else:
+                    conn.execute("RELEASE write_op")
+                    results.append((future, result, None))
+            after = _local_versions(conn)
+            conn.commit()
+            if before is not None:
+                note_local_write(before, after)
+        except Exception as exc:
+            # 整批提交失败：该批次所有操作都返回该异常
+            self._failed_batches += 1
+            logger.error(f"批量写入提交失败: {str(exc)}", exc_info=True)
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                pass
+            results = [(future, None, exc) for _, _, _, future in batch]
+
+        self._batches += 1
+        self._ops += len(batch)
+        for future, result, exc in results:
+            if exc is not None:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+
+    def close(self, timeout: float | None = 5.0) -> None:
+        # 处理完已排队的写操作后退出
+        with self._lock:
+            started = self._started
+        if started:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "batches": self._batches,
+            "ops": self._ops,
+            "avg_batch_size": round(self._ops / self._batches, 2) if self._batches else 0.0,
+            "failed_batches": self._failed_batches,
+        }
+
+
+_writer: WriteQueue | None = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> WriteQueue:
+    # 懒加载写线程；DB_PATH 变化时重建
+    global _writer
+    writer = _writer
+    if writer is not None and writer.db_path == db.DB_PATH:
+        return writer
+    with _writer_lock:
+        if _writer is None or _writer.db_path != db.DB_PATH:
+            if _writer is not None:
+                _writer.close()
+            _writer = WriteQueue(
+                db.DB_PATH,
+                batch_size=settings.db_writer_batch_size,
+                batch_wait_ms=settings.db_writer_batch_wait_ms,
+            )
+        return _writer
+
+
+def close_writer() -> None:
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
+            _writer = None
+
+
+def submit_write(fn: WriteOp, *args, **kwargs) -> Future:
+    """
+    提交写操作，返回 Future
+
+    :param fn: 形如 fn(conn, *args, **kwargs) 的写函数，不要在内部 commit
+    """
+    if not settings.db_writer_enabled:
+        future: Future = Future()
+        try:
+            future.set_result(_run_direct(fn, *args, **kwargs))
+        except Exception as exc:
+            future.set_exception(exc)
+        return future
+    return get_writer().submit(fn, *args, **kwargs)
+
+
+def run_write(fn: WriteOp, *args, **kwargs):
+    # 同步等待写操作提交完成并返回结果（异常原样抛出）
+    writer = _writer
+    if writer is not None and writer.in_writer_thread():
+        # 写线程等待自己会死锁，嵌套写入应直接使用传入的 conn
+        raise RuntimeError("run_write() called inside a write op; use the conn passed in")
+    return submit_write(fn, *args, **kwargs).result()
+
+
+def _local_versions(conn: sqlite3.Connection) -> dict[str, int] | None:
+    # 写事务内的表版本号，提交后用于区分本进程的写入（见 app/coherence.py）
+    return read_versions(conn) if settings.cache_coherence_enabled else None
+
+
+def _run_direct(fn: WriteOp, *args, **kwargs):
+    # 关闭单写线程时：在连接池连接上直接执行并提交
+    conn = db.get_connection()
+    try:
+        # 立即获取写锁，事务开始时读到的版本号之后只有本事务的写入
+        conn.execute("BEGIN IMMEDIATE")
+        before = _local_versions(conn)
+        result = fn(conn, *args, **kwargs)
+        after = _local_versions(conn)
+        conn.commit()
+        if before is not None:
+            note_local_write(before, after)
+        return result
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
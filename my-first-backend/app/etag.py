@@ -0,0 +1,126 @@
+import hashlib
+
+from fastapi import Request, Response
+
+from app.compression import decode_etag
+from app.db import get_connection, run_in_db
+from app.responses import api_response
+from app.schemas.user import ApiResponse, BusinessCode, ErrorCode
+
+# 单条记录：表名 + 主键 + 行版本号（每次 UPDATE +1）
+# 列表：表名 + 表版本号（增删改 +1，见 table_versions）+ 路径与查询参数摘要
+
+
+def entity_etag(table: str, row) -> str:
+    return f'"{table}-{row.id}-{row.row_version}"'
+
+
+def table_versions(tables: tuple[str, ...]) -> list[int]:
+    conn = get_connection()
+    try:
+        rows = dict(
+            conn.execute(
+                f"SELECT table_name, version FROM table_versions "
+                f"WHERE table_name IN ({', '.join('?' * len(tables))})",
+                tables,
+            ).fetchall()
+        )
+        return [rows.get(t, 0) for t in tables]
+    finally:
+        conn.close()
+
+
+def table_version(table: str) -> int:
+    return table_versions((table,))[0]
+
+
+async def list_etag(request: Request, table: str, *related: str) -> str:
+    """
+    表版本号不变且路径、查询参数相同时响应体相同
+
+    :param related: 响应中还包含了哪些表的数据（如 expand 展开的关联记录）
+
+    先取版本号再查数据，期间有写入时 ETag 只会偏旧，下次请求会拿到完整响应。
+    """
+    versions = await run_in_db(table_versions, (table, *related))
+    query = sorted(request.query_params.multi_items())
+    digest = hashlib.sha1(repr((request.url.path, query, versions[1:])).encode()).hexdigest()[:16]
+    return f'"{table}-v{versions[0]}-{digest}"'
+
+
+def _parse_etags(header: str) -> list[str]:
+    # 压缩响应的 ETag 带有编码后缀（见 app/compression.py），比较前去掉
+    return [decode_etag(tag.strip()) for tag in header.split(",") if tag.strip()]
+
+
+def if_none_match(request: Request, etag: str) -> bool:
+    # If-None-Match 使用弱比较：忽略 W/ 前缀
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.removeprefix("W/") for tag in _parse_etags(header)]
+    return "*" in tags or etag in tags
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+
+def conditional_get(request: Request, result: ApiResponse, table: str) -> Response:
+    """
+    单条记录的条件 GET：ETag 与 If-None-Match 一致时返回 304，不再序列化响应体
+    """
+    if result.data is None:
+        return api_response(result)
+    etag = entity_etag(table, result.data)
+    if if_none_match(request, etag):
+        return not_modified(etag)
+    return api_response(result, headers={"ETag": etag})
+
+
+async def check_list_etag(request: Request, table: str, *related: str) -> tuple[str, Response | None]:
+    """
+    列表的条件 GET：命中时返回 (etag, 304 响应)，调用方不再查询数据；否则返回 (etag, None)
+    """
+    etag = await list_etag(request, table, *related)
+    if if_none_match(request, etag):
+        return etag, not_modified(etag)
+    return etag, None
+
+
+def list_response(result: ApiResponse, etag: str) -> Response:
+    # 列表 ETag 只附在成功的响应上：参数错误等响应不能被客户端按 ETag 缓存并换来 304
+    if result.code == BusinessCode.SUCCESS:
+        return api_response(result, headers={"ETag": etag})
+    return api_response(result)
+
+
+def parse_if_match(header: str | None, table: str, row_id: int) -> int | None:
+    """
+    解析 PUT 的 If-Match，返回期望的行版本号
+
+    - 未提供或为 *：不做版本检查，返回 None
+    - If-Match 使用强比较：弱 ETag 或不是该记录的 ETag 永远不匹配，返回 -1
+    - 压缩表示的 ETag（带编码后缀）与未压缩的对应同一行版本，同样接受
+    """
+    if not header:
+        return None
+    tags = _parse_etags(header)
+    if "*" in tags:
+        return None
+    prefix = f'"{table}-{row_id}-'
+    for tag in tags:
+        if tag.startswith(prefix) and tag.endswith('"'):
+            version = tag[len(prefix) : -1]
+            if version.isdigit():
+                return int(version)
+    return -1
+
+
+def apply_write_etag(result: ApiResponse, table: str) -> Response:
+    # 写入成功后返回新的 ETag；If-Match 不一致时返回 HTTP 412
+    if result.code == ErrorCode.PRECONDITION_FAILED:
+        return api_response(result, status_code=412)
+    if result.data is not None:
+        return api_response(result, headers={"ETag": entity_etag(table, result.data)})
+    return api_response(result)
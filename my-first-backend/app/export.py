@@ -0,0 +1,77 @@
+import asyncio
+import csv
+import io
+import json
+from typing import AsyncGenerator, Callable, Iterator, Sequence
+
+from app.config import settings
+from app.db import run_in_db
+
+# 导出格式 -> 响应 Content-Type
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",  # Starlette 会自动补上 charset=utf-8
+}
+
+
+def _encode_ndjson(rows) -> bytes:
+    return "".join(
+        json.dumps(dict(row), ensure_ascii=False, separators=(",", ":")) + "\n" for row in rows
+    ).encode()
+
+
+class _CsvEncoder:
+    """按批次编码 CSV；BOM 和表头（便于 Excel 正确识别中文）由 header() 单独输出"""
+
+    def __init__(self, columns: Sequence[str]):
+        self.columns = columns
+
+    def header(self) -> bytes:
+        buf = io.StringIO()
+        buf.write("\ufeff")
+        csv.writer(buf).writerow(self.columns)
+        return buf.getvalue().encode()
+
+    def __call__(self, rows) -> bytes:
+        buf = io.StringIO()
+        csv.writer(buf).writerows(tuple(row) for row in rows)
+        return buf.getvalue().encode()
+
+
+async def stream_export(
+    iter_batches: Callable[[int], Iterator[list]], fmt: str, columns: Sequence[str]
+) -> AsyncGenerator[bytes, None]:
+    """
+    流式导出：逐批从游标读取并编码
+
+    每一批的读取都在数据库线程池中执行，内存占用只与 export_batch_size 有关，
+    与导出的总行数无关。
+
+    :param iter_batches: 仓储层的批量迭代函数，如 patient_repo.iter_patients
+    :param fmt: ndjson / csv
+    :param columns: 导出的列名（与 iter_batches 的列顺序一致），CSV 表头使用；空表也输出表头
+    """
+    if fmt == "csv":
+        encode = _CsvEncoder(columns)
+        yield encode.header()
+    else:
+        encode = _encode_ndjson
+    batches = iter_batches(settings.export_batch_size)
+    pending = None
+    try:
+        while True:
+            # shield：请求被取消时读取仍在线程中进行，由 finally 等它结束
+            pending = asyncio.ensure_future(run_in_db(next, batches, None))
+            rows = await asyncio.shield(pending)
+            if rows is None:
+                break
+            yield encode(rows)
+    finally:
+        # 客户端中途断开时也要释放游标和连接；生成器正在线程中执行时不能关闭，先等这一批读完
+        if pending is not None and not pending.done():
+            await asyncio.wait([pending])
+        await run_in_db(batches.close)
+
+
+def export_headers(name: str, fmt: str) -> dict:
+    return {"Content-Disposition": f'attachment; filename="{name}.{fmt}"'}
@@ -0,0 +1,244 @@
+import abc
+import asyncio
+import json
+import logging
+from typing import Any, AsyncIterator, Callable
+
+from app.config import settings
+from app.schemas.chat import ChatRequest, Delta, FinalData
+
+logger = logging.getLogger(__name__)
+
+
+class BackendError(Exception):
+    """模型后端调用失败（上游返回错误、排队超时等）"""
+
+
+class LLMBackend(abc.ABC):
+    """
+    模型后端接口：把一次聊天请求转换为 (事件类型, 数据) 序列
+
+    事件与 SSE 协议一致：delta 的数据为 Delta，tool / final 为 dict；SSE 编码、合并、
+    保活由调用方统一处理。子类实现 _events()。
+
+    :param max_concurrency: 同时进行的生成数上限，超出的请求排队；0 表示不限
+    :param queue_timeout: 排队等待的最长时间（秒），超时抛出 BackendError
+    """
+
+    def __init__(self, max_concurrency: int = 0, queue_timeout: float = 30.0):
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+        self.active = 0  # 进行中的生成数
+
+    async def stream(self, request: ChatRequest) -> AsyncIterator[tuple[str, Any]]:
+        # 生成期间（包括客户端断开前）一直占用并发名额，结束或取消后释放
+        if self._semaphore is not None:
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise BackendError(f"模型后端繁忙，排队超过 {self.queue_timeout}s") from None
+        self.active += 1
+        try:
+            async for event in self._events(request):
+                yield event
+        finally:
+            self.active -= 1
+            if self._semaphore is not None:
+                self._semaphore.release()
+
+    @abc.abstractmethod
+    def _events(self, request: ChatRequest) -> AsyncIterator[tuple[str, Any]]:
+        """产生一次生成的事件（并发控制由 stream() 负责）"""
+
+    async def aclose(self) -> None:
+        """释放连接等资源"""
+
+
+class MockBackend(LLMBackend):
+    """
+    本地模拟后端：不访问网络，按 events(request) 产生事件，用于开发和测试
+
+    :param events: 产生 (事件类型, 数据) 的异步生成器函数
+    """
+
+    def __init__(self, events: Callable[[ChatRequest], AsyncIterator[tuple[str, Any]]], **kwargs):
+        super().__init__(**kwargs)
+        self.events = events
+
+    def _events(self, request: ChatRequest) -> AsyncIterator[tuple[str, Any]]:
+        return self.events(request)
+
+
+async def parse_openai_stream(lines: AsyncIterator[str]) -> AsyncIterator[tuple[str, Any]]:
+    """
+    解析 OpenAI 兼容的 /chat/completions 流式响应（SSE 行）
+
+    - choices[0].delta.content -> delta.content
+    - choices[0].delta.reasoning_content（推理模型的思考过程）-> delta.thinking_content
+    - choices[0].delta.tool_calls 原样放入 delta.tool_calls
+    - 流结束后产生 final（汇总的文本）；[DONE] 之后的数据忽略
+
+    读到 [DONE] 后仍读完响应体：提前关闭未读完的响应会断开连接，连接池无法复用。
+    """
+    text: list[str] = []
+    done = False
+    async for line in lines:
+        if done or not line.startswith("data:"):
+            # 空行、注释（: keep-alive）、event: 等
+            continue
+        payload = line[5:].strip()
+        if payload == "[DONE]":
+            done = True
+            continue
+        chunk = json.loads(payload)
+        if chunk.get("error"):
+            raise BackendError(f"模型后端返回错误: {chunk['error']}")
+        choices = chunk.get("choices") or ()
+        if not choices:
+            continue
+        delta = choices[0].get("delta") or {}
+        content = delta.get("content") or ""
+        thinking = delta.get("reasoning_content") or ""
+        tool_calls = delta.get("tool_calls")
+        if content or thinking or tool_calls:
+            text.append(content)
+            yield "delta", Delta(content, thinking, tool_calls)
+    yield "final", FinalData(result_type="text", text="".join(text)).model_dump()
+
+
+class OpenAIBackend(LLMBackend):
+    """
+    OpenAI 兼容接口（vLLM / Ollama / 各云厂商兼容模式等）的流式 HTTP 后端
+
+    使用一个长期复用的 httpx.AsyncClient：连接保持 keep-alive 并在请求间复用，
+    避免每次聊天都做 TCP / TLS 握手；连接数上限与并发上限一致。httpx 在首次请求时才导入。
+
+    :param base_url: 接口地址，如 http://llm:8000/v1
+    :param model: 请求中的 model 名称
+    :param api_key: Bearer 令牌，不需要鉴权时为空
+    :param extra_body: 合并到请求体的其他参数，如 {"temperature": 0.3}
+    :param transport: 自定义 httpx 传输层（如测试中的 httpx.MockTransport），默认使用连接池
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        model: str,
+        api_key: str = "",
+        max_concurrency: int = 16,
+        queue_timeout: float = 30.0,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 60.0,
+        keepalive_expiry: float = 30.0,
+        extra_body: dict[str, Any] | None = None,
+        transport: Any = None,
+    ):
+        super().__init__(max_concurrency=max_concurrency, queue_timeout=queue_timeout)
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.api_key = api_key
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.keepalive_expiry = keepalive_expiry
+        self.extra_body = extra_body or {}
+        self.transport = transport
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            import httpx
+
+            connections = self.max_concurrency or None
+            headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=headers,
+                limits=httpx.Limits(
+                    max_connections=connections,
+                    max_keepalive_connections=connections,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+                # read 为两次收到数据之间的最长间隔，不是整个生成的时长
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                transport=self.transport,
+            )
+        return self._client
+
+    def _messages(self, request: ChatRequest) -> list[dict[str, str]]:
+        messages = []
+        prompt = settings.chat_prompts.get(request.prompt_id)
+        if prompt:
+            messages.append({"role": "system", "content": prompt})
+        messages.append({"role": "user", "content": request.user_input})
+        return messages
+
+    async def _events(self, request: ChatRequest) -> AsyncIterator[tuple[str, Any]]:
+        body = {
+            **self.extra_body,
+            "model": self.model,
+            "messages": self._messages(request),
+            "stream": True,
+        }
+        client = self._get_client()
+        async with client.stream("POST", "/chat/completions", json=body) as response:
+            if response.status_code != 200:
+                detail = (await response.aread())[:500].decode(errors="replace")
+                raise BackendError(f"模型后端返回 HTTP {response.status_code}: {detail}")
+            async for event in parse_openai_stream(response.aiter_lines()):
+                yield event
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            client, self._client = self._client, None
+            await client.aclose()
+
+
+# model_id -> 后端；首次使用时按 settings.chat_backends 创建
+_backends: dict[int, LLMBackend] | None = None
+
+
+def _load_backends() -> dict[int, LLMBackend]:
+    backends: dict[int, LLMBackend] = {}
+    for model_id, options in settings.chat_backends.items():
+        options = {
+            "connect_timeout": settings.chat_backend_connect_timeout,
+            "read_timeout": settings.chat_backend_read_timeout,
+            "keepalive_expiry": settings.chat_backend_keepalive_expiry,
+            **options,
+        }
+        backends[int(model_id)] = OpenAIBackend(**options)
+    return backends
+
+
+def get_backend(model_id: int) -> LLMBackend | None:
+    """
+    按 model_id 获取后端，未配置时返回 None
+    """
+    global _backends
+    if _backends is None:
+        _backends = _load_backends()
+    return _backends.get(model_id)
+
+
+def register_backend(model_id: int, backend: LLMBackend) -> None:
+    """
+    注册（或替换）model_id 对应的后端，如测试中使用 MockBackend
+    """
+    global _backends
+    if _backends is None:
+        _backends = _load_backends()
+    _backends[model_id] = backend
+
+
+async def close_backends() -> None:
+    """
+    关闭所有后端的连接池（应用关闭时调用）
+    """
+    global _backends
+    backends, _backends = _backends or {}, None
+    for backend in backends.values():
+        try:
+            await backend.aclose()
+        except Exception as e:
+            logger.warning(f"关闭模型后端失败: {str(e)}")
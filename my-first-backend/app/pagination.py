@@ -0,0 +1,111 @@
+import base64
+import json
+
+from app.cache import TTLCache
+from app.coherence import on_table_change
+from app.config import settings
+from app.db import COUNTED_TABLES
+
+# 带筛选条件的总数缓存：key = (表名, WHERE 子句, 参数)
+_count_cache = TTLCache(
+    maxsize=settings.count_cache_size, ttl=settings.count_cache_ttl, name="count"
+)
+# 其他 worker 写入后清空总数缓存；本进程的写入由仓储在提交后调用 invalidate_counts
+for _table in COUNTED_TABLES:
+    on_table_change(_table, _count_cache.clear)
+
+
+def invalidate_counts(table: str) -> None:
+    """
+    本进程写入该表后清空总数缓存
+
+    其他 worker 的写入由 on_table_change 清空；本进程的写入不会触发（见 app/coherence.py），
+    需要在提交后调用。缓存键不按表分区，直接整体清空。
+    """
+    _count_cache.clear()
+
+
+def encode_cursor(last_id: int) -> str:
+    # 游标对客户端不透明：base64url 编码的 {"id": 上一页最后一条的主键}
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    解析游标，返回上一页最后一条记录的主键
+
+    :raises ValueError: 游标格式不合法
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        last_id = data["id"]
+    except (ValueError, TypeError, KeyError) as exc:
+        raise ValueError(f"invalid cursor: {cursor!r}") from exc
+    if not isinstance(last_id, int) or isinstance(last_id, bool) or last_id < 1:
+        raise ValueError(f"invalid cursor: {cursor!r}")
+    return last_id
+
+
+def resolve_page(page, allow_cursor: bool = True) -> tuple[int, int, int | None]:
+    """
+    把分页参数转换成仓储层的查询窗口
+
+    :param page: PageParams
+    :param allow_cursor: 结果不按主键排序时（如按相关度排序的检索）不支持游标
+    :return: (limit, offset, after_id)；limit 比 pageSize 多 1，用于判断是否还有下一页
+    :raises ValueError: cursor 不合法或当前查询不支持游标
+    """
+    if page.cursor:
+        if not allow_cursor:
+            raise ValueError("cursor is not supported for this query")
+        return page.pageSize + 1, 0, decode_cursor(page.cursor)
+    return page.pageSize + 1, (page.pageNum - 1) * page.pageSize, None
+
+
+def split_page(rows: list, page_size: int, with_cursor: bool = True) -> tuple[list, str | None]:
+    # 截掉多取的一条，并生成下一页游标
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        return rows, encode_cursor(rows[-1].id) if with_cursor else None
+    return rows, None
+
+
+def count_rows(
+    cur,
+    table: str,
+    where_sql: str = "",
+    params=(),
+    mode: str = "exact",
+    join_sql: str = "",
+) -> int | None:
+    """
+    统计列表总数
+
+    - 无筛选：读取触发器维护的 table_counts，O(1)
+    - 有筛选：exact 每次 COUNT(1)；approx 使用短期缓存（最多滞后 count_cache_ttl 秒）
+    - mode = none：不统计，返回 None
+
+    :param cur: sqlite 游标
+    :param table: 表名（来自代码常量，不接受用户输入）
+    :param where_sql: 形如 " WHERE ..." 的筛选子句
+    :param join_sql: 形如 " JOIN ..." 的关联子句（如全文检索表）
+    """
+    if mode == "none":
+        return None
+    if not where_sql:
+        cur.execute("SELECT row_count FROM table_counts WHERE table_name = ?", (table,))
+        row = cur.fetchone()
+        if row is not None:
+            return int(row[0])
+    elif mode == "approx":
+        key = (table, join_sql, where_sql, tuple(params))
+        total = _count_cache.get(key)
+        if total is None:
+            cur.execute(f"SELECT COUNT(1) FROM {table}{join_sql}{where_sql}", params)
+            total = int(cur.fetchone()[0])
+            _count_cache.set(key, total)
+        return total
+    cur.execute(f"SELECT COUNT(1) FROM {table}{join_sql}{where_sql}", params)
+    return int(cur.fetchone()[0])
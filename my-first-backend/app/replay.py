@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from collections import deque
+from typing import AsyncGenerator, Callable
+
+logger = logging.getLogger(__name__)
+
+# 创建后等待第一个订阅者的最短时间（秒）
+_FIRST_SUBSCRIBER_WAIT = 1.0
+
+
+class ReplayStream:
+    """
+    可断点续传的 SSE 流：生成与推送解耦
+
+    - 生成在独立任务中执行，每帧加上递增的 SSE id（从 1 开始）后写入有界环形缓冲
+    - 每个 HTTP 连接是一个订阅者（subscribe），从指定 id 之后开始回放，追上后继续接收新帧；
+      客户端断线重连时带上 Last-Event-ID 即可续传，不会再次生成
+    - 最后一个订阅者离开且生成未结束时，等待 grace 秒；期间没有订阅者重新连接则取消生成。
+      创建时同样开始计时：响应开始前客户端已离开时，生成不会在无人接收的情况下跑完
+
+    :param frames: 生成 SSE 帧（不含 id 行）的异步生成器
+    :param maxlen: 缓冲的最大帧数，超出后丢弃最早的帧（这些帧不能再回放）
+    :param grace: 无订阅者后保留生成的秒数，0 表示立即取消
+    :param on_cancel: 生成被取消时返回最后一帧（如 error 事件），写入缓冲供重连的客户端读取
+    :param on_done: 生成结束（含取消、异常）后调用
+    """
+
+    def __init__(
+        self,
+        frames: AsyncGenerator[str, None],
+        maxlen: int,
+        grace: float,
+        on_cancel: Callable[[], str] | None = None,
+        on_done: Callable[[], None] | None = None,
+    ):
+        self.grace = grace
+        self.on_cancel = on_cancel
+        self.on_done = on_done
+        self.buffer: deque[tuple[int, str]] = deque(maxlen=maxlen)
+        self.last_id = 0
+        self.done = False
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+        self._grace_handle: asyncio.TimerHandle | None = None
+        self._task = asyncio.ensure_future(self._run(frames))
+        # 等待第一个订阅者；grace 为 0 时也留出响应开始前的时间
+        self._start_grace(max(grace, _FIRST_SUBSCRIBER_WAIT))
+
+    async def _run(self, frames: AsyncGenerator[str, None]) -> None:
+        try:
+            async for frame in frames:
+                self._publish(frame)
+        except asyncio.CancelledError:
+            if self.on_cancel is not None:
+                self._publish(self.on_cancel())
+        except Exception as e:
+            logger.error(f"流式生成失败: {str(e)}", exc_info=True)
+        finally:
+            await frames.aclose()
+            if self._grace_handle is not None:
+                self._grace_handle.cancel()
+                self._grace_handle = None
+            self.done = True
+            self._notify()
+            if self.on_done is not None:
+                self.on_done()
+
+    def _publish(self, frame: str) -> None:
+        self.last_id += 1
+        self.buffer.append((self.last_id, f"id: {self.last_id}\n{frame}"))
+        self._notify()
+
+    def _notify(self) -> None:
+        # 唤醒所有等待中的订阅者，之后的等待使用新的 Event
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def can_resume(self, last_event_id: int) -> bool:
+        # last_event_id 之后的帧是否都还在缓冲中
+        if last_event_id < 0 or last_event_id > self.last_id:
+            return False
+        first_id = self.buffer[0][0] if self.buffer else self.last_id + 1
+        return last_event_id >= first_id - 1
+
+    def _frames_after(self, last_event_id: int) -> list[str]:
+        # 订阅者通常只落后几帧，从尾部向前取
+        frames = []
+        for frame_id, frame in reversed(self.buffer):
+            if frame_id <= last_event_id:
+                break
+            frames.append(frame)
+        frames.reverse()
+        return frames
+
+    async def subscribe(self, last_event_id: int = 0) -> AsyncGenerator[str, None]:
+        """
+        回放 last_event_id 之后的帧，然后跟随新帧直到生成结束
+
+        订阅者读得太慢、所需的帧已被挤出缓冲时提前结束，客户端可按 Last-Event-ID 重新请求。
+        """
+        self.subscribers += 1
+        if self._grace_handle is not None:
+            self._grace_handle.cancel()
+            self._grace_handle = None
+        try:
+            while True:
+                if not self.can_resume(last_event_id):
+                    return
+                changed = self._changed
+                for frame in self._frames_after(last_event_id):
+                    yield frame
+                    last_event_id += 1
+                if last_event_id < self.last_id:
+                    continue
+                if self.done:
+                    return
+                await changed.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                self._release()
+
+    def _release(self) -> None:
+        if self.grace <= 0:
+            self.cancel()
+        else:
+            self._start_grace(self.grace)
+
+    def _start_grace(self, delay: float) -> None:
+        loop = asyncio.get_running_loop()
+        self._grace_handle = loop.call_later(delay, self.cancel)
+
+    def cancel(self) -> None:
+        # 取消生成（CancelledError 传递到上游调用）
+        self._grace_handle = None
+        if not self._task.done():
+            logger.info("流式生成无订阅者，已取消")
+            self._task.cancel()
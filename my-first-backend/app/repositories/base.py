@@ -0,0 +1,409 @@
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
+from typing import Generic, Iterator, Optional, TypeVar
+
+from pydantic import BaseModel, create_model
+
+from app.bulk import bulk_insert
+from app.cache import TTLCache
+from app.coherence import check_versions, on_table_change
+from app.config import settings
+from app.db import connect, execute_returning, get_connection
+from app.db_writer import run_write
+from app.pagination import count_rows, invalidate_counts
+from app.search import apply_search
+
+M = TypeVar("M", bound=BaseModel)
+
+# WHERE id IN (...) 每批的主键个数
+IN_BATCH_SIZE = 500
+
+
+@lru_cache(maxsize=256)
+def partial_model(model: type[BaseModel], fields: tuple[str, ...]) -> type[BaseModel]:
+    """
+    稀疏字段集（?fields=）使用的模型：只包含 fields，字段定义（类型、标题、说明）沿用原模型
+
+    按 (模型, 字段) 缓存，同一组字段只创建一次；fields 为全部字段时直接返回原模型。
+    """
+    if fields == tuple(model.model_fields):
+        return model
+    return create_model(
+        f"{model.__name__}Fields",
+        **{f: (model.model_fields[f].annotation, model.model_fields[f]) for f in fields},
+    )
+
+
+class BaseRepository(Generic[M]):
+    """
+    表驱动的仓储基类
+
+    子类只声明表名、模型和列配置，常用 SQL 在实例化时一次拼好：
+    - 读：从连接池借连接（connection()），游标的 row_factory 直接把结果行构造成模型，
+      不再经过 sqlite3.Row -> dict -> Model(**dict) 的中间步骤和重复校验
+    - 写：fn(conn, ...) 交给单写线程执行（write()），事务由写线程统一开启和提交，
+      仓储方法内部不 commit
+    """
+
+    table: str
+    model: type[M]
+    # 可写入的列（不含 id / created_at），顺序即 INSERT 参数顺序
+    columns: tuple[str, ...] = ()
+    # INSERT 时的默认值，请求数据中没有该字段时使用，如 users.status = 1
+    insert_defaults: dict = {}
+    # 列表筛选：参数名（同列名）-> "like" 模糊匹配 / "eq" 精确匹配
+    list_filters: dict[str, str] = {}
+
+    def __init__(self):
+        t = self.table
+        self.fields = tuple(self.model.model_fields)
+        insert_columns = self.columns + ("created_at", "updated_at")
+        # 显式列出模型字段，避免 SELECT * 带出模型没有的列
+        self.returning = ", ".join(self.fields)
+        self.select_sql = f"SELECT {', '.join(f'{t}.{f}' for f in self.fields)} FROM {t}"
+        self.get_sql = f"{self.select_sql} WHERE {t}.id = ?"
+        self.insert_sql = (
+            f"INSERT INTO {t} ({', '.join(insert_columns)}) "
+            f"VALUES ({', '.join('?' * len(insert_columns))})"
+        )
+        self.delete_sql = f"DELETE FROM {t} WHERE id = ?"
+        # 按主键的读穿透缓存，缓存的模型对象在线程间共享，调用方不应修改
+        self.cache = (
+            TTLCache(settings.entity_cache_size, settings.entity_cache_ttl, name=t)
+            if settings.entity_cache_enabled
+            else None
+        )
+        if self.cache is not None:
+            # 其他 worker 写入该表后整表失效（本进程的写入在 update/delete 中按主键失效）
+            on_table_change(t, self.cache.clear)
+
+    # ---------- 连接与事务 ----------
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """读操作：从连接池借出连接，退出时归还（未提交的事务随归还回滚）"""
+        conn = get_connection()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def write(self, fn, *args):
+        """写操作：fn(conn, *args) 在写线程的事务中执行，提交后返回结果，失败时原样抛出异常"""
+        return run_write(fn, *args)
+
+    def cursor(self, conn, model: type[BaseModel] | None = None) -> sqlite3.Cursor:
+        """返回把结果行直接构造成模型（默认 self.model）的游标"""
+        cur = conn.cursor()
+        cur.row_factory = self._model_factory(model or self.model)
+        return cur
+
+    def _model_factory(self, model: type[BaseModel]):
+        construct = model.model_construct
+        # 同一条语句的 description 不变，列名只在语句切换时计算一次
+        cache = [None, ()]
+
+        def factory(cursor, row):
+            description = cursor.description
+            if description is not cache[0]:
+                cache[0], cache[1] = description, tuple(d[0] for d in description)
+            return construct(**dict(zip(cache[1], row)))
+
+        return factory
+
+    # ---------- 稀疏字段集 ----------
+
+    def resolve_fields(self, raw: str | None) -> tuple[str, ...] | None:
+        """
+        解析 ?fields=id,name：只允许模型中的字段，按模型字段顺序返回
+
+        主键始终包含（游标翻页、关联展开都依赖它）；未指定时返回 None，表示全部字段。
+        含未知字段时抛 ValueError。
+        """
+        if not raw:
+            return None
+        requested = {f.strip() for f in raw.split(",") if f.strip()}
+        unknown = requested.difference(self.fields)
+        if unknown:
+            raise ValueError(f"unknown fields: {', '.join(sorted(unknown))}")
+        requested.add("id")
+        return tuple(f for f in self.fields if f in requested)
+
+    def _select(self, fields: tuple[str, ...] | None) -> str:
+        if fields is None:
+            return self.select_sql
+        return f"SELECT {', '.join(f'{self.table}.{f}' for f in fields)} FROM {self.table}"
+
+    def project(self, row: M, fields: tuple[str, ...] | None):
+        # 已加载的完整记录（如缓存中的）裁剪为稀疏字段集模型
+        if fields is None:
+            return row
+        return partial_model(self.model, fields).model_construct(
+            **{f: getattr(row, f) for f in fields}
+        )
+
+    # ---------- 读 ----------
+
+    def get(self, row_id: int, fields: tuple[str, ...] | None = None) -> Optional[M]:
+        """
+        按主键查询，优先读缓存
+
+        :param fields: 稀疏字段集（见 resolve_fields）；缓存未命中时只查询这些列，结果不回填缓存
+        """
+        if fields is None:
+            if self.cache is None:
+                return self._load(row_id)
+            check_versions()
+            return self.cache.get_or_load(row_id, lambda: self._load(row_id))
+        if self.cache is not None:
+            check_versions()
+            row = self.cache.get(row_id)
+            if row is not None:
+                return self.project(row, fields)
+        with self.connection() as conn:
+            return (
+                self.cursor(conn, partial_model(self.model, fields))
+                .execute(f"{self._select(fields)} WHERE {self.table}.id = ?", (row_id,))
+                .fetchone()
+            )
+
+    def get_many(self, ids: list[int], fields: tuple[str, ...] | None = None) -> dict[int, M]:
+        """
+        按主键批量查询（WHERE id IN (...)），优先读缓存，重复的主键只查一次
+
+        :param fields: 稀疏字段集，从完整记录裁剪（完整记录可被缓存复用）
+        :return: {主键: 模型}，不存在的主键不出现在结果中
+        """
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return {}
+        if self.cache is None:
+            found = self._load_many(ids)
+        else:
+            check_versions()
+            found = self.cache.get_many_or_load(ids, self._load_many)
+        if fields is not None:
+            found = {row_id: self.project(row, fields) for row_id, row in found.items()}
+        return found
+
+    def _load_many(self, ids: list[int]) -> dict[int, M]:
+        result = {}
+        with self.connection() as conn:
+            cur = self.cursor(conn)
+            # 单条语句的参数个数有上限，按批拆分
+            for start in range(0, len(ids), IN_BATCH_SIZE):
+                batch = ids[start : start + IN_BATCH_SIZE]
+                cur.execute(
+                    f"{self.select_sql} WHERE {self.table}.id IN ({', '.join('?' * len(batch))})",
+                    batch,
+                )
+                result.update((row.id, row) for row in cur.fetchall())
+        return result
+
+    def _load(self, row_id: int) -> Optional[M]:
+        with self.connection() as conn:
+            return self.cursor(conn).execute(self.get_sql, (row_id,)).fetchone()
+
+    def list_page(
+        self,
+        limit: int,
+        offset: int,
+        after_id: int | None = None,
+        total_mode: str = "exact",
+        q: str | None = None,
+        fields: tuple[str, ...] | None = None,
+        **filters,
+    ) -> tuple[list[M], int | None]:
+        """
+        分页查询，按 id 倒序（有 q 时按相关度）
+
+        :param limit: 每页数量
+        :param offset: 偏移量（after_id 存在时忽略）
+        :param after_id: 游标分页：只返回 id 小于该值的记录（按主键定位，不扫描跳过的行）
+        :param total_mode: 总数统计方式 exact / approx / none，见 count_rows
+        :param q: 全文检索关键词（FTS5），见 apply_search
+        :param fields: 稀疏字段集（见 resolve_fields），只查询这些列，返回 partial_model 的实例
+        :param filters: list_filters 中声明的筛选条件，值为 None 时忽略
+        :return: (模型列表, 总记录数；total_mode=none 时为 None)
+        """
+        t = self.table
+        with self.connection() as conn:
+            # 计数/检索辅助查询用普通游标，结果行用模型游标
+            cur = conn.cursor()
+            # 列名带表名前缀，避免与检索表的列冲突
+            where = []
+            params = []
+            join_sql, order_sql = "", None
+            if q:
+                join_sql, order_sql = apply_search(cur, t, q, where, params)
+            for key, value in filters.items():
+                if key not in self.list_filters:
+                    raise TypeError(f"unsupported filter for {t}: {key}")
+                if not value:
+                    continue
+                if self.list_filters[key] == "like":
+                    where.append(f"{t}.{key} LIKE ?")
+                    params.append(f"%{value}%")
+                else:
+                    where.append(f"{t}.{key} = ?")
+                    params.append(value)
+
+            where_sql = f" WHERE {' AND '.join(where)}" if where else ""
+            # 无筛选时总数读计数表，不再全表 COUNT(1)；approx 模式先确认缓存未过期
+            if total_mode == "approx":
+                check_versions()
+            total = count_rows(cur, t, where_sql, params, total_mode, join_sql)
+
+            if after_id is not None:
+                where.append(f"{t}.id < ?")
+                params.append(after_id)
+                offset = 0
+            where_sql = f" WHERE {' AND '.join(where)}" if where else ""
+            model = self.model if fields is None else partial_model(self.model, fields)
+            rows = self.cursor(conn, model).execute(
+                f"{self._select(fields)}{join_sql}{where_sql} "
+                f"ORDER BY {order_sql or f'{t}.id DESC'} LIMIT ? OFFSET ?",
+                params + [limit, offset],
+            ).fetchall()
+            return rows, total
+
+    def iter_batches(self, batch_size: int = 1000) -> Iterator[list]:
+        # 流式导出：独立连接 + fetchmany 按批读取，不占用连接池，内存与总行数无关
+        # 导出按列名编码，这里保留 sqlite3.Row
+        conn = connect()
+        try:
+            cur = conn.execute(f"{self.select_sql} ORDER BY id")
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            conn.close()
+
+    def changes(self, since: int, limit: int) -> tuple[list[tuple[int, str, int, Optional[M]]], int, bool]:
+        """
+        增量同步：返回 seq 大于 since 的变更
+
+        变更日志每行只保留最新一条，同一记录只出现一次；日志与当前数据在同一条语句中读取，
+        返回的数据与 seq 一致。
+
+        :return: ([(seq, op, 主键, 当前数据；删除时为 None)], 下次的 since, 是否还有更多)
+        """
+        t = self.table
+        construct = self.model.model_construct
+        with self.connection() as conn:
+            rows = conn.execute(
+                f"SELECT change_log.seq, change_log.op, change_log.row_id, "
+                f"{', '.join(f'{t}.{f}' for f in self.fields)} "
+                f"FROM change_log LEFT JOIN {t} ON {t}.id = change_log.row_id "
+                f"WHERE change_log.table_name = ? AND change_log.seq > ? "
+                f"ORDER BY change_log.seq LIMIT ?",
+                (t, since, limit + 1),
+            ).fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        changes = [
+            (
+                row[0],
+                row[1],
+                row[2],
+                construct(**dict(zip(self.fields, tuple(row)[3:]))) if row[1] != "delete" else None,
+            )
+            for row in rows
+        ]
+        return changes, (rows[-1][0] if rows else since), has_more
+
+    # ---------- 写（在写线程中执行） ----------
+
+    def _insert_params(self, data: dict, created_at: str) -> tuple:
+        values = {**self.insert_defaults, **data}
+        return tuple(values.get(c) for c in self.columns) + (created_at, created_at)
+
+    def _insert(self, conn, data: dict) -> M:
+        return execute_returning(
+            self.cursor(conn),
+            self.insert_sql,
+            self._insert_params(data, datetime.utcnow().isoformat()),
+            self.table,
+            returning=self.returning,
+        )
+
+    def _bulk_insert(self, conn, rows: list[dict]) -> list[tuple[int | None, str | None]]:
+        created_at = datetime.utcnow().isoformat()
+        return bulk_insert(
+            conn, self.insert_sql, [self._insert_params(row, created_at) for row in rows]
+        )
+
+    def _update(
+        self, conn, row_id: int, data: dict, expected_version: int | None = None
+    ) -> Optional[M]:
+        cur = self.cursor(conn)
+        # 只更新提供的字段，避免覆盖为 NULL
+        fields = [c for c in self.columns if data.get(c) is not None]
+        if not fields:
+            # 没有需要更新的字段，直接返回当前数据
+            row = cur.execute(self.get_sql, (row_id,)).fetchone()
+            if row is not None and expected_version not in (None, row.row_version):
+                return None
+            return row
+
+        # 主键不存在或版本号不一致时不返回任何行
+        where = "id = ?"
+        params = [data[c] for c in fields] + [datetime.utcnow().isoformat(), row_id]
+        if expected_version is not None:
+            where += " AND row_version = ?"
+            params.append(expected_version)
+        return execute_returning(
+            cur,
+            f"UPDATE {self.table} SET {', '.join(f'{c} = ?' for c in fields)}, "
+            f"updated_at = ?, row_version = row_version + 1 WHERE {where}",
+            params,
+            self.table,
+            row_id,
+            returning=self.returning,
+        )
+
+    def _delete(self, conn, row_id: int) -> bool:
+        return conn.execute(self.delete_sql, (row_id,)).rowcount > 0
+
+    # ---------- 写（对外接口） ----------
+
+    def create(self, data: dict) -> M:
+        # 写入并返回新纪录；唯一约束冲突等异常原样抛出
+        try:
+            return self.write(self._insert, data)
+        finally:
+            invalidate_counts(self.table)
+
+    def bulk_create(self, rows: list[dict]) -> list[tuple[int | None, str | None]]:
+        # 批量写入，同一事务提交；返回每行的 (新主键, 冲突原因)，与 rows 顺序一致
+        try:
+            return self.write(self._bulk_insert, rows)
+        finally:
+            invalidate_counts(self.table)
+
+    def update(
+        self, row_id: int, data: dict, expected_version: int | None = None
+    ) -> Optional[M]:
+        # 局部更新：只更新请求中提供的字段；记录不存在或 row_version 与 expected_version 不一致时返回 None
+        try:
+            return self.write(self._update, row_id, data, expected_version)
+        finally:
+            self.invalidate(row_id)
+
+    def delete(self, row_id: int) -> bool:
+        # 返回是否成功删除
+        try:
+            return self.write(self._delete, row_id)
+        finally:
+            self.invalidate(row_id)
+
+    def invalidate(self, row_id: int) -> None:
+        # 写入提交后失效缓存（写入失败也失效，宁可多回源一次）；
+        # 更新可能改变记录是否满足筛选条件，总数缓存同样失效
+        if self.cache is not None:
+            self.cache.invalidate(row_id)
+        invalidate_counts(self.table)
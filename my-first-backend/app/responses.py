@@ -0,0 +1,53 @@
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时使用标准库 json
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    # 非 JSON 原生类型（嵌在 dict 中的模型等）
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    序列化为紧凑 JSON（UTF-8，不转义中文），与 FastAPI 默认 JSONResponse 的输出一致
+
+    - Pydantic 模型：直接调用模型的 Rust 序列化器输出 bytes，不做校验
+    - 其他数据：优先 orjson，未安装时回退到标准库
+    """
+    if isinstance(content, BaseModel):
+        return content.__pydantic_serializer__.to_json(content)
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(
+        content, ensure_ascii=False, separators=(",", ":"), allow_nan=False, default=_default
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    预序列化的 JSON 响应
+
+    路由直接返回 Response 实例时，FastAPI 不再按 response_model 把结果 dump 成 dict、
+    重新校验再序列化；response_model 仍用于生成 OpenAPI 文档。
+    只用于我们自己从数据库读出、已按模型构造的可信数据。
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def api_response(
+    result: Any, status_code: int = 200, headers: dict[str, str] | None = None
+) -> FastJSONResponse:
+    # 路由层统一出口：ApiResponse -> 预序列化 JSON
+    return FastJSONResponse(result, status_code=status_code, headers=headers)
@@ -1,29 +1,61 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Header, Query, Request
 from fastapi.responses import StreamingResponse
+from app.responses import api_response
 from app.schemas.chat import ChatRequest
-from app.services.chat import chat_stream
+from app.schemas.user import ApiResponse
+from app.services.chat import start_chat_stream, subscribe_chat_stream
+from app.sse import sse_openapi_extra
 
 router = APIRouter(prefix="/chat", tags=["聊天"])
 
+_SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no"
+}
+
 
 @router.post(
     "",
     summary="聊天接口（SSE流式）",
-    description="POST /chat SSE流式响应，支持多种事件类型"
+    description="POST /chat SSE流式响应，支持多种事件类型；每帧带递增的 id，断线后可通过续传接口继续接收",
+    response_class=StreamingResponse,
+    openapi_extra=sse_openapi_extra(),
 )
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
     """
     聊天接口，使用 Server-Sent Events (SSE) 进行流式响应
     
     :param request: 聊天请求参数
-    :return: SSE 流式响应
+    :param http_request: 原始请求，用于检测客户端断开
+    :return: SSE 流式响应，X-Request-ID 响应头为续传使用的 request_id
     """
+    request_id = start_chat_stream(request)
     return StreamingResponse(
-        chat_stream(request),
+        subscribe_chat_stream(request_id, 0, http_request.is_disconnected),
         media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"
-        }
-    )
\ No newline at end of file
+        headers={**_SSE_HEADERS, "X-Request-ID": request_id},
+    )
+
+
+@router.get(
+    "/{request_id}/resume",
+    summary="聊天断线续传（SSE流式）",
+    description="回放 Last-Event-ID 之后的帧；生成仍在进行时继续推送新帧，不会重新生成。"
+    "流不存在或已过期返回 404，所需的帧已不在缓冲中返回 410",
+    response_class=StreamingResponse,
+    openapi_extra=sse_openapi_extra(),
+)
+async def resume_chat(
+    request_id: str,
+    http_request: Request,
+    last_event_id: int | None = Header(None, alias="Last-Event-ID", description="已收到的最后一帧 id（EventSource 重连时自动携带）"),
+    last_event_id_query: int | None = Query(None, alias="last_event_id", description="Last-Event-ID 的查询参数形式，请求头优先"),
+):
+    if last_event_id is None:
+        last_event_id = last_event_id_query or 0
+    stream = subscribe_chat_stream(request_id, last_event_id, http_request.is_disconnected)
+    if isinstance(stream, ApiResponse):
+        # 错误用对应的 HTTP 状态码返回，EventSource 收到非 200 响应后不再自动重连
+        return api_response(stream, status_code=stream.code)
+    return StreamingResponse(stream, media_type="text/event-stream", headers=_SSE_HEADERS)
@@ -1,10 +1,30 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Header, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import Literal
 from app.schemas.doctor import Doctor, CreateDoctor, UpdateDoctor
-from app.schemas.user import ApiResponse
+from app.schemas.patient import Patient
+from app.db import run_in_db
+from app.config import settings
+from app.schemas.user import (
+    ApiResponse,
+    BulkResult,
+    ChangesResponse,
+    ErrorCode,
+    PageParams,
+    PageResponse,
+)
+from app.bulk import parse_bulk_body, bulk_openapi_extra
+from app.export import EXPORT_MEDIA_TYPES, export_headers
+from app.responses import api_response
+from app.etag import apply_write_etag, check_list_etag, conditional_get, list_response, parse_if_match
 from app.services.doctor import (
     list_doctors_service,
+    list_doctor_patients_service,
+    list_doctor_changes_service,
+    export_doctors_service,
     get_doctor_by_id_service,
     create_doctor_service,
+    bulk_create_doctors_service,
     update_doctor_service,
     delete_doctor_service,
 )
@@ -12,31 +32,147 @@ from app.services.doctor import (
 router = APIRouter(prefix="/doctors", tags=["医生管理"])
 
 
-@router.get("", summary="查询医生列表", response_model=ApiResponse[list[Doctor]])
-def list_doctors():
-    # 只负责转发到 service 层
-    return list_doctors_service()
+@router.get(
+    "",
+    summary="查询医生列表",
+    description="分页查询医生列表，支持姓名/科室/职称筛选，支持 pageNum/pageSize 与 cursor 游标翻页；"
+    "传 ids 时按 ID 批量查询（一次 IN 查询），按传入顺序返回",
+    response_model=ApiResponse[PageResponse[Doctor]],
+)
+async def list_doctors(
+    request: Request,
+    page: PageParams = Depends(),
+    name: str | None = Query(None, description="医生姓名"),
+    department: str | None = Query(None, description="所属科室"),
+    title: str | None = Query(None, description="医生职称"),
+    q: str | None = Query(None, description="关键词全文检索（姓名），结果按相关度排序"),
+    ids: str | None = Query(
+        None, description="按 ID 批量查询，逗号分隔，如 1,2,3；指定后忽略筛选和分页参数"
+    ),
+    fields: str | None = Query(
+        None, description="稀疏字段集：逗号分隔的字段名，如 id,name，只查询并返回这些字段（总是包含 id）"
+    ),
+):
+    # 表版本号与查询参数都没变时直接返回 304，不再查询
+    etag, cached = await check_list_etag(request, "doctors")
+    if cached is not None:
+        return cached
+    result = await run_in_db(list_doctors_service, page, name, department, title, q, ids, fields)
+    return list_response(result, etag)
+
+
+@router.get(
+    "/changes",
+    summary="医生增量同步",
+    description="返回 since 之后新增、修改和删除（墓碑）的医生，按变更序号升序，每条记录只出现一次；"
+    "首次同步传 since=0，之后传上次返回的 nextSince",
+    response_model=ApiResponse[ChangesResponse[Doctor]],
+)
+async def list_doctor_changes(
+    since: int = Query(0, ge=0, description="上次返回的 nextSince，首次同步传 0"),
+    limit: int = Query(
+        settings.changes_page_size,
+        ge=1,
+        le=settings.changes_max_page_size,
+        description="每次最多返回的变更条数",
+    ),
+):
+    # 必须声明在 /{id} 之前
+    return api_response(await run_in_db(list_doctor_changes_service, since, limit))
+
+
+@router.get(
+    "/export",
+    summary="导出医生",
+    description="按主键顺序流式导出全部医生，支持 NDJSON 与 CSV，内存占用与数据量无关",
+    response_class=StreamingResponse,
+)
+async def export_doctors(
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="导出格式"),
+):
+    # 必须声明在 /{id} 之前，避免 export 被当成路径参数
+    return StreamingResponse(
+        export_doctors_service(format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers=export_headers("doctors", format),
+    )
 
 
 @router.get("/{doctor_id}", summary="医生详情", response_model=ApiResponse[Doctor])
-def get_doctor(doctor_id: int):
-    # path 参数由 FastAPI 自动校验类型
-    return get_doctor_by_id_service(doctor_id)
+async def get_doctor(
+    doctor_id: int,
+    request: Request,
+    fields: str | None = Query(
+        None, description="稀疏字段集：逗号分隔的字段名，如 id,name，只查询并返回这些字段（总是包含 id）"
+    ),
+):
+    # path 参数由 FastAPI 自动校验类型；ETag 与 If-None-Match 一致时返回 304
+    # 稀疏字段集不是完整表示，不返回 ETag
+    result = await run_in_db(get_doctor_by_id_service, doctor_id, fields)
+    if fields:
+        return api_response(result)
+    return conditional_get(request, result, "doctors")
+
+
+@router.get(
+    "/{doctor_id}/patients",
+    summary="医生的患者",
+    description="分页查询主治医生为该医生的患者，支持 pageNum/pageSize 与 cursor 游标翻页",
+    response_model=ApiResponse[PageResponse[Patient]],
+)
+async def list_doctor_patients(
+    doctor_id: int,
+    request: Request,
+    page: PageParams = Depends(),
+    fields: str | None = Query(
+        None, description="稀疏字段集：逗号分隔的字段名，如 id,name，只查询并返回这些字段（总是包含 id）"
+    ),
+):
+    etag, cached = await check_list_etag(request, "patients", "doctors")
+    if cached is not None:
+        return cached
+    result = await run_in_db(list_doctor_patients_service, doctor_id, page, fields)
+    return list_response(result, etag)
 
 
 @router.post("", summary="新增医生", response_model=ApiResponse[Doctor])
-def create_doctor(payload: CreateDoctor):
+async def create_doctor(payload: CreateDoctor):
     # body 参数交由 Pydantic 做校验
-    return create_doctor_service(payload)
+    return api_response(await run_in_db(create_doctor_service, payload))
+
+
+@router.post(
+    "/bulk",
+    summary="批量新增医生",
+    description="请求体为 CreateDoctor 的 JSON 数组或 NDJSON（Content-Type: application/x-ndjson），"
+    "逐行校验后一次事务写入，返回每行的新ID或失败原因",
+    response_model=ApiResponse[BulkResult],
+    openapi_extra=bulk_openapi_extra("CreateDoctor"),
+)
+async def bulk_create_doctors(request: Request):
+    # 直接读取原始请求体，单行校验失败不影响其他行
+    # 解析大请求体是 CPU 密集操作，放到线程池执行，不阻塞事件循环
+    body = await request.body()
+    try:
+        items = await run_in_db(parse_bulk_body, body, request.headers.get("content-type", ""))
+    except ValueError as e:
+        return api_response(ApiResponse.error(code=ErrorCode.PARAM_ERROR, msg=str(e)))
+    return api_response(await run_in_db(bulk_create_doctors_service, items))
 
 
 @router.put("/{doctor_id}", summary="修改医生", response_model=ApiResponse[Doctor])
-def update_doctor(doctor_id: int, payload: UpdateDoctor):
+async def update_doctor(
+    doctor_id: int,
+    payload: UpdateDoctor,
+    if_match: str | None = Header(None, alias="If-Match", description="乐观并发控制：传入详情接口返回的 ETag，版本不一致时返回 412"),
+):
     # 更新只传入变更字段
-    return update_doctor_service(doctor_id, payload)
+    expected_version = parse_if_match(if_match, "doctors", doctor_id)
+    result = await run_in_db(update_doctor_service, doctor_id, payload, expected_version)
+    return apply_write_etag(result, "doctors")
 
 
 @router.delete("/{doctor_id}", summary="删除医生", response_model=ApiResponse[None])
-def delete_doctor(doctor_id: int):
+async def delete_doctor(doctor_id: int):
     # 删除返回空 data
-    return delete_doctor_service(doctor_id)
+    return api_response(await run_in_db(delete_doctor_service, doctor_id))
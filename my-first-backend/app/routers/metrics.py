@@ -0,0 +1,31 @@
+from fastapi import APIRouter
+
+from app.cache import cache_stats
+from app.coherence import get_watcher
+from app.config import settings
+from app.db import get_pool
+from app.db_writer import get_writer
+from app.responses import api_response
+from app.schemas.user import ApiResponse
+
+router = APIRouter(prefix="/metrics", tags=["运行指标"])
+
+
+@router.get(
+    "",
+    summary="运行指标",
+    description="连接池、单写线程和各缓存（命中/未命中/淘汰次数）以及跨进程缓存一致性检查的统计",
+    response_model=ApiResponse[dict],
+)
+async def get_metrics():
+    # 只读内存中的计数器，不访问数据库，直接在事件循环中执行
+    return api_response(
+        ApiResponse.success(
+            {
+                "pool": get_pool().stats(),
+                "writer": get_writer().stats() if settings.db_writer_enabled else None,
+                "caches": cache_stats(),
+                "coherence": get_watcher().stats() if settings.cache_coherence_enabled else None,
+            }
+        )
+    )
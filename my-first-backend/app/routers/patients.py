@@ -1,10 +1,28 @@
-from fastapi import APIRouter
-from app.schemas.patient import Patient, CreatePatient, UpdatePatient
-from app.schemas.user import ApiResponse
+from fastapi import APIRouter, Depends, Header, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import Literal
+from app.schemas.patient import Patient, PatientExpanded, CreatePatient, UpdatePatient
+from app.db import run_in_db
+from app.config import settings
+from app.schemas.user import (
+    ApiResponse,
+    BulkResult,
+    ChangesResponse,
+    ErrorCode,
+    PageParams,
+    PageResponse,
+)
+from app.bulk import parse_bulk_body, bulk_openapi_extra
+from app.export import EXPORT_MEDIA_TYPES, export_headers
+from app.responses import api_response
+from app.etag import apply_write_etag, check_list_etag, conditional_get, list_response, parse_if_match
 from app.services.patient import (
     list_patients_service,
+    list_patient_changes_service,
+    export_patients_service,
     get_patient_by_id_service,
     create_patient_service,
+    bulk_create_patients_service,
     update_patient_service,
     delete_patient_service,
 )
@@ -12,31 +30,124 @@ from app.services.patient import (
 router = APIRouter(prefix="/patients", tags=["患者管理"])
 
 
-@router.get("", summary="查询患者列表", response_model=ApiResponse[list[Patient]])
-def list_patients():
-    # 只负责转发到 service 层
-    return list_patients_service()
+@router.get(
+    "",
+    summary="查询患者列表",
+    description="分页查询患者列表，支持 pageNum/pageSize 与 cursor 游标翻页；"
+    "expand=primary_doctor 时一次批量查询附带每位患者的主治医生",
+    response_model=ApiResponse[PageResponse[PatientExpanded]],
+)
+async def list_patients(
+    request: Request,
+    page: PageParams = Depends(),
+    q: str | None = Query(
+        None, description="关键词全文检索（姓名/地址/紧急联系人），结果按相关度排序"
+    ),
+    expand: Literal["primary_doctor"] | None = Query(None, description="展开关联数据"),
+    fields: str | None = Query(
+        None, description="稀疏字段集：逗号分隔的字段名，如 id,name，只查询并返回这些字段（总是包含 id）"
+    ),
+):
+    # 表版本号与查询参数都没变时直接返回 304，不再查询；展开医生时医生表的变化也要考虑
+    related = ("doctors",) if expand else ()
+    etag, cached = await check_list_etag(request, "patients", *related)
+    if cached is not None:
+        return cached
+    result = await run_in_db(list_patients_service, page, q, expand, fields=fields)
+    return list_response(result, etag)
+
+
+@router.get(
+    "/changes",
+    summary="患者增量同步",
+    description="返回 since 之后新增、修改和删除（墓碑）的患者，按变更序号升序，每条记录只出现一次；"
+    "首次同步传 since=0，之后传上次返回的 nextSince",
+    response_model=ApiResponse[ChangesResponse[Patient]],
+)
+async def list_patient_changes(
+    since: int = Query(0, ge=0, description="上次返回的 nextSince，首次同步传 0"),
+    limit: int = Query(
+        settings.changes_page_size,
+        ge=1,
+        le=settings.changes_max_page_size,
+        description="每次最多返回的变更条数",
+    ),
+):
+    # 必须声明在 /{id} 之前
+    return api_response(await run_in_db(list_patient_changes_service, since, limit))
+
+
+@router.get(
+    "/export",
+    summary="导出患者",
+    description="按主键顺序流式导出全部患者，支持 NDJSON 与 CSV，内存占用与数据量无关",
+    response_class=StreamingResponse,
+)
+async def export_patients(
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="导出格式"),
+):
+    # 必须声明在 /{id} 之前，避免 export 被当成路径参数
+    return StreamingResponse(
+        export_patients_service(format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers=export_headers("patients", format),
+    )
 
 
 @router.get("/{patient_id}", summary="患者详情", response_model=ApiResponse[Patient])
-def get_patient(patient_id: int):
-    # path 参数由 FastAPI 自动校验类型
-    return get_patient_by_id_service(patient_id)
+async def get_patient(
+    patient_id: int,
+    request: Request,
+    fields: str | None = Query(
+        None, description="稀疏字段集：逗号分隔的字段名，如 id,name，只查询并返回这些字段（总是包含 id）"
+    ),
+):
+    # path 参数由 FastAPI 自动校验类型；ETag 与 If-None-Match 一致时返回 304
+    # 稀疏字段集不是完整表示，不返回 ETag
+    result = await run_in_db(get_patient_by_id_service, patient_id, fields)
+    if fields:
+        return api_response(result)
+    return conditional_get(request, result, "patients")
 
 
 @router.post("", summary="新增患者", response_model=ApiResponse[Patient])
-def create_patient(payload: CreatePatient):
+async def create_patient(payload: CreatePatient):
     # body 参数交由 Pydantic 做校验
-    return create_patient_service(payload)
+    return api_response(await run_in_db(create_patient_service, payload))
+
+
+@router.post(
+    "/bulk",
+    summary="批量新增患者",
+    description="请求体为 CreatePatient 的 JSON 数组或 NDJSON（Content-Type: application/x-ndjson），"
+    "逐行校验后一次事务写入，返回每行的新ID或失败原因",
+    response_model=ApiResponse[BulkResult],
+    openapi_extra=bulk_openapi_extra("CreatePatient"),
+)
+async def bulk_create_patients(request: Request):
+    # 直接读取原始请求体，单行校验失败不影响其他行
+    # 解析大请求体是 CPU 密集操作，放到线程池执行，不阻塞事件循环
+    body = await request.body()
+    try:
+        items = await run_in_db(parse_bulk_body, body, request.headers.get("content-type", ""))
+    except ValueError as e:
+        return api_response(ApiResponse.error(code=ErrorCode.PARAM_ERROR, msg=str(e)))
+    return api_response(await run_in_db(bulk_create_patients_service, items))
 
 
 @router.put("/{patient_id}", summary="修改患者", response_model=ApiResponse[Patient])
-def update_patient(patient_id: int, payload: UpdatePatient):
+async def update_patient(
+    patient_id: int,
+    payload: UpdatePatient,
+    if_match: str | None = Header(None, alias="If-Match", description="乐观并发控制：传入详情接口返回的 ETag，版本不一致时返回 412"),
+):
     # 更新只传入变更字段
-    return update_patient_service(patient_id, payload)
+    expected_version = parse_if_match(if_match, "patients", patient_id)
+    result = await run_in_db(update_patient_service, patient_id, payload, expected_version)
+    return apply_write_etag(result, "patients")
 
 
 @router.delete("/{patient_id}", summary="删除患者", response_model=ApiResponse[None])
-def delete_patient(patient_id: int):
+async def delete_patient(patient_id: int):
     # 删除返回空 data
-    return delete_patient_service(patient_id)
+    return api_response(await run_in_db(delete_patient_service, patient_id))
@@ -1,4 +1,8 @@
-from fastapi import APIRouter, Query, Header, Depends
+from fastapi import APIRouter, Query, Header, Depends, Request
+from fastapi.responses import StreamingResponse
+from typing import Literal
+from app.config import settings
+from app.db import run_in_db
 from app.schemas.user import (
     User,
     CreateUser,
@@ -7,11 +11,21 @@ from app.schemas.user import (
     PageResult,
     PageParams,
     PageResponse,
+    BulkResult,
+    ChangesResponse,
+    ErrorCode,
 )
+from app.bulk import parse_bulk_body, bulk_openapi_extra
+from app.export import EXPORT_MEDIA_TYPES, export_headers
+from app.responses import api_response
+from app.etag import apply_write_etag, check_list_etag, conditional_get, list_response, parse_if_match
 from app.services.user import (
+    export_users_service,
+    list_user_changes_service,
     get_user_by_id_service,
     get_all_users,
     create_user_service,
+    bulk_create_users_service,
     update_user_service,
     delete_user_service,
 )
@@ -23,39 +37,123 @@ router = APIRouter(prefix="/users", tags=["用户管理"])
 @router.get(
     "",
     summary="查询用户列表",
-    description="分页查询用户列表，支持角色筛选",
+    description="分页查询用户列表，支持角色筛选，支持 pageNum/pageSize 与 cursor 游标翻页",
     response_model=ApiResponse[PageResponse[User]],
 )
-def get_users(
+async def get_users(
+    request: Request,
     authorization: str = Header(None, description="登录令牌，格式：Bearer <token>"),
     page: PageParams = Depends(),
     name: str | None = Query(None, description="用户姓名"),
     role: str | None = Query(None, description="用户角色"),
     email: str | None = Query(None, description="用户邮箱"),
     phone: str | None = Query(None, description="用户手机号"),
+    q: str | None = Query(None, description="关键词全文检索（姓名），结果按相关度排序"),
+    fields: str | None = Query(
+        None, description="稀疏字段集：逗号分隔的字段名，如 id,name，只查询并返回这些字段（总是包含 id）"
+    ),
 ):
-    return get_all_users(page, name, role, email, phone)
+    # 表版本号与查询参数都没变时直接返回 304，不再查询
+    etag, cached = await check_list_etag(request, "users")
+    if cached is not None:
+        return cached
+    result = await run_in_db(get_all_users, page, name, role, email, phone, q, fields)
+    return list_response(result, etag)
+
+
+# 增量同步用户
+@router.get(
+    "/changes",
+    summary="用户增量同步",
+    description="返回 since 之后新增、修改和删除（墓碑）的用户，按变更序号升序，每条记录只出现一次；"
+    "首次同步传 since=0，之后传上次返回的 nextSince",
+    response_model=ApiResponse[ChangesResponse[User]],
+)
+async def list_user_changes(
+    since: int = Query(0, ge=0, description="上次返回的 nextSince，首次同步传 0"),
+    limit: int = Query(
+        settings.changes_page_size,
+        ge=1,
+        le=settings.changes_max_page_size,
+        description="每次最多返回的变更条数",
+    ),
+):
+    # 必须声明在 /{id} 之前
+    return api_response(await run_in_db(list_user_changes_service, since, limit))
+
+
+# 流式导出用户
+@router.get(
+    "/export",
+    summary="导出用户",
+    description="按主键顺序流式导出全部用户，支持 NDJSON 与 CSV，内存占用与数据量无关",
+    response_class=StreamingResponse,
+)
+async def export_users(
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="导出格式"),
+):
+    # 必须声明在 /{id} 之前，避免 export 被当成路径参数
+    return StreamingResponse(
+        export_users_service(format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers=export_headers("users", format),
+    )
 
 
 # 通过id获取用户详情
 @router.get("/{id}", summary="用户详情", response_model=ApiResponse[User])
-def get_user_by_id(id: int):
-    return get_user_by_id_service(id)
+async def get_user_by_id(
+    id: int,
+    request: Request,
+    fields: str | None = Query(
+        None, description="稀疏字段集：逗号分隔的字段名，如 id,name，只查询并返回这些字段（总是包含 id）"
+    ),
+):
+    # ETag 与 If-None-Match 一致时返回 304；稀疏字段集不是完整表示，不返回 ETag
+    result = await run_in_db(get_user_by_id_service, id, fields)
+    if fields:
+        return api_response(result)
+    return conditional_get(request, result, "users")
 
 
 # 新增用户
 @router.post("", summary="新增用户", response_model=ApiResponse[User])
-def create_user(user: CreateUser):
-    return create_user_service(user)
+async def create_user(user: CreateUser):
+    return api_response(await run_in_db(create_user_service, user))
+
+
+# 批量新增用户
+@router.post(
+    "/bulk",
+    summary="批量新增用户",
+    description="请求体为 CreateUser 的 JSON 数组或 NDJSON（Content-Type: application/x-ndjson），"
+    "逐行校验后一次事务写入，返回每行的新ID或失败原因",
+    response_model=ApiResponse[BulkResult],
+    openapi_extra=bulk_openapi_extra("CreateUser"),
+)
+async def bulk_create_users(request: Request):
+    # 解析大请求体是 CPU 密集操作，放到线程池执行，不阻塞事件循环
+    body = await request.body()
+    try:
+        items = await run_in_db(parse_bulk_body, body, request.headers.get("content-type", ""))
+    except ValueError as e:
+        return api_response(ApiResponse.error(code=ErrorCode.PARAM_ERROR, msg=str(e)))
+    return api_response(await run_in_db(bulk_create_users_service, items))
 
 
 # 修改用户
 @router.put("/{id}", summary="修改用户", response_model=ApiResponse[User])
-def update_user(id: int, user: UpdateUser):
-    return update_user_service(id, user)
+async def update_user(
+    id: int,
+    user: UpdateUser,
+    if_match: str | None = Header(None, alias="If-Match", description="乐观并发控制：传入详情接口返回的 ETag，版本不一致时返回 412"),
+):
+    expected_version = parse_if_match(if_match, "users", id)
+    result = await run_in_db(update_user_service, id, user, expected_version)
+    return apply_write_etag(result, "users")
 
 
 # 删除用户
 @router.delete("/{id}", summary="删除用户", response_model=ApiResponse[None])
-def delete_user(id: int):
-    return delete_user_service(id)
+async def delete_user(id: int):
+    return api_response(await run_in_db(delete_user_service, id))
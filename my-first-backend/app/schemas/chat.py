@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional, Literal, Any
+from typing import Optional, Literal, Any, NamedTuple
 from uuid import UUID, uuid4
 
 
@@ -13,6 +13,17 @@ class ChatRequest(BaseModel):
     model_id: int = Field(..., description="模型ID")
     prompt_id: int = Field(..., description="提示词ID")
     user_role: Literal["patient", "doctor"] = Field(..., description="用户角色")
+    coalesce_window_ms: Optional[float] = Field(
+        None,
+        ge=0,
+        le=2000,
+        description="delta 合并窗口（毫秒），窗口内的 delta 合并为一帧发送；0 表示不合并，不传使用业务场景/默认配置",
+    )
+    coalesce_max_bytes: Optional[int] = Field(
+        None,
+        ge=0,
+        description="合并的内容达到该字节数时立即发送，0 表示不限，不传使用业务场景/默认配置",
+    )
 
 
 class SSEEventData(BaseModel):
@@ -30,6 +41,17 @@ class DeltaData(BaseModel):
     tool_calls: Optional[Any] = None
 
 
+class Delta(NamedTuple):
+    """
+    delta 事件数据的轻量结构（字段与 DeltaData 一致）
+
+    流式生成的热路径上使用，避免每个 token 创建 Pydantic 模型；DeltaData 仅用于文档。
+    """
+    content: str = ""
+    thinking_content: str = ""
+    tool_calls: Optional[Any] = None
+
+
 class FinalData(BaseModel):
     """final 事件的数据结构"""
     result_type: Literal["text", "tool"] = Field(..., description="结果类型")
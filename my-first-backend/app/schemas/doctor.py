@@ -13,6 +13,8 @@ class Doctor(BaseModel):
     office: Optional[str] = Field(None, title="办公室", description="办公室位置")
     hire_date: Optional[str] = Field(None, title="入职日期", description="YYYY-MM-DD")
     created_at: str = Field(..., title="创建时间", description="创建时间 ISO 格式")
+    updated_at: Optional[str] = Field(None, title="更新时间", description="最后修改时间 ISO 格式")
+    row_version: int = Field(1, title="版本号", description="每次修改 +1，用于 ETag / If-Match")
 
 
 class CreateDoctor(BaseModel):
@@ -1,6 +1,8 @@
 from typing import Optional
 from pydantic import BaseModel, Field
 
+from app.schemas.doctor import Doctor
+
 
 class Patient(BaseModel):
     id: int = Field(..., title="患者ID", description="患者唯一标识")
@@ -15,6 +17,16 @@ class Patient(BaseModel):
         None, title="主治医生", description="主治医生ID"
     )
     created_at: str = Field(..., title="创建时间", description="创建时间 ISO 格式")
+    updated_at: Optional[str] = Field(None, title="更新时间", description="最后修改时间 ISO 格式")
+    row_version: int = Field(1, title="版本号", description="每次修改 +1，用于 ETag / If-Match")
+
+
+class PatientExpanded(Patient):
+    """带关联数据的患者（expand=primary_doctor）"""
+
+    primary_doctor: Optional[Doctor] = Field(
+        None, title="主治医生", description="仅在 expand=primary_doctor 时返回"
+    )
 
 
 class CreatePatient(BaseModel):
@@ -1,13 +1,40 @@
 from pydantic import BaseModel, Field, field_validator , EmailStr
-from typing import Generic, TypeVar, Optional
+from typing import Generic, TypeVar, Optional, Literal
 import re
+from app.config import settings
 
 T = TypeVar("T")
 
 
 class PageParams(BaseModel):
     pageNum: int = Field(1, title="页码", description="当前页码")
-    pageSize: int = Field(10, title="每页数量", description="每页返回的数据条数")
+    pageSize: int = Field(
+        settings.default_page_size,
+        title="每页数量",
+        description=f"每页返回的数据条数，最大 {settings.max_page_size}",
+    )
+    cursor: Optional[str] = Field(
+        None,
+        title="游标",
+        description="上一页返回的 nextCursor；传入后按主键定位下一页，忽略 pageNum",
+    )
+    totalMode: Literal["exact", "approx", "none"] = Field(
+        settings.page_total_mode,
+        title="总数模式",
+        description="exact 精确总数；approx 带筛选时允许短时间缓存的近似总数；none 不返回总数",
+    )
+
+    @field_validator("pageNum")
+    @classmethod
+    def validate_page_num(cls, v: int) -> int:
+        """页码从 1 开始"""
+        return max(1, v)
+
+    @field_validator("pageSize")
+    @classmethod
+    def validate_page_size(cls, v: int) -> int:
+        """每页数量限制在 [1, max_page_size]"""
+        return min(max(1, v), settings.max_page_size)
 
 class BusinessCode:
     """
@@ -22,6 +49,8 @@ class BusinessCode:
     UNAUTHORIZED = 401   # Unauthorized: 未登录/Token无效
     FORBIDDEN = 403      # Forbidden: 已登录但无权访问（你之前用的1004不符合标准）
     NOT_FOUND = 404      # Not Found: 资源不存在
+    GONE = 410           # Gone: 资源曾经存在但已不可用（如续传所需的帧已过期）
+    PRECONDITION_FAILED = 412  # Precondition Failed: If-Match 版本不一致（已被他人修改）
 
     # 服务端错误 (5xx)
     INTERNAL_ERROR = 500 # Internal Server Error: 服务器内部崩溃或代码逻辑错误
@@ -36,6 +65,8 @@ class ErrorCode:
     UNAUTHORIZED = 401   # Unauthorized: 未登录/Token无效
     FORBIDDEN = 403      # Forbidden: 已登录但无权访问（你之前用的1004不符合标准）
     NOT_FOUND = 404      # Not Found: 资源不存在
+    GONE = 410           # Gone: 资源曾经存在但已不可用（如续传所需的帧已过期）
+    PRECONDITION_FAILED = 412  # Precondition Failed: If-Match 版本不一致（已被他人修改）
 
     # 服务端错误 (5xx)
     INTERNAL_ERROR = 500 # Internal Server Error: 服务器内部崩溃或代码逻辑错误
@@ -67,6 +98,8 @@ class User(BaseModel):
     role: str = Field(None, title="用户角色", description="用户在系统中的角色标识")
     status: int = Field(..., title="状态")
     created_at: str = Field(..., title="创建时间")
+    updated_at: Optional[str] = Field(None, title="更新时间")
+    row_version: int = Field(1, title="版本号", description="每次修改 +1，用于 ETag / If-Match")
 
 
 class CreateUser(BaseModel):
@@ -127,8 +160,51 @@ class PageResult(BaseModel, Generic[T]):
 class PageResponse(PageParams, Generic[T]):
     """
     分页响应模型（继承分页请求参数）
-    包含：pageNum / pageSize / total / rows
+    包含：pageNum / pageSize / total / rows / nextCursor
     """
 
-    total: int = Field(..., title="总记录数量", description="符合条件的总数据量")
+    total: Optional[int] = Field(
+        ..., title="总记录数量", description="符合条件的总数据量，totalMode=none 时为空"
+    )
     rows: list[T] = Field(..., title="列表数据", description="当前页的数据列表")
+    nextCursor: Optional[str] = Field(
+        None, title="下一页游标", description="传给下一次请求的 cursor，为空表示没有更多数据"
+    )
+
+
+
+class BulkItemResult(BaseModel):
+    """批量导入中单行的结果"""
+
+    index: int = Field(..., title="行号", description="在请求数组/NDJSON 中的下标，从 0 开始")
+    id: Optional[int] = Field(None, title="新记录ID", description="创建成功时返回")
+    error: Optional[str] = Field(None, title="失败原因", description="校验失败或数据冲突的原因")
+
+
+class BulkResult(BaseModel):
+    """批量导入结果"""
+
+    created: int = Field(..., title="成功条数")
+    failed: int = Field(..., title="失败条数")
+    rows: list[BulkItemResult] = Field(..., title="逐行结果", description="按请求顺序排列")
+
+
+class ChangeItem(BaseModel, Generic[T]):
+    """增量同步中的一条变更"""
+
+    seq: int = Field(..., title="变更序号", description="单调递增")
+    op: Literal["insert", "update", "delete"] = Field(
+        ..., title="变更类型", description="insert/update 按 id 覆盖本地数据；delete 为墓碑，删除本地数据"
+    )
+    id: int = Field(..., title="记录ID")
+    data: Optional[T] = Field(None, title="当前数据", description="op=delete 时为空")
+
+
+class ChangesResponse(BaseModel, Generic[T]):
+    """增量同步结果"""
+
+    rows: list[ChangeItem[T]] = Field(..., title="变更列表", description="按 seq 升序，每条记录只出现一次")
+    nextSince: int = Field(
+        ..., title="下次同步游标", description="下次请求传入的 since；没有新变更时与本次相同"
+    )
+    hasMore: bool = Field(..., title="是否还有更多", description="为 true 时应立即用 nextSince 继续拉取")
@@ -0,0 +1,121 @@
+import logging
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+# 全文检索配置：表名 -> 参与检索的列
+FTS_COLUMNS = {
+    "users": ("name",),
+    "doctors": ("name",),
+    "patients": ("name", "address", "emergency_contact"),
+}
+
+# trigram 分词器按 3 个字符切分，更短的关键词无法命中索引
+MIN_FTS_QUERY_LENGTH = 3
+
+
+def create_fts_tables(conn: sqlite3.Connection, tables: tuple[str, ...] | None = None) -> None:
+    """
+    创建 FTS5 外部内容表并用触发器与主表保持同步
+
+    使用 trigram 分词器，中文等无空格文本也能做子串检索。
+
+    :param tables: 只创建这些表的索引，默认全部
+    """
+    cur = conn.cursor()
+    for table in tables or tuple(FTS_COLUMNS):
+        columns = FTS_COLUMNS[table]
+        fts = f"{table}_fts"
+        cols = ", ".join(columns)
+        new_cols = ", ".join(f"new.{c}" for c in columns)
+        old_cols = ", ".join(f"old.{c}" for c in columns)
+        cur.execute(
+            f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                {cols}, content='{table}', content_rowid='id', tokenize='trigram'
+            )
+            """
+        )
+        cur.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_fts_insert AFTER INSERT ON {table}
+            BEGIN
+                INSERT INTO {fts} (rowid, {cols}) VALUES (new.id, {new_cols});
+            END
+            """
+        )
+        cur.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_fts_delete AFTER DELETE ON {table}
+            BEGIN
+                INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+            END
+            """
+        )
+        cur.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_fts_update AFTER UPDATE OF {cols} ON {table}
+            BEGIN
+                INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+                INSERT INTO {fts} (rowid, {cols}) VALUES (new.id, {new_cols});
+            END
+            """
+        )
+        # 用已有数据建立索引
+        cur.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+
+
+def ensure_fts_tables(conn: sqlite3.Connection) -> bool:
+    """
+    补建缺失的全文检索表（启动时调用）
+
+    SQLite 不支持 trigram 时迁移会跳过建表；升级 SQLite 后下次启动即可建立索引，
+    不需要再修改数据库版本号。
+
+    :return: 全文检索表是否齐全
+    """
+    cur = conn.cursor()
+    missing = tuple(table for table in FTS_COLUMNS if not has_fts(cur, table))
+    if not missing:
+        return True
+    try:
+        create_fts_tables(conn, missing)
+    except sqlite3.OperationalError as e:
+        # SQLite < 3.34 不支持 trigram：检索回退到 LIKE
+        logger.warning(f"当前 SQLite 不支持 FTS5 trigram，跳过全文检索索引: {e}")
+        return False
+    logger.info(f"已建立全文检索索引: {', '.join(missing)}")
+    return True
+
+
+def has_fts(cur, table: str) -> bool:
+    # 旧版 SQLite 不支持 trigram 时迁移会跳过建表，检索回退到 LIKE
+    cur.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (f"{table}_fts",)
+    )
+    return cur.fetchone() is not None
+
+
+def apply_search(cur, table: str, q: str, filters: list, params: list) -> tuple[str, str | None]:
+    """
+    把关键词检索条件追加到 filters/params
+
+    :param cur: sqlite 游标（用于检查 FTS 表是否存在）
+    :param table: 主表名
+    :param q: 用户输入的关键词
+    :return: (需要拼接到 FROM 之后的 JOIN 子句, 按相关度排序的 ORDER BY 表达式)；
+             回退到 LIKE 时 ORDER BY 为 None
+    """
+    q = q.strip()
+    columns = FTS_COLUMNS[table]
+    if len(q) >= MIN_FTS_QUERY_LENGTH and has_fts(cur, table):
+        fts = f"{table}_fts"
+        filters.append(f"{fts} MATCH ?")
+        # 整体作为短语检索，避免用户输入被解析成 FTS 语法
+        params.append('"' + q.replace('"', '""') + '"')
+        return f" JOIN {fts} ON {fts}.rowid = {table}.id", f"{fts}.rank, {table}.id DESC"
+
+    # 短关键词：trigram 无法匹配，退回子串 LIKE
+    filters.append("(" + " OR ".join(f"{table}.{c} LIKE ?" for c in columns) + ")")
+    params.extend([f"%{q}%"] * len(columns))
+    return "", None
@@ -1,17 +1,25 @@
 import asyncio
 import json
+import logging
 import uuid
-from typing import AsyncGenerator
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable, NamedTuple
 from app.schemas.chat import (
     ChatRequest,
-    SSEEventData,
-    DeltaData,
+    Delta,
     FinalData,
     ToolData,
     DigitalDoctorReasoningOutput,
     EvidenceConclusionOutput,
     PersonalizedAnalysisOutput,
 )
+from app.cache import TTLCache
+from app.config import settings
+from app.llm import LLMBackend, MockBackend, get_backend
+from app.replay import ReplayStream
+from app.schemas.user import ApiResponse, ErrorCode
+from app.sse import SSEEncoder, coalesce_deltas, keepalive
+
+logger = logging.getLogger(__name__)
 
 
 def _generate_mock_digital_doctor_reasoning() -> dict:
@@ -214,214 +222,295 @@ def _generate_mock_personalized_analysis() -> dict:
     }
 
 
-async def chat_stream(request: ChatRequest) -> AsyncGenerator[str, None]:
+async def _mock_events(request: ChatRequest) -> AsyncIterator[tuple[str, Any]]:
+    """
+    模拟模型输出：按顺序产生 (事件类型, 数据)
+
+    delta 的数据为 Delta，tool / final 为 dict；SSE 编码由 chat_stream 统一处理。
+    未配置模型后端（settings.chat_backends 为空）、本地开发（settings.chat_dev_mock_backend）及测试中代替模型后端。
     """
-    聊天流式响应生成器
+    await asyncio.sleep(0.1)
     
+    # 模拟思考过程（delta 事件）- 增加更多思考内容
+    thinking_contents = [
+        "首先，我需要分析用户的输入内容。",
+        "用户说：\"{}\"。".format(request.user_input),
+        "用户处于{}模式，意味着用户是{}。".format(
+            request.user_role.upper(),
+            "患者" if request.user_role == "patient" else "医生"
+        ),
+        "根据业务场景 {}，我需要采用相应的处理策略。".format(request.business_scenario),
+        "当前使用的模型ID是 {}，提示词ID是 {}。".format(request.model_id, request.prompt_id),
+        "让我先理解用户的核心诉求和问题背景。",
+        "用户可能面临的问题包括：症状描述不清晰、需要专业建议、或者需要辅助诊断。",
+        "我需要结合医疗知识库和临床经验来提供准确的回答。",
+        "考虑到用户的角色是{}，回答的深度和专业程度需要适当调整。".format(
+            "患者" if request.user_role == "patient" else "医生"
+        ),
+        "现在开始生成回答内容，确保信息准确、易懂且具有指导意义。"
+    ]
+
+    for thinking in thinking_contents:
+        yield "delta", Delta(thinking_content=thinking)
+        await asyncio.sleep(0.15)
+
+    # 模拟内容生成（delta 事件）- 增加更多详细内容
+    content_parts = [
+        "感谢您的咨询。",
+        "根据您提供的信息，我将为您进行详细的分析和建议。",
+        "\n\n",
+        "**一、问题分析**\n\n",
+        "您提到的问题需要从多个角度进行考虑。",
+        "首先，我们需要明确症状的具体表现、持续时间以及可能的诱因。",
+        "其次，需要了解您的既往病史、用药情况以及家族病史等相关信息。",
+        "最后，结合您的年龄、性别、生活习惯等因素进行综合判断。",
+        "\n\n",
+        "**二、专业建议**\n\n",
+        "基于您的情况，我建议您：",
+        "\n1. ",
+        "及时就医，进行专业的医学检查。",
+        "建议您前往正规医院的相关科室（如内科、外科、专科门诊等）进行详细检查。",
+        "\n2. ",
+        "完善相关检查项目。",
+        "根据您的症状，可能需要进行血常规、尿常规、影像学检查（如X光、CT、MRI等）等检查。",
+        "这些检查有助于明确诊断，为后续治疗提供依据。",
+        "\n3. ",
+        "注意观察症状变化。",
+        "在就医前，请密切观察症状的变化情况，包括：",
+        "症状的严重程度、发作频率、持续时间、是否有加重或缓解的趋势等。",
+        "这些信息对医生的诊断非常有帮助。",
+        "\n4. ",
+        "保持良好的生活习惯。",
+        "在治疗期间，建议您：",
+        "保持充足的睡眠，避免熬夜；",
+        "饮食清淡，避免辛辣刺激食物；",
+        "适当运动，但避免剧烈运动；",
+        "保持心情愉悦，避免过度焦虑。",
+        "\n\n",
+        "**三、注意事项**\n\n",
+        "在等待就医或治疗期间，请注意以下几点：",
+        "\n- ",
+        "不要自行用药，尤其是处方药，应在医生指导下使用。",
+        "\n- ",
+        "如果症状突然加重或出现新的症状，应立即就医。",
+        "\n- ",
+        "保持与医生的良好沟通，及时反馈治疗效果和身体反应。",
+        "\n- ",
+        "定期复查，按照医生的建议进行随访。",
+        "\n\n",
+        "**四、后续建议**\n\n",
+        "建议您建立健康档案，记录症状变化、检查结果、用药情况等信息。",
+        "这将有助于医生更好地了解您的病情，制定个性化的治疗方案。",
+        "同时，建议您关注相关的健康知识，提高自我保健意识。",
+        "\n\n",
+        "希望以上信息对您有所帮助。",
+        "如果您还有其他问题或需要进一步咨询，请随时告诉我。",
+        "祝您早日康复！"
+    ]
+
+    for content in content_parts:
+        yield "delta", Delta(content=content)
+        await asyncio.sleep(0.1)
+
+    # 根据用户输入决定是否发送 tool 事件
+    should_send_tool = "分析" in request.user_input or "检查" in request.user_input
+
+    if should_send_tool:
+        # 发送 tool 事件（根据场景选择不同的工具）
+        tool_name = "evidence_conclusion"  # 可以根据业务逻辑选择
+        tool_output = {}
+
+        if tool_name == "digital_doctor_reasoning":
+            tool_output = _generate_mock_digital_doctor_reasoning()
+        elif tool_name == "evidence_conclusion":
+            tool_output = _generate_mock_evidence_conclusion()
+        elif tool_name == "personalized_analysis":
+            tool_output = _generate_mock_personalized_analysis()
+
+        yield "tool", ToolData(tool_name=tool_name, tool_output=tool_output).model_dump()
+        await asyncio.sleep(0.1)
+
+        # 发送 final 事件（tool 类型）
+        yield "final", FinalData(
+            result_type="tool",
+            text="",
+            data={
+                "tool_name": tool_name,
+                "tool_output": tool_output
+            }
+        ).model_dump()
+    else:
+        # 发送 final 事件（text 类型）- 汇总所有生成的内容
+        final_text = (
+            "感谢您的咨询。根据您提供的信息，我将为您进行详细的分析和建议。\n\n"
+            "**一、问题分析**\n\n"
+            "您提到的问题需要从多个角度进行考虑。首先，我们需要明确症状的具体表现、持续时间以及可能的诱因。"
+            "其次，需要了解您的既往病史、用药情况以及家族病史等相关信息。"
+            "最后，结合您的年龄、性别、生活习惯等因素进行综合判断。\n\n"
+            "**二、专业建议**\n\n"
+            "基于您的情况，我建议您：\n1. 及时就医，进行专业的医学检查。"
+            "建议您前往正规医院的相关科室（如内科、外科、专科门诊等）进行详细检查。\n2. 完善相关检查项目。"
+            "根据您的症状，可能需要进行血常规、尿常规、影像学检查（如X光、CT、MRI等）等检查。"
+            "这些检查有助于明确诊断，为后续治疗提供依据。\n3. 注意观察症状变化。"
+            "在就医前，请密切观察症状的变化情况，包括症状的严重程度、发作频率、持续时间、是否有加重或缓解的趋势等。"
+            "这些信息对医生的诊断非常有帮助。\n4. 保持良好的生活习惯。"
+            "在治疗期间，建议您保持充足的睡眠，避免熬夜；饮食清淡，避免辛辣刺激食物；"
+            "适当运动，但避免剧烈运动；保持心情愉悦，避免过度焦虑。\n\n"
+            "**三、注意事项**\n\n"
+            "在等待就医或治疗期间，请注意以下几点：\n- 不要自行用药，尤其是处方药，应在医生指导下使用。\n- "
+            "如果症状突然加重或出现新的症状，应立即就医。\n- 保持与医生的良好沟通，及时反馈治疗效果和身体反应。\n- "
+            "定期复查，按照医生的建议进行随访。\n\n"
+            "**四、后续建议**\n\n"
+            "建议您建立健康档案，记录症状变化、检查结果、用药情况等信息。"
+            "这将有助于医生更好地了解您的病情，制定个性化的治疗方案。"
+            "同时，建议您关注相关的健康知识，提高自我保健意识。\n\n"
+            "希望以上信息对您有所帮助。如果您还有其他问题或需要进一步咨询，请随时告诉我。祝您早日康复！"
+        )
+        yield "final", FinalData(result_type="text", text=final_text).model_dump()
+
+
+# 模拟后端：未配置 chat_backends 或开启 settings.chat_dev_mock_backend 时使用
+mock_backend = MockBackend(_mock_events)
+
+
+_mock_warned = False
+
+
+def _resolve_backend(model_id: int) -> LLMBackend | None:
+    # 未配置任何后端时保持开箱即用（模拟输出）；已配置后端时未知的 model_id 视为配置错误
+    global _mock_warned
+    backend = get_backend(model_id)
+    if backend is None and (settings.chat_dev_mock_backend or not settings.chat_backends):
+        if not _mock_warned:
+            _mock_warned = True
+            logger.warning("聊天使用模拟后端（固定的示例回答）：未配置 chat_backends 或开启了 chat_dev_mock_backend")
+        return mock_backend
+    return backend
+
+
+def _coalesce_options(request: ChatRequest) -> tuple[float, int]:
+    """
+    delta 合并参数 (窗口秒数, 字节上限)：请求参数 > business_scenario 配置 > 默认配置
+    """
+    scenario = settings.chat_coalesce_scenarios.get(request.business_scenario, {})
+    window_ms = request.coalesce_window_ms
+    if window_ms is None:
+        window_ms = scenario.get("window_ms", settings.chat_coalesce_window_ms)
+    max_bytes = request.coalesce_max_bytes
+    if max_bytes is None:
+        max_bytes = scenario.get("max_bytes", settings.chat_coalesce_max_bytes)
+    return window_ms / 1000, int(max_bytes)
+
+
+class _ChatStream(NamedTuple):
+    # 注册表中的一次生成：缓冲帧的回放流 + 编码器（ping / error 帧与原请求使用相同的信封）
+    stream: ReplayStream
+    encoder: SSEEncoder
+
+
+# request_id -> _ChatStream：生成中的流放在 _running，不受容量和过期时间限制；
+# 生成结束后移入 _streams，保留 chat_resume_ttl 秒供断线重连
+# 注：缓冲在进程内，多 worker 部署时续传请求需要路由到同一 worker（按 request_id 粘滞）
+# _streams 不命名：与数据库无关，clear_caches()（关闭连接池、切换数据库文件时调用）不应清空它
+_running: dict[str, _ChatStream] = {}
+_streams = TTLCache(maxsize=settings.chat_resume_max_streams, ttl=settings.chat_resume_ttl)
+
+
+def _get_chat_stream(request_id: str) -> _ChatStream | None:
+    chat = _running.get(request_id)
+    if chat is None:
+        chat = _streams.get(request_id)
+    return chat
+
+
+def start_chat_stream(request: ChatRequest) -> str:
+    """
+    启动一次聊天生成，生成在后台任务中执行，输出写入可回放的缓冲
+
     :param request: 聊天请求
-    :yield: SSE 格式的数据行
+    :return: request_id，用于订阅 / 断线续传
     """
     conversation_id = request.conversation_id or str(uuid.uuid4())
     request_id = str(uuid.uuid4())
-    
+    encoder = SSEEncoder(conversation_id, request_id)
+
+    def on_done() -> None:
+        # 从生成结束开始计算保留时间
+        _streams.set(request_id, chat)
+        _running.pop(request_id, None)
+
+    stream = ReplayStream(
+        _encode_events(request, encoder),
+        maxlen=settings.chat_resume_buffer_size,
+        grace=settings.chat_resume_grace_seconds,
+        on_cancel=lambda: encoder.encode("error"),
+        on_done=on_done,
+    )
+    chat = _ChatStream(stream, encoder)
+    _running[request_id] = chat
+    return request_id
+
+
+def subscribe_chat_stream(
+    request_id: str,
+    last_event_id: int = 0,
+    is_disconnected: Callable[[], Awaitable[bool]] | None = None,
+) -> AsyncGenerator[str, None] | ApiResponse:
+    """
+    订阅聊天流：回放 last_event_id 之后的帧，生成未结束时继续推送新帧
+
+    :param request_id: start_chat_stream 返回的 request_id
+    :param last_event_id: 客户端已收到的最后一帧 id（SSE Last-Event-ID），0 表示从头开始
+    :param is_disconnected: 检查客户端是否已断开（如 Request.is_disconnected）
+    :return: 逐帧产生 SSE 数据的异步生成器；流不存在或所需的帧已过期时返回 ApiResponse 错误
+    """
+    chat = _get_chat_stream(request_id)
+    if chat is None:
+        return ApiResponse.error(code=ErrorCode.NOT_FOUND, msg="聊天流不存在或已过期")
+    if not chat.stream.can_resume(last_event_id):
+        return ApiResponse.error(code=ErrorCode.GONE, msg="Last-Event-ID 之后的部分数据已过期，请重新发起聊天")
+    # 空闲时插入 ping 帧（不带 id，不进入缓冲）；客户端断开后结束订阅
+    return keepalive(
+        chat.stream.subscribe(last_event_id),
+        lambda: chat.encoder.encode("ping"),
+        settings.chat_ping_interval,
+        is_disconnected,
+        settings.chat_disconnect_poll_interval,
+    )
+
+
+def chat_stream(
+    request: ChatRequest, is_disconnected: Callable[[], Awaitable[bool]] | None = None
+) -> AsyncGenerator[str, None]:
+    """
+    聊天流式响应生成器：启动生成并从头订阅
+
+    :param request: 聊天请求
+    :param is_disconnected: 检查客户端是否已断开（如 Request.is_disconnected）
+    :return: 逐帧产生 SSE 格式数据行的异步生成器
+    """
+    return subscribe_chat_stream(start_chat_stream(request), 0, is_disconnected)
+
+
+async def _encode_events(request: ChatRequest, encoder: SSEEncoder) -> AsyncGenerator[str, None]:
+    backend = _resolve_backend(request.model_id)
+    # 发送 start 事件
+    yield encoder.encode("start")
+    if backend is None:
+        # 不回退到模拟输出，避免配置错误被当成真实回答
+        logger.warning(f"聊天模型未配置 [model_id={request.model_id}]")
+        yield encoder.encode("error", {"message": f"模型未配置: model_id={request.model_id}"})
+        return
+
+    events = backend.stream(request)
+    window, max_bytes = _coalesce_options(request)
+    if window > 0:
+        # 窗口内的 delta 合并为一帧
+        events = coalesce_deltas(events, window, max_bytes)
     try:
-        # 发送 start 事件
-        start_event = SSEEventData(
-            event="start",
-            conversation_id=conversation_id,
-            request_id=request_id,
-            data=None
-        )
-        yield f"data: {start_event.model_dump_json()}\n\n"
-        await asyncio.sleep(0.1)
-        
-        # 模拟思考过程（delta 事件）- 增加更多思考内容
-        thinking_contents = [
-            "首先，我需要分析用户的输入内容。",
-            "用户说：\"{}\"。".format(request.user_input),
-            "用户处于{}模式，意味着用户是{}。".format(
-                request.user_role.upper(),
-                "患者" if request.user_role == "patient" else "医生"
-            ),
-            "根据业务场景 {}，我需要采用相应的处理策略。".format(request.business_scenario),
-            "当前使用的模型ID是 {}，提示词ID是 {}。".format(request.model_id, request.prompt_id),
-            "让我先理解用户的核心诉求和问题背景。",
-            "用户可能面临的问题包括：症状描述不清晰、需要专业建议、或者需要辅助诊断。",
-            "我需要结合医疗知识库和临床经验来提供准确的回答。",
-            "考虑到用户的角色是{}，回答的深度和专业程度需要适当调整。".format(
-                "患者" if request.user_role == "patient" else "医生"
-            ),
-            "现在开始生成回答内容，确保信息准确、易懂且具有指导意义。"
-        ]
-        
-        for thinking in thinking_contents:
-            delta_event = SSEEventData(
-                event="delta",
-                conversation_id=conversation_id,
-                request_id=request_id,
-                data=DeltaData(
-                    content="",
-                    thinking_content=thinking,
-                    tool_calls=None
-                ).model_dump()
-            )
-            yield f"data: {delta_event.model_dump_json()}\n\n"
-            await asyncio.sleep(0.15)
-        
-        # 模拟内容生成（delta 事件）- 增加更多详细内容
-        content_parts = [
-            "感谢您的咨询。",
-            "根据您提供的信息，我将为您进行详细的分析和建议。",
-            "\n\n",
-            "**一、问题分析**\n\n",
-            "您提到的问题需要从多个角度进行考虑。",
-            "首先，我们需要明确症状的具体表现、持续时间以及可能的诱因。",
-            "其次，需要了解您的既往病史、用药情况以及家族病史等相关信息。",
-            "最后，结合您的年龄、性别、生活习惯等因素进行综合判断。",
-            "\n\n",
-            "**二、专业建议**\n\n",
-            "基于您的情况，我建议您：",
-            "\n1. ",
-            "及时就医，进行专业的医学检查。",
-            "建议您前往正规医院的相关科室（如内科、外科、专科门诊等）进行详细检查。",
-            "\n2. ",
-            "完善相关检查项目。",
-            "根据您的症状，可能需要进行血常规、尿常规、影像学检查（如X光、CT、MRI等）等检查。",
-            "这些检查有助于明确诊断，为后续治疗提供依据。",
-            "\n3. ",
-            "注意观察症状变化。",
-            "在就医前，请密切观察症状的变化情况，包括：",
-            "症状的严重程度、发作频率、持续时间、是否有加重或缓解的趋势等。",
-            "这些信息对医生的诊断非常有帮助。",
-            "\n4. ",
-            "保持良好的生活习惯。",
-            "在治疗期间，建议您：",
-            "保持充足的睡眠，避免熬夜；",
-            "饮食清淡，避免辛辣刺激食物；",
-            "适当运动，但避免剧烈运动；",
-            "保持心情愉悦，避免过度焦虑。",
-            "\n\n",
-            "**三、注意事项**\n\n",
-            "在等待就医或治疗期间，请注意以下几点：",
-            "\n- ",
-            "不要自行用药，尤其是处方药，应在医生指导下使用。",
-            "\n- ",
-            "如果症状突然加重或出现新的症状，应立即就医。",
-            "\n- ",
-            "保持与医生的良好沟通，及时反馈治疗效果和身体反应。",
-            "\n- ",
-            "定期复查，按照医生的建议进行随访。",
-            "\n\n",
-            "**四、后续建议**\n\n",
-            "建议您建立健康档案，记录症状变化、检查结果、用药情况等信息。",
-            "这将有助于医生更好地了解您的病情，制定个性化的治疗方案。",
-            "同时，建议您关注相关的健康知识，提高自我保健意识。",
-            "\n\n",
-            "希望以上信息对您有所帮助。",
-            "如果您还有其他问题或需要进一步咨询，请随时告诉我。",
-            "祝您早日康复！"
-        ]
-        
-        for content in content_parts:
-            delta_event = SSEEventData(
-                event="delta",
-                conversation_id=conversation_id,
-                request_id=request_id,
-                data=DeltaData(
-                    content=content,
-                    thinking_content="",
-                    tool_calls=None
-                ).model_dump()
-            )
-            yield f"data: {delta_event.model_dump_json()}\n\n"
-            await asyncio.sleep(0.1)
-        
-        # 根据用户输入决定是否发送 tool 事件
-        should_send_tool = "分析" in request.user_input or "检查" in request.user_input
-        
-        if should_send_tool:
-            # 发送 tool 事件（根据场景选择不同的工具）
-            tool_name = "evidence_conclusion"  # 可以根据业务逻辑选择
-            tool_output = {}
-            
-            if tool_name == "digital_doctor_reasoning":
-                tool_output = _generate_mock_digital_doctor_reasoning()
-            elif tool_name == "evidence_conclusion":
-                tool_output = _generate_mock_evidence_conclusion()
-            elif tool_name == "personalized_analysis":
-                tool_output = _generate_mock_personalized_analysis()
-            
-            tool_event = SSEEventData(
-                event="tool",
-                conversation_id=conversation_id,
-                request_id=request_id,
-                data=ToolData(
-                    tool_name=tool_name,
-                    tool_output=tool_output
-                ).model_dump()
-            )
-            yield f"data: {tool_event.model_dump_json()}\n\n"
-            await asyncio.sleep(0.1)
-            
-            # 发送 final 事件（tool 类型）
-            final_event = SSEEventData(
-                event="final",
-                conversation_id=conversation_id,
-                request_id=request_id,
-                data=FinalData(
-                    result_type="tool",
-                    text="",
-                    data={
-                        "tool_name": tool_name,
-                        "tool_output": tool_output
-                    }
-                ).model_dump()
-            )
-            yield f"data: {final_event.model_dump_json()}\n\n"
-        else:
-            # 发送 final 事件（text 类型）- 汇总所有生成的内容
-            final_text = (
-                "感谢您的咨询。根据您提供的信息，我将为您进行详细的分析和建议。\n\n"
-                "**一、问题分析**\n\n"
-                "您提到的问题需要从多个角度进行考虑。首先，我们需要明确症状的具体表现、持续时间以及可能的诱因。"
-                "其次，需要了解您的既往病史、用药情况以及家族病史等相关信息。"
-                "最后，结合您的年龄、性别、生活习惯等因素进行综合判断。\n\n"
-                "**二、专业建议**\n\n"
-                "基于您的情况，我建议您：\n1. 及时就医，进行专业的医学检查。"
-                "建议您前往正规医院的相关科室（如内科、外科、专科门诊等）进行详细检查。\n2. 完善相关检查项目。"
-                "根据您的症状，可能需要进行血常规、尿常规、影像学检查（如X光、CT、MRI等）等检查。"
-                "这些检查有助于明确诊断，为后续治疗提供依据。\n3. 注意观察症状变化。"
-                "在就医前，请密切观察症状的变化情况，包括症状的严重程度、发作频率、持续时间、是否有加重或缓解的趋势等。"
-                "这些信息对医生的诊断非常有帮助。\n4. 保持良好的生活习惯。"
-                "在治疗期间，建议您保持充足的睡眠，避免熬夜；饮食清淡，避免辛辣刺激食物；"
-                "适当运动，但避免剧烈运动；保持心情愉悦，避免过度焦虑。\n\n"
-                "**三、注意事项**\n\n"
-                "在等待就医或治疗期间，请注意以下几点：\n- 不要自行用药，尤其是处方药，应在医生指导下使用。\n- "
-                "如果症状突然加重或出现新的症状，应立即就医。\n- 保持与医生的良好沟通，及时反馈治疗效果和身体反应。\n- "
-                "定期复查，按照医生的建议进行随访。\n\n"
-                "**四、后续建议**\n\n"
-                "建议您建立健康档案，记录症状变化、检查结果、用药情况等信息。"
-                "这将有助于医生更好地了解您的病情，制定个性化的治疗方案。"
-                "同时，建议您关注相关的健康知识，提高自我保健意识。\n\n"
-                "希望以上信息对您有所帮助。如果您还有其他问题或需要进一步咨询，请随时告诉我。祝您早日康复！"
-            )
-            final_event = SSEEventData(
-                event="final",
-                conversation_id=conversation_id,
-                request_id=request_id,
-                data=FinalData(
-                    result_type="text",
-                    text=final_text
-                ).model_dump()
-            )
-            yield f"data: {final_event.model_dump_json()}\n\n"
-            
+        async for event, data in events:
+            yield encoder.encode(event, data)
     except Exception as e:
         # 发送 error 事件
-        error_event = SSEEventData(
-            event="error",
-            conversation_id=conversation_id,
-            request_id=request_id,
-            data=None
-        )
-        yield f"data: {error_event.model_dump_json()}\n\n"
\ No newline at end of file
+        logger.error(f"聊天生成失败 [request_id={encoder.request_id}]: {str(e)}", exc_info=True)
+        yield encoder.encode("error")
@@ -1,7 +1,20 @@
 import sqlite3
 from app.schemas.doctor import Doctor, CreateDoctor, UpdateDoctor
-from app.schemas.user import ApiResponse, ErrorCode
+from app.schemas.user import (
+    ApiResponse,
+    ChangeItem,
+    ChangesResponse,
+    ErrorCode,
+    PageParams,
+    PageResponse,
+)
 from app.repositories import doctor_repo
+from app.repositories.base import partial_model
+from app.services.patient import list_patients_service
+from app.pagination import resolve_page, split_page
+from app.bulk import validate_bulk, merge_bulk_results
+from app.export import stream_export
+from app.config import settings
 
 
 def _to_dict(model):
@@ -9,25 +22,124 @@ def _to_dict(model):
     return model.model_dump() if hasattr(model, "model_dump") else model.dict()
 
 
-def list_doctors_service():
-    # 返回医生列表
-    doctors = [Doctor(**row) for row in doctor_repo.list_doctors()]
-    return ApiResponse.success(doctors)
+def _parse_ids(raw: str) -> list[int]:
+    # "1,2,3" -> [1, 2, 3]，忽略空项；含非数字时抛 ValueError
+    return [int(part) for part in raw.split(",") if part.strip()]
 
 
-def get_doctor_by_id_service(doctor_id: int):
-    # 查询单个医生
-    row = doctor_repo.get_doctor_by_id(doctor_id)
+def list_doctors_service(
+    page: PageParams = PageParams(),
+    name: str | None = None,
+    department: str | None = None,
+    title: str | None = None,
+    q: str | None = None,
+    ids: str | None = None,
+    fields: str | None = None,
+):
+    # 分页返回医生列表，支持姓名/科室/职称筛选；q 检索按相关度排序，只支持 pageNum 翻页
+    # fields 为稀疏字段集，只查询并返回这些列
+    try:
+        columns = doctor_repo.resolve_doctor_fields(fields)
+    except ValueError as e:
+        return ApiResponse.error(code=ErrorCode.PARAM_ERROR, msg=str(e))
+    if ids is not None:
+        return _get_doctors_by_ids_service(page, ids, columns)
+    try:
+        limit, offset, after_id = resolve_page(page, allow_cursor=not q)
+    except ValueError:
+        return ApiResponse.error(code=ErrorCode.PARAM_ERROR, msg="invalid cursor")
+    rows, total = doctor_repo.list_doctors(
+        limit=limit,
+        offset=offset,
+        name=name,
+        department=department,
+        title=title,
+        after_id=after_id,
+        total_mode=page.totalMode,
+        q=q,
+        fields=columns,
+    )
+    rows, next_cursor = split_page(rows, page.pageSize, with_cursor=not q)
+    return ApiResponse.success(
+        PageResponse[partial_model(Doctor, columns) if columns else Doctor].model_construct(
+            **page.model_dump(),
+            total=total,
+            rows=rows,
+            nextCursor=next_cursor,
+        )
+    )
+
+
+def list_doctor_changes_service(since: int = 0, limit: int = settings.changes_page_size):
+    # 增量同步：返回 since 之后新增、修改和删除的医生
+    changes, next_since, has_more = doctor_repo.list_doctor_changes(since, limit)
+    return ApiResponse.success(
+        ChangesResponse[Doctor].model_construct(
+            rows=[
+                ChangeItem[Doctor].model_construct(seq=seq, op=op, id=row_id, data=data)
+                for seq, op, row_id, data in changes
+            ],
+            nextSince=next_since,
+            hasMore=has_more,
+        )
+    )
+
+
+def _get_doctors_by_ids_service(
+    page: PageParams, raw_ids: str, columns: tuple[str, ...] | None = None
+):
+    # 按 ID 批量查询：一次 IN 查询（优先读缓存），按请求顺序返回，不存在的 ID 跳过
+    try:
+        ids = _parse_ids(raw_ids)
+    except ValueError:
+        return ApiResponse.error(code=ErrorCode.PARAM_ERROR, msg="invalid ids")
+    if len(ids) > settings.max_page_size:
+        return ApiResponse.error(
+            code=ErrorCode.PARAM_ERROR, msg=f"at most {settings.max_page_size} ids"
+        )
+    found = doctor_repo.get_doctors_by_ids(ids, columns)
+    rows = [found[i] for i in dict.fromkeys(ids) if i in found]
+    return ApiResponse.success(
+        PageResponse[partial_model(Doctor, columns) if columns else Doctor].model_construct(
+            **page.model_dump(),
+            total=len(rows),
+            rows=rows,
+            nextCursor=None,
+        )
+    )
+
+
+def list_doctor_patients_service(
+    doctor_id: int, page: PageParams = PageParams(), fields: str | None = None
+):
+    # 医生名下的患者（按 primary_doctor_id 筛选，走 idx_patients_primary_doctor）
+    if not doctor_repo.get_doctor_by_id(doctor_id):
+        return ApiResponse.error(code=ErrorCode.NOT_FOUND, msg="doctor not found")
+    return list_patients_service(page, primary_doctor_id=doctor_id, fields=fields)
+
+
+def export_doctors_service(fmt: str = "ndjson"):
+    # 返回异步字节流（NDJSON/CSV），由路由包装成 StreamingResponse
+    return stream_export(doctor_repo.iter_doctors, fmt, doctor_repo.doctor_columns)
+
+
+def get_doctor_by_id_service(doctor_id: int, fields: str | None = None):
+    # 查询单个医生，fields 为稀疏字段集
+    try:
+        columns = doctor_repo.resolve_doctor_fields(fields)
+    except ValueError as e:
+        return ApiResponse.error(code=ErrorCode.PARAM_ERROR, msg=str(e))
+    row = doctor_repo.get_doctor_by_id(doctor_id, columns)
     if not row:
         return ApiResponse.error(code=ErrorCode.NOT_FOUND, msg="doctor not found")
-    return ApiResponse.success(Doctor(**row))
+    return ApiResponse.success(row)
 
 
 def create_doctor_service(payload: CreateDoctor):
     # 创建医生并统一错误处理
     try:
         row = doctor_repo.create_doctor(_to_dict(payload))
-        return ApiResponse.success(Doctor(**row))
+        return ApiResponse.success(row)
     except sqlite3.IntegrityError:
         # Unique constraint conflicts land here.
         return ApiResponse.error(code=ErrorCode.PARAM_ERROR, msg="doctor data conflict")
@@ -35,13 +147,29 @@ def create_doctor_service(payload: CreateDoctor):
         return ApiResponse.error(code=ErrorCode.INTERNAL_ERROR, msg="create doctor failed")
 
 
-def update_doctor_service(doctor_id: int, payload: UpdateDoctor):
-    # 更新医生并统一错误处理
+def bulk_create_doctors_service(items: list):
+    # 批量创建医生：逐行校验，合法行一次事务写入，返回逐行结果
+    valid, errors = validate_bulk(items, CreateDoctor)
+    try:
+        outcomes = doctor_repo.bulk_create_doctors([data for _, data in valid])
+    except Exception:
+        return ApiResponse.error(code=ErrorCode.INTERNAL_ERROR, msg="bulk create doctor failed")
+    return ApiResponse.success(merge_bulk_results(valid, outcomes, errors))
+
+
+def update_doctor_service(
+    doctor_id: int, payload: UpdateDoctor, expected_version: int | None = None
+):
+    # 更新医生并统一错误处理；expected_version 来自 If-Match，不一致时拒绝更新
     try:
-        row = doctor_repo.update_doctor(doctor_id, _to_dict(payload))
+        row = doctor_repo.update_doctor(doctor_id, _to_dict(payload), expected_version)
         if not row:
+            if expected_version is not None and doctor_repo.get_doctor_by_id(doctor_id):
+                return ApiResponse.error(
+                    code=ErrorCode.PRECONDITION_FAILED, msg="doctor has been modified"
+                )
             return ApiResponse.error(code=ErrorCode.NOT_FOUND, msg="doctor not found")
-        return ApiResponse.success(Doctor(**row))
+        return ApiResponse.success(row)
     except sqlite3.IntegrityError:
         return ApiResponse.error(code=ErrorCode.PARAM_ERROR, msg="doctor data conflict")
     except Exception:
@@ -1,7 +1,20 @@
 import sqlite3
-from app.schemas.patient import Patient, CreatePatient, UpdatePatient 
-from app.schemas.user import ApiResponse, ErrorCode, PageParams
-from app.repositories import patient_repo
+from app.schemas.patient import Patient, PatientExpanded, CreatePatient, UpdatePatient
+from app.schemas.user import (
+    ApiResponse,
+    ChangeItem,
+    ChangesResponse,
+    ErrorCode,
+    PageParams,
+    PageResponse,
+)
+from app.repositories import doctor_repo, patient_repo
+from app.repositories.base import partial_model
+from app.dataloader import DataLoader
+from app.pagination import resolve_page, split_page
+from app.bulk import validate_bulk, merge_bulk_results
+from app.export import stream_export
+from app.config import settings
 
 
 def _to_dict(model):
@@ -9,28 +22,98 @@ def _to_dict(model):
     return model.model_dump() if hasattr(model, "model_dump") else model.dict()
 
 
-def list_patients_service(page: PageParams = PageParams()):
-    # 返回患者列表
-    limit = page.pageSize
-    offset = (page.pageNum - 1) * page.pageSize
-    rows, total = patient_repo.list_patients(limit=limit, offset=offset)
-    patients = [Patient(**row) for row in rows]
-    return ApiResponse.success(patients)
+def _expand_primary_doctor(rows: list[Patient], model=PatientExpanded) -> list[PatientExpanded]:
+    # 本页所有主治医生去重后一次 IN 查询加载，不再逐行查询
+    loader = DataLoader(doctor_repo.get_doctors_by_ids)
+    doctors = loader.load_many(row.primary_doctor_id for row in rows)
+    return [
+        model.model_construct(**dict(row), primary_doctor=doctor)
+        for row, doctor in zip(rows, doctors)
+    ]
 
 
-def get_patient_by_id_service(patient_id: int):
-    # 查询单个患者
-    row = patient_repo.get_patient_by_id(patient_id)
+def list_patients_service(
+    page: PageParams = PageParams(),
+    q: str | None = None,
+    expand: str | None = None,
+    primary_doctor_id: int | None = None,
+    fields: str | None = None,
+):
+    # 分页返回患者列表，支持 pageNum 与 cursor 两种翻页方式
+    # q 检索按相关度排序，只支持 pageNum 翻页；expand=primary_doctor 时附带主治医生
+    # fields 为稀疏字段集，只查询并返回这些列（展开主治医生时自动包含 primary_doctor_id）
+    try:
+        limit, offset, after_id = resolve_page(page, allow_cursor=not q)
+    except ValueError:
+        return ApiResponse.error(code=ErrorCode.PARAM_ERROR, msg="invalid cursor")
+    try:
+        columns = patient_repo.resolve_patient_fields(
+            f"{fields},primary_doctor_id" if fields and expand else fields
+        )
+    except ValueError as e:
+        return ApiResponse.error(code=ErrorCode.PARAM_ERROR, msg=str(e))
+    rows, total = patient_repo.list_patients(
+        limit=limit,
+        offset=offset,
+        after_id=after_id,
+        total_mode=page.totalMode,
+        q=q,
+        fields=columns,
+        primary_doctor_id=primary_doctor_id,
+    )
+    rows, next_cursor = split_page(rows, page.pageSize, with_cursor=not q)
+    model = PatientExpanded if expand else Patient
+    if columns:
+        model = partial_model(model, columns + (("primary_doctor",) if expand else ()))
+    if expand == "primary_doctor":
+        rows = _expand_primary_doctor(rows, model)
+    return ApiResponse.success(
+        PageResponse[model].model_construct(
+            **page.model_dump(),
+            total=total,
+            rows=rows,
+            nextCursor=next_cursor,
+        )
+    )
+
+
+def list_patient_changes_service(since: int = 0, limit: int = settings.changes_page_size):
+    # 增量同步：返回 since 之后新增、修改和删除的患者
+    changes, next_since, has_more = patient_repo.list_patient_changes(since, limit)
+    return ApiResponse.success(
+        ChangesResponse[Patient].model_construct(
+            rows=[
+                ChangeItem[Patient].model_construct(seq=seq, op=op, id=row_id, data=data)
+                for seq, op, row_id, data in changes
+            ],
+            nextSince=next_since,
+            hasMore=has_more,
+        )
+    )
+
+
+def export_patients_service(fmt: str = "ndjson"):
+    # 返回异步字节流（NDJSON/CSV），由路由包装成 StreamingResponse
+    return stream_export(patient_repo.iter_patients, fmt, patient_repo.patient_columns)
+
+
+def get_patient_by_id_service(patient_id: int, fields: str | None = None):
+    # 查询单个患者，fields 为稀疏字段集
+    try:
+        columns = patient_repo.resolve_patient_fields(fields)
+    except ValueError as e:
+        return ApiResponse.error(code=ErrorCode.PARAM_ERROR, msg=str(e))
+    row = patient_repo.get_patient_by_id(patient_id, columns)
     if not row:
         return ApiResponse.error(code=ErrorCode.NOT_FOUND, msg="patient not found")
-    return ApiResponse.success(Patient(**row))
+    return ApiResponse.success(row)
 
 
 def create_patient_service(payload: CreatePatient):
     # 创建患者并统一错误处理
     try:
         row = patient_repo.create_patient(_to_dict(payload))
-        return ApiResponse.success(Patient(**row))
+        return ApiResponse.success(row)
     except sqlite3.IntegrityError:
         # Unique constraint or foreign key failure.
         return ApiResponse.error(code=ErrorCode.PARAM_ERROR, msg="patient data conflict")
@@ -38,13 +121,29 @@ def create_patient_service(payload: CreatePatient):
         return ApiResponse.error(code=ErrorCode.INTERNAL_ERROR, msg="create patient failed")
 
 
-def update_patient_service(patient_id: int, payload: UpdatePatient):
-    # 更新患者并统一错误处理
+def bulk_create_patients_service(items: list):
+    # 批量创建患者：逐行校验，合法行一次事务写入，返回逐行结果
+    valid, errors = validate_bulk(items, CreatePatient)
+    try:
+        outcomes = patient_repo.bulk_create_patients([data for _, data in valid])
+    except Exception:
+        return ApiResponse.error(code=ErrorCode.INTERNAL_ERROR, msg="bulk create patient failed")
+    return ApiResponse.success(merge_bulk_results(valid, outcomes, errors))
+
+
+def update_patient_service(
+    patient_id: int, payload: UpdatePatient, expected_version: int | None = None
+):
+    # 更新患者并统一错误处理；expected_version 来自 If-Match，不一致时拒绝更新
     try:
-        row = patient_repo.update_patient(patient_id, _to_dict(payload))
+        row = patient_repo.update_patient(patient_id, _to_dict(payload), expected_version)
         if not row:
+            if expected_version is not None and patient_repo.get_patient_by_id(patient_id):
+                return ApiResponse.error(
+                    code=ErrorCode.PRECONDITION_FAILED, msg="patient has been modified"
+                )
             return ApiResponse.error(code=ErrorCode.NOT_FOUND, msg="patient not found")
-        return ApiResponse.success(Patient(**row))
+        return ApiResponse.success(row)
     except sqlite3.IntegrityError:
         return ApiResponse.error(code=ErrorCode.PARAM_ERROR, msg="patient data conflict")
     except Exception:
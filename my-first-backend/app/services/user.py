@@ -8,9 +8,16 @@ from app.schemas.user import (
     PageResult,
     PageParams,
     PageResponse,
+    ChangeItem,
+    ChangesResponse,
     ErrorCode,
 )
 from app.repositories import user_repo
+from app.repositories.base import partial_model
+from app.pagination import resolve_page, split_page
+from app.bulk import validate_bulk, merge_bulk_results
+from app.export import stream_export
+from app.config import settings
 # 配置日志
 logger = logging.getLogger(__name__)
 
@@ -25,10 +32,19 @@ def get_all_users(
     role: str | None = None,
     email: str | None = None,
     phone: str | None = None,
+    q: str | None = None,
+    fields: str | None = None,
 ):
     try:
-        limit = page.pageSize
-        offset = (page.pageNum - 1) * page.pageSize
+        # 关键词检索按相关度排序，只支持 pageNum 翻页
+        try:
+            limit, offset, after_id = resolve_page(page, allow_cursor=not q)
+        except ValueError:
+            return ApiResponse.error(code=ErrorCode.PARAM_ERROR, msg="分页游标不合法")
+        try:
+            columns = user_repo.resolve_user_fields(fields)
+        except ValueError as e:
+            return ApiResponse.error(code=ErrorCode.PARAM_ERROR, msg=str(e))
 
         rows, total = user_repo.list_users(
             limit=limit,
@@ -37,16 +53,20 @@ def get_all_users(
             role=role,
             email=email,
             phone=phone,
+            after_id=after_id,
+            total_mode=page.totalMode,
+            q=q,
+            fields=columns,
         )
+        rows, next_cursor = split_page(rows, page.pageSize, with_cursor=not q)
 
-        users = [User(**row) for row in rows]
-
+        # 行已由仓储构造成 User，分页参数已由 FastAPI 校验，这里不再重复校验
         return ApiResponse.success(
-            PageResponse[User](
-                pageNum=page.pageNum,
-                pageSize=page.pageSize,
+            PageResponse[partial_model(User, columns) if columns else User].model_construct(
+                **page.model_dump(),
                 total=total,
-                rows=users,
+                rows=rows,
+                nextCursor=next_cursor,
             )
         )
     except Exception as e:
@@ -54,12 +74,40 @@ def get_all_users(
         return ApiResponse.error(code=ErrorCode.INTERNAL_ERROR, msg="获取用户列表失败")
 
 
-def get_user_by_id_service(id: int):
+def list_user_changes_service(since: int = 0, limit: int = settings.changes_page_size):
+    try:
+        # 增量同步：返回 since 之后新增、修改和删除的用户
+        changes, next_since, has_more = user_repo.list_user_changes(since, limit)
+        return ApiResponse.success(
+            ChangesResponse[User].model_construct(
+                rows=[
+                    ChangeItem[User].model_construct(seq=seq, op=op, id=row_id, data=data)
+                    for seq, op, row_id, data in changes
+                ],
+                nextSince=next_since,
+                hasMore=has_more,
+            )
+        )
+    except Exception as e:
+        logger.error(f"获取用户变更失败 [since={since}]: {str(e)}", exc_info=True)
+        return ApiResponse.error(code=ErrorCode.INTERNAL_ERROR, msg="获取用户变更失败")
+
+
+def export_users_service(fmt: str = "ndjson"):
+    # 返回异步字节流（NDJSON/CSV），由路由包装成 StreamingResponse
+    return stream_export(user_repo.iter_users, fmt, user_repo.user_columns)
+
+
+def get_user_by_id_service(id: int, fields: str | None = None):
     try:
-        row = user_repo.get_user_by_id(id)
+        try:
+            columns = user_repo.resolve_user_fields(fields)
+        except ValueError as e:
+            return ApiResponse.error(code=ErrorCode.PARAM_ERROR, msg=str(e))
+        row = user_repo.get_user_by_id(id, columns)
         if not row:
             return ApiResponse.error(code=ErrorCode.NOT_FOUND, msg="用户不存在")
-        return ApiResponse.success(User(**row))
+        return ApiResponse.success(row)
     except Exception as e:
         logger.error(f"获取用户详情失败 [id={id}]: {str(e)}", exc_info=True)
         return ApiResponse.error(code=ErrorCode.INTERNAL_ERROR, msg="获取用户详情失败")
@@ -69,8 +117,8 @@ def get_user_by_id_service(id: int):
 def create_user_service(user: CreateUser):
     try:
         new_user = user_repo.create_user(_to_dict(user))
-        logger.info(f"创建用户成功 [id={new_user['id']}, name={new_user['name']}]")
-        return ApiResponse.success(User(**new_user))
+        logger.info(f"创建用户成功 [id={new_user.id}, name={new_user.name}]")
+        return ApiResponse.success(new_user)
 
     except sqlite3.IntegrityError as e:
         logger.warning(f"创建用户失败，数据冲突: {str(e)}")
@@ -81,16 +129,34 @@ def create_user_service(user: CreateUser):
         return ApiResponse.error(code=ErrorCode.INTERNAL_ERROR, msg="创建用户失败")
 
 
-def update_user_service(id: int, user: UpdateUser):
+def bulk_create_users_service(items: list):
+    try:
+        valid, errors = validate_bulk(items, CreateUser)
+        outcomes = user_repo.bulk_create_users([data for _, data in valid])
+        result = merge_bulk_results(valid, outcomes, errors)
+        logger.info(f"批量创建用户完成 [成功={result.created}, 失败={result.failed}]")
+        return ApiResponse.success(result)
+    except Exception as e:
+        logger.error(f"批量创建用户失败: {str(e)}", exc_info=True)
+        return ApiResponse.error(code=ErrorCode.INTERNAL_ERROR, msg="批量创建用户失败")
+
+
+def update_user_service(id: int, user: UpdateUser, expected_version: int | None = None):
+    # expected_version 来自 If-Match：与当前版本号不一致说明已被他人修改，拒绝更新
     try:
         update_data = {k:v for k,v in _to_dict(user).items() if v is not None}
         if not update_data:
             return ApiResponse.error(code=ErrorCode.PARAM_ERROR, msg="没有要更新的字段")
-        row = user_repo.update_user(id,update_data)
+        row = user_repo.update_user(id, update_data, expected_version)
         if not row:
+            if expected_version is not None and user_repo.get_user_by_id(id):
+                logger.warning(f"更新用户失败，版本号不一致 [id={id}]")
+                return ApiResponse.error(
+                    code=ErrorCode.PRECONDITION_FAILED, msg="用户已被修改，请刷新后重试"
+                )
             return ApiResponse.error(code=ErrorCode.NOT_FOUND, msg="用户不存在")
         logger.info(f"更新用户成功 [id={id}]")
-        return ApiResponse.success(User(**row))
+        return ApiResponse.success(row)
     except sqlite3.IntegrityError as e:
         logger.warning(f"更新用户失败，数据冲突 [id={id}]: {str(e)}")
         return ApiResponse.error(code=ErrorCode.PARAM_ERROR, msg="用户数据冲突")
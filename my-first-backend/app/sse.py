@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import time
+from json.encoder import encode_basestring
+from typing import Any, AsyncGenerator, Awaitable, Callable, get_args
+
+from pydantic_core import to_json
+
+from app.schemas.chat import Delta, DeltaData, FinalData, SSEEventData, ToolData
+
+logger = logging.getLogger(__name__)
+
+# SSEEventData.event 允许的事件类型
+EVENT_TYPES: tuple[str, ...] = get_args(SSEEventData.model_fields["event"].annotation)
+
+
+def dumps(data: Any) -> str:
+    # 与 Pydantic 序列化 Any 字段的结果一致（紧凑、不转义中文）
+    return to_json(data).decode()
+
+
+class SSEEncoder:
+    """
+    单个聊天流的 SSE 帧编码器，输出与 SSEEventData(...).model_dump_json() 逐字节一致
+
+    - 信封前缀（event / conversation_id / request_id）在创建时为每种事件预先渲染
+    - delta 只对变化的 content / thinking_content 做 JSON 字符串转义，不经过 Pydantic 模型
+    - 其他事件（tool / final 等，每个流只有几次）的 data 用 pydantic_core 序列化
+    """
+
+    def __init__(self, conversation_id: str, request_id: str):
+        self.conversation_id = conversation_id
+        self.request_id = request_id
+        envelope = (
+            f'"conversation_id":{encode_basestring(conversation_id)},'
+            f'"request_id":{encode_basestring(request_id)},"data":'
+        )
+        self._prefixes = {
+            event: f'data: {{"event":"{event}",{envelope}' for event in EVENT_TYPES
+        }
+        self._delta_prefix = self._prefixes["delta"] + '{"content":'
+
+    def delta(self, content: str = "", thinking_content: str = "") -> str:
+        # 热路径：每个 token 调用一次
+        return (
+            f"{self._delta_prefix}{encode_basestring(content)},"
+            f'"thinking_content":{encode_basestring(thinking_content)},"tool_calls":null}}}}\n\n'
+        )
+
+    def encode(self, event: str, data: Any = None) -> str:
+        """
+        编码一帧：data 为 Delta 时走 delta 快速路径，其他数据（dict / None）通用序列化
+        """
+        if isinstance(data, Delta):
+            if data.tool_calls is None:
+                return self.delta(data.content, data.thinking_content)
+            data = data._asdict()
+        return f"{self._prefixes[event]}{dumps(data)}}}\n\n"
+
+
+async def coalesce_deltas(
+    events: AsyncGenerator[tuple[str, Any], None], window: float, max_bytes: int = 0
+) -> AsyncGenerator[tuple[str, Any], None]:
+    """
+    合并连续的 delta 事件：content / thinking_content 分别拼接，减少小帧
+
+    - 从缓冲第一个 delta 起最多等待 window 秒，到时即使上游没有新事件也立即发送
+    - 已缓冲内容达到 max_bytes（UTF-8 字节，0 表示不限）时立即发送
+    - 其他事件（tool / final / error 等）及带 tool_calls 的 delta 不合并，发送前先发送已缓冲的内容
+    - 上游结束或抛出异常时先发送已缓冲的内容
+
+    上游的 __anext__ 放在独立任务中等待，超时只是不再等待，不会取消上游。
+    """
+    content: list[str] = []
+    thinking: list[str] = []
+    size = 0
+    deadline = 0.0
+    pending: asyncio.Future | None = None
+
+    def take() -> tuple[str, Delta]:
+        nonlocal size
+        delta = Delta("".join(content), "".join(thinking))
+        content.clear()
+        thinking.clear()
+        size = 0
+        return "delta", delta
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(anext(events))
+            if content or thinking:
+                done, _ = await asyncio.wait({pending}, timeout=max(0.0, deadline - time.monotonic()))
+                if not done:
+                    yield take()
+                    continue
+            else:
+                await asyncio.wait({pending})
+            task, pending = pending, None
+            try:
+                event, data = task.result()
+            except StopAsyncIteration:
+                break
+            except BaseException:
+                if content or thinking:
+                    yield take()
+                raise
+
+            if event != "delta" or not isinstance(data, Delta) or data.tool_calls is not None:
+                if content or thinking:
+                    yield take()
+                yield event, data
+                continue
+            if not (content or thinking):
+                deadline = time.monotonic() + window
+            content.append(data.content)
+            thinking.append(data.thinking_content)
+            if max_bytes:
+                size += len(data.content.encode()) + len(data.thinking_content.encode())
+                if size >= max_bytes:
+                    yield take()
+        if content or thinking:
+            yield take()
+    finally:
+        # 下游提前结束（如客户端断开）：取消等待中的上游并关闭
+        if pending is not None and not pending.done():
+            pending.cancel()
+            try:
+                await pending
+            except BaseException:
+                pass
+        await events.aclose()
+
+
+async def keepalive(
+    frames: AsyncGenerator[str, None],
+    ping: Callable[[], str],
+    interval: float,
+    is_disconnected: Callable[[], Awaitable[bool]] | None = None,
+    poll_interval: float = 0.5,
+) -> AsyncGenerator[str, None]:
+    """
+    SSE 连接保活与断开检测
+
+    - 上游超过 interval 秒没有输出时发送 ping() 帧，避免代理 / 负载均衡器按空闲超时断开，
+      客户端也能据此判断连接仍然存活；interval 为 0 时不发送
+    - 每 poll_interval 秒调用 is_disconnected() 检查客户端是否已断开；断开后立即取消上游
+      （包括正在等待的模型调用）并结束，不再占用事件循环和上游并发
+    """
+    now = time.monotonic()
+    next_ping = now + interval if interval > 0 else float("inf")
+    next_poll = now + poll_interval if is_disconnected is not None else float("inf")
+    pending: asyncio.Future | None = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(anext(frames))
+            timeout = min(next_ping, next_poll) - time.monotonic()
+            done, _ = await asyncio.wait(
+                {pending}, timeout=None if timeout == float("inf") else max(0.0, timeout)
+            )
+            now = time.monotonic()
+            # 上游持续输出时也按间隔检查
+            if now >= next_poll:
+                if await is_disconnected():
+                    logger.info("客户端已断开，取消流式生成")
+                    return
+                next_poll = now + poll_interval
+            if done:
+                task, pending = pending, None
+                try:
+                    frame = task.result()
+                except StopAsyncIteration:
+                    return
+                yield frame
+                if interval > 0:
+                    next_ping = time.monotonic() + interval
+                continue
+            if now >= next_ping:
+                yield ping()
+                next_ping = time.monotonic() + interval
+    finally:
+        # 取消等待中的上游并关闭，上游的 finally / async with 随之执行
+        if pending is not None and not pending.done():
+            pending.cancel()
+            try:
+                await pending
+            except BaseException:
+                pass
+        await frames.aclose()
+
+
+def sse_openapi_extra() -> dict:
+    # SSE 接口返回 StreamingResponse，这里用 Pydantic 模型补充每帧 data: 后的 JSON 结构
+    schema = SSEEventData.model_json_schema()
+    schema["properties"]["data"] = {
+        "anyOf": [
+            DeltaData.model_json_schema(),
+            ToolData.model_json_schema(),
+            FinalData.model_json_schema(),
+            {"type": "null"},
+        ],
+        "description": "delta / tool / final 事件的数据；start / ping 为 null，error 为 null 或 {\"message\": 错误说明}",
+    }
+    return {
+        "responses": {
+            "200": {
+                "description": "SSE 流，每帧为 `data: <JSON>`，以空行分隔",
+                "content": {"text/event-stream": {"schema": schema}},
+            }
+        }
+    }
@@ -3,8 +3,12 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import time
 import logging
-from app.routers import users, doctors, patients, chat
-from app.db import init_db
+from app.routers import users, doctors, patients, chat, metrics
+from app.db import init_db, close_pool, close_db_executor
+from app.db_writer import close_writer
+from app.coherence import close_watcher
+from app.llm import close_backends
+from app.compression import CompressionMiddleware
 from app.logger import setup_logger
 from app.config import settings
 from app.schemas.user import ApiResponse, ErrorCode
@@ -36,6 +40,15 @@ async def log_requests(request: Request, call_next):
     logger.info(f"请求完成，耗时: {process_time:.3f}s")
     return response
 
+# 响应压缩：最后注册，位于最外层，压缩的是其他中间件处理后的最终响应
+if settings.compression_enabled:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.compression_minimum_size,
+        level=settings.compression_level,
+        content_types=settings.compression_types,
+    )
+
 # 全局异常处理
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -55,11 +68,17 @@ def startup_event():
     logger.info("数据库初始化完成")
 
 @app.on_event("shutdown")
-def shutdown_event():
+async def shutdown_event():
     logger.info("应用关闭中...")
+    await close_backends()
+    close_db_executor()
+    close_writer()
+    close_watcher()
+    close_pool()
 
 # 注册路由
 app.include_router(users.router, prefix=settings.api_prefix)
 app.include_router(doctors.router, prefix=settings.api_prefix)
 app.include_router(patients.router, prefix=settings.api_prefix)
-app.include_router(chat.router, prefix=settings.api_prefix)
\ No newline at end of file
+app.include_router(chat.router, prefix=settings.api_prefix)
+app.include_router(metrics.router, prefix=settings.api_prefix)
\ No newline at end of file
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from app import db
+from app.bulk import parse_bulk_body
+from app.export import stream_export
+from app.schemas.user import PageParams
+from app.services.patient import (
+    bulk_create_patients_service,
+    export_patients_service,
+    list_patients_service,
+)
+from app.services.user import bulk_create_users_service, get_all_users
+
+
+class BulkCreateTests(unittest.TestCase):
+    def setUp(self):
+        # 每个测试用独立临时库，避免互相污染
+        self.temp_dir = tempfile.TemporaryDirectory()
+        db.DB_PATH = Path(self.temp_dir.name) / "test.db"
+        db.init_db()
+
+    def tearDown(self):
+        db.close_pool()
+        self.temp_dir.cleanup()
+
+    def test_bulk_patients_from_ndjson(self):
+        body = "\n".join(
+            json.dumps({"name": f"患者{i}", "phone": f"1390000{i:04d}"}) for i in range(500)
+        ).encode()
+        items = parse_bulk_body(body, "application/x-ndjson")
+        resp = bulk_create_patients_service(items)
+        self.assertEqual(resp.code, 200)
+        self.assertEqual(resp.data.created, 500)
+        self.assertEqual([r.id for r in resp.data.rows], list(range(1, 501)))
+
+        listed = list_patients_service(PageParams(pageSize=1))
+        self.assertEqual(listed.data.total, 500)
+        self.assertEqual(listed.data.rows[0].name, "患者499")
+
+    def test_bulk_users_reports_per_row_failures(self):
+        items = [
+            {"name": "A", "email": "a@example.com", "phone": "13000000001", "role": "admin"},
+            {"name": "B", "email": "bad-email", "phone": "13000000002", "role": "admin"},
+            {"name": "C", "email": "a@example.com", "phone": "13000000003", "role": "admin"},
+            {"name": "D", "email": "d@example.com", "phone": "13000000004", "role": "admin"},
+        ]
+        resp = bulk_create_users_service(items)
+        self.assertEqual(resp.code, 200)
+        self.assertEqual((resp.data.created, resp.data.failed), (2, 2))
+
+        rows = resp.data.rows
+        self.assertEqual([r.index for r in rows], [0, 1, 2, 3])
+        self.assertIsNotNone(rows[0].id)
+        self.assertIn("email", rows[1].error)
+        self.assertIn("UNIQUE", rows[2].error)
+        self.assertIsNotNone(rows[3].id)
+
+        names = [u.name for u in get_all_users(PageParams()).data.rows]
+        self.assertEqual(names, ["D", "A"])
+
+    def test_export_streams_in_batches(self):
+        bulk_create_patients_service(
+            [{"name": f"患者{i}", "address": "北京市,海淀区"} for i in range(25)]
+        )
+
+        async def collect(fmt):
+            return [chunk async for chunk in export_patients_service(fmt)]
+
+        chunks = asyncio.run(collect("ndjson"))
+        lines = b"".join(chunks).decode().splitlines()
+        self.assertEqual(len(lines), 25)
+        self.assertEqual(json.loads(lines[0])["name"], "患者0")
+
+        csv_text = b"".join(asyncio.run(collect("csv"))).decode()
+        rows = csv_text.lstrip("\ufeff").splitlines()
+        self.assertTrue(rows[0].startswith("id,name,"))
+        self.assertIn('"北京市,海淀区"', rows[1])
+        self.assertEqual(len(rows), 26)
+
+    def test_export_empty_table_csv_has_header(self):
+        async def collect():
+            return [chunk async for chunk in export_patients_service("csv")]
+
+        csv_text = b"".join(asyncio.run(collect())).decode()
+        self.assertTrue(csv_text.startswith("\ufeffid,name,"))
+        self.assertEqual(len(csv_text.splitlines()), 1)
+
+    def test_export_cancelled_while_reading(self):
+        # 读取一批的过程中客户端断开：等这一批读完再关闭生成器，不抛 ValueError
+        started = threading.Event()
+        closed = []
+
+        def iter_batches(batch_size):
+            try:
+                started.set()
+                time.sleep(0.2)
+                yield [{"id": 1}]
+            finally:
+                closed.append(True)
+
+        async def consume():
+            async for _ in stream_export(iter_batches, "ndjson", ("id",)):
+                pass
+
+        async def main():
+            task = asyncio.ensure_future(consume())
+            await asyncio.get_running_loop().run_in_executor(None, started.wait)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(main())
+        self.assertEqual(closed, [True])
+
+    def test_parse_rejects_non_array(self):
+        with self.assertRaises(ValueError):
+            parse_bulk_body(b'{"name": "x"}', "application/json")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+
+from app.cache import TTLCache
+
+
+class TTLCacheTests(unittest.TestCase):
+    def test_counters_and_lru_eviction(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)  # a 变为最近使用
+        cache.set("c", 3)  # 淘汰 b
+        self.assertIsNone(cache.get("b"))
+
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["evictions"]), (1, 1, 1))
+
+    def test_expired_entry_counts_as_miss(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1, ttl=0)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+    def test_get_or_load_skips_none_and_stale_fill(self):
+        cache = TTLCache(maxsize=8, ttl=60)
+        self.assertIsNone(cache.get_or_load("missing", lambda: None))
+        self.assertEqual(len(cache), 0)
+
+        def load_then_invalidate():
+            # 模拟回源期间另一个线程写入并失效
+            cache.invalidate("k")
+            return "old"
+
+        self.assertEqual(cache.get_or_load("k", load_then_invalidate), "old")
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.get_or_load("k", lambda: "new"), "new")
+        self.assertEqual(cache.get("k"), "new")
+
+
+if __name__ == "__main__":
+    unittest.main()
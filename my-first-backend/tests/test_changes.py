@@ -0,0 +1,69 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from app import db
+from app.schemas.patient import CreatePatient, UpdatePatient
+from app.services.patient import (
+    bulk_create_patients_service,
+    create_patient_service,
+    delete_patient_service,
+    list_patient_changes_service,
+    update_patient_service,
+)
+
+
+class ChangesSyncTests(unittest.TestCase):
+    def setUp(self):
+        # 每个测试用独立临时库，避免互相污染
+        self.temp_dir = tempfile.TemporaryDirectory()
+        db.DB_PATH = Path(self.temp_dir.name) / "test.db"
+        db.init_db()
+
+    def tearDown(self):
+        db.close_pool()
+        self.temp_dir.cleanup()
+
+    def _sync(self, since, limit=100):
+        resp = list_patient_changes_service(since, limit)
+        self.assertEqual(resp.code, 200)
+        return resp.data
+
+    def test_only_changes_after_cursor(self):
+        bulk_create_patients_service([{"name": f"患者{i}"} for i in range(5)])
+        first = self._sync(0, limit=3)
+        self.assertEqual([c.id for c in first.rows], [1, 2, 3])
+        self.assertTrue(first.hasMore)
+        rest = self._sync(first.nextSince)
+        self.assertEqual([c.id for c in rest.rows], [4, 5])
+        self.assertFalse(rest.hasMore)
+
+        since = rest.nextSince
+        updated = update_patient_service(2, UpdatePatient(address="北京"))
+        self.assertIsNotNone(updated.data.updated_at)
+        update_patient_service(2, UpdatePatient(address="上海"))
+        delete_patient_service(4)
+
+        changes = self._sync(since)
+        # 同一记录多次修改只返回最新一条；删除返回墓碑
+        self.assertEqual([(c.op, c.id) for c in changes.rows], [("update", 2), ("delete", 4)])
+        self.assertEqual(changes.rows[0].data.address, "上海")
+        self.assertIsNone(changes.rows[1].data)
+        self.assertEqual(self._sync(changes.nextSince).rows, [])
+
+    def test_migration_backfills_existing_rows(self):
+        create_patient_service(CreatePatient(name="张三"))
+        conn = db.get_connection()
+        try:
+            conn.execute("DELETE FROM change_log")
+            conn.execute("PRAGMA user_version = 7")
+            conn.commit()
+        finally:
+            conn.close()
+
+        db.init_db()
+        self.assertEqual([(c.op, c.id) for c in self._sync(0).rows], [("insert", 1)])
+
+
+if __name__ == "__main__":
+    unittest.main()
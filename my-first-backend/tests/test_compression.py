@@ -0,0 +1,151 @@
+import asyncio
+import unittest
+import zlib
+from unittest import mock
+
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from app import llm
+from app.compression import CompressionMiddleware, negotiate_encoding
+from app.llm import register_backend
+from app.schemas.chat import ChatRequest
+from app.services.chat import chat_stream, mock_backend
+
+SSE_TYPES = ("application/json", "text/event-stream")
+
+
+async def _request(app, accept_encoding: str = "gzip", if_none_match: str | None = None) -> dict:
+    # 直接调用 ASGI 应用，记录响应头和每一段响应体
+    headers = [(b"accept-encoding", accept_encoding.encode())]
+    if if_none_match is not None:
+        headers.append((b"if-none-match", if_none_match.encode()))
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "query_string": b"",
+        "headers": headers,
+    }
+
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if requested:
+            # 客户端不断开，等待响应结束后被取消
+            await asyncio.Event().wait()
+        requested = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    result = {"headers": {}, "chunks": []}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            result["headers"] = {k.decode(): v.decode() for k, v in message["headers"]}
+        elif message["type"] == "http.response.body":
+            result["chunks"].append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return result
+
+
+def _chat_app():
+    request = ChatRequest(
+        user_input="请帮我分析一下最近的检查结果",
+        business_scenario="consultation",
+        conversation_id="c-1",
+        model_id=1,
+        prompt_id=1,
+        user_role="patient",
+    )
+
+    async def app(scope, receive, send):
+        response = StreamingResponse(chat_stream(request), media_type="text/event-stream")
+        await response(scope, receive, send)
+
+    return app
+
+
+class CompressionTests(unittest.TestCase):
+    def setUp(self):
+        register_backend(1, mock_backend)
+
+    def tearDown(self):
+        llm._backends = None
+
+    def test_negotiate_encoding(self):
+        self.assertEqual(negotiate_encoding("gzip, deflate, br"), "gzip")
+        self.assertEqual(negotiate_encoding("gzip;q=0.5, deflate"), "deflate")
+        self.assertEqual(negotiate_encoding("gzip;q=0, *"), "deflate")
+        self.assertIsNone(negotiate_encoding("br"))
+        self.assertIsNone(negotiate_encoding(""))
+
+    def test_json_threshold(self):
+        def app_for(payload):
+            async def app(scope, receive, send):
+                await JSONResponse(payload)(scope, receive, send)
+
+            return CompressionMiddleware(app, minimum_size=1024, content_types=SSE_TYPES)
+
+        small = asyncio.run(_request(app_for({"msg": "ok"})))
+        self.assertNotIn("content-encoding", small["headers"])
+
+        rows = [{"id": i, "address": "北京市朝阳区建国路"} for i in range(100)]
+        large = asyncio.run(_request(app_for(rows), "deflate"))
+        self.assertEqual(large["headers"]["content-encoding"], "deflate")
+        self.assertEqual(large["headers"]["vary"], "Accept-Encoding")
+        body = b"".join(large["chunks"])
+        self.assertEqual(large["headers"]["content-length"], str(len(body)))
+        self.assertEqual(zlib.decompress(body), JSONResponse(rows).body)
+
+    def test_etag_differs_per_encoding(self):
+        rows = [{"id": i, "address": "北京市朝阳区建国路"} for i in range(100)]
+
+        async def app(scope, receive, send):
+            if_none_match = dict(scope["headers"]).get(b"if-none-match", b"").decode()
+            if if_none_match.startswith('"patients-v6'):
+                response = Response(status_code=304, headers={"ETag": '"patients-v6"'})
+            else:
+                response = JSONResponse(rows, headers={"ETag": '"patients-v6"'})
+            await response(scope, receive, send)
+
+        middleware = CompressionMiddleware(app)
+        plain = asyncio.run(_request(middleware, "identity"))
+        self.assertEqual(plain["headers"]["etag"], '"patients-v6"')
+        compressed = asyncio.run(_request(middleware))
+        self.assertEqual(compressed["headers"]["etag"], '"patients-v6-gzip"')
+
+        # 304 沿用客户端缓存的表示对应的 ETag
+        cached = asyncio.run(_request(middleware, if_none_match='"patients-v6-gzip"'))
+        self.assertEqual(cached["headers"]["etag"], '"patients-v6-gzip"')
+        cached = asyncio.run(_request(middleware, "identity", if_none_match='"patients-v6"'))
+        self.assertEqual(cached["headers"]["etag"], '"patients-v6"')
+
+    def test_sse_flushes_each_event_and_saves_bandwidth(self):
+        # 去掉模拟输出的等待；固定 request_id，两次输出才能逐字节比较
+        with mock.patch("app.services.chat.asyncio.sleep", mock.AsyncMock()), mock.patch(
+            "app.services.chat.uuid.uuid4", return_value="r-1"
+        ):
+            plain = asyncio.run(_request(CompressionMiddleware(_chat_app()), "identity"))
+            app = CompressionMiddleware(_chat_app(), content_types=SSE_TYPES)
+            compressed = asyncio.run(_request(app))
+
+        self.assertNotIn("content-encoding", plain["headers"])
+        self.assertEqual(compressed["headers"]["content-encoding"], "gzip")
+        self.assertNotIn("content-length", compressed["headers"])
+
+        # 每段压缩数据单独解压即可得到完整的事件，不需要等待后续数据
+        decoder = zlib.decompressobj(31)
+        events = [decoder.decompress(chunk) for chunk in compressed["chunks"]]
+        for event in events[:-1]:
+            self.assertRegex(event, rb"^id: \d+\ndata: .*\n\n$")
+        self.assertEqual(b"".join(events), b"".join(plain["chunks"]))
+
+        # 中文 delta 中大量重复的 JSON 信封，压缩后不到原来的 40%
+        plain_size = sum(map(len, plain["chunks"]))
+        compressed_size = sum(map(len, compressed["chunks"]))
+        self.assertLess(compressed_size, plain_size * 0.4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,268 @@
+import sqlite3
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from app import db
+from app.db_writer import WriteQueue
+
+
+class ConnectionPoolTests(unittest.TestCase):
+    def setUp(self):
+        # 每个测试用独立临时库，避免互相污染
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = Path(self.temp_dir.name) / "test.db"
+        db.DB_PATH = self.db_path
+        db.init_db()
+
+    def tearDown(self):
+        db.close_pool()
+        self.temp_dir.cleanup()
+
+    def _make_pool(self, **kwargs):
+        options = dict(size=2, timeout=0.2, max_lifetime=0, pre_ping=True)
+        options.update(kwargs)
+        pool = db.ConnectionPool(self.db_path, **options)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_connection_is_reused(self):
+        pool = self._make_pool()
+        conn = pool.acquire()
+        raw = conn._record.conn
+        conn.close()
+        # 重复 close 不应重复归还
+        conn.close()
+
+        again = pool.acquire()
+        self.assertIs(again._record.conn, raw)
+        again.close()
+        self.assertEqual(pool.stats()["open"], 1)
+
+    def test_same_thread_reentrant_checkout(self):
+        pool = self._make_pool(size=1)
+        outer = pool.acquire()
+        inner = pool.acquire()
+        self.assertIs(inner._record, outer._record)
+        inner.close()
+        self.assertEqual(pool.stats()["idle"], 0)
+        outer.close()
+        self.assertEqual(pool.stats()["idle"], 1)
+
+    def test_timeout_when_exhausted(self):
+        pool = self._make_pool(size=1, timeout=0.05)
+        held = pool.acquire()
+        errors = []
+
+        def worker():
+            try:
+                pool.acquire()
+            except db.PoolTimeoutError as exc:
+                errors.append(exc)
+
+        t = threading.Thread(target=worker)
+        t.start()
+        t.join()
+        held.close()
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(pool.stats()["timeouts"], 1)
+
+    def test_release_discards_uncommitted_changes(self):
+        pool = self._make_pool()
+        conn = pool.acquire()
+        conn.execute(
+            "INSERT INTO users (name, status, created_at) VALUES ('tmp', 1, 'now')"
+        )
+        conn.close()
+
+        conn = pool.acquire()
+        count = conn.execute("SELECT COUNT(1) FROM users").fetchone()[0]
+        conn.close()
+        self.assertEqual(count, 0)
+
+    def test_context_manager_commits_and_releases(self):
+        pool = self._make_pool()
+        with pool.acquire() as conn:
+            conn.execute("INSERT INTO users (name, status, created_at) VALUES ('a', 1, 'now')")
+        self.assertEqual(pool.stats()["idle"], 1)
+
+        with self.assertRaises(RuntimeError):
+            with pool.acquire() as conn:
+                conn.execute("INSERT INTO users (name, status, created_at) VALUES ('b', 1, 'now')")
+                raise RuntimeError("boom")
+        self.assertEqual(pool.stats()["idle"], 1)
+
+        conn = pool.acquire()
+        names = [row[0] for row in conn.execute("SELECT name FROM users")]
+        conn.close()
+        self.assertEqual(names, ["a"])
+
+    def test_nested_with_keeps_outer_transaction(self):
+        pool = self._make_pool()
+        outer = pool.acquire()
+        outer.execute("INSERT INTO users (name, status, created_at) VALUES ('outer', 1, 'now')")
+        # 同一线程的内层 with 拿到同一个连接，不提交外层未完成的写入
+        with pool.acquire() as inner:
+            inner.execute("INSERT INTO users (name, status, created_at) VALUES ('inner', 1, 'now')")
+        self.assertTrue(outer.in_transaction)
+        outer.rollback()
+        outer.close()
+
+        conn = pool.acquire()
+        count = conn.execute("SELECT COUNT(1) FROM users").fetchone()[0]
+        conn.close()
+        self.assertEqual(count, 0)
+
+    def test_closed_handle_rejects_use(self):
+        pool = self._make_pool()
+        with pool.acquire() as conn:
+            pass
+        with self.assertRaises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+        with self.assertRaises(sqlite3.ProgrammingError):
+            conn.cursor()
+
+    def test_expired_connection_is_recycled(self):
+        pool = self._make_pool(max_lifetime=1)
+        conn = pool.acquire()
+        raw = conn._record.conn
+        conn._record.created_at -= 10
+        conn.close()
+
+        again = pool.acquire()
+        self.assertIsNot(again._record.conn, raw)
+        again.close()
+        self.assertEqual(pool.stats()["recycled"], 1)
+
+
+class StorageProfileTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        db.DB_PATH = Path(self.temp_dir.name) / "test.db"
+        db.init_db()
+
+    def tearDown(self):
+        db.close_pool()
+        self.temp_dir.cleanup()
+
+    def test_profile_applied(self):
+        conn = db.get_connection()
+        try:
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            # synchronous: NORMAL = 1
+            self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)
+            self.assertEqual(conn.execute("PRAGMA busy_timeout").fetchone()[0], 5000)
+        finally:
+            conn.close()
+
+    def test_readers_not_blocked_by_writer(self):
+        writer = db.connect()
+        reader = db.connect()
+        try:
+            writer.execute(
+                "INSERT INTO users (name, status, created_at) VALUES ('w', 1, 'now')"
+            )
+            # 写事务未提交时，读连接仍能读取已提交的快照
+            count = reader.execute("SELECT COUNT(1) FROM users").fetchone()[0]
+            self.assertEqual(count, 0)
+            writer.commit()
+            count = reader.execute("SELECT COUNT(1) FROM users").fetchone()[0]
+            self.assertEqual(count, 1)
+        finally:
+            writer.close()
+            reader.close()
+
+
+def _insert_user(conn, name, phone):
+    cur = conn.execute(
+        "INSERT INTO users (name, phone, status, created_at) VALUES (?, ?, 1, 'now')",
+        (name, phone),
+    )
+    return cur.lastrowid
+
+
+class WriteQueueTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        db.DB_PATH = Path(self.temp_dir.name) / "test.db"
+        db.init_db()
+        self.writer = WriteQueue(db.DB_PATH, batch_size=16, batch_wait_ms=20)
+
+    def tearDown(self):
+        self.writer.close()
+        db.close_pool()
+        self.temp_dir.cleanup()
+
+    def test_concurrent_writes_are_group_committed(self):
+        futures = [
+            self.writer.submit(_insert_user, f"u{i}", f"1300000{i:04d}")
+            for i in range(50)
+        ]
+        ids = [f.result(timeout=5) for f in futures]
+        self.assertEqual(len(set(ids)), 50)
+
+        stats = self.writer.stats()
+        self.assertEqual(stats["ops"], 50)
+        self.assertLess(stats["batches"], 50)
+
+    def test_failed_op_does_not_abort_batch(self):
+        ok = self.writer.submit(_insert_user, "a", "13000000001")
+        dup = self.writer.submit(_insert_user, "b", "13000000001")
+        other = self.writer.submit(_insert_user, "c", "13000000002")
+
+        self.assertIsInstance(ok.result(timeout=5), int)
+        self.assertIsInstance(other.result(timeout=5), int)
+        with self.assertRaises(sqlite3.IntegrityError):
+            dup.result(timeout=5)
+
+        conn = db.get_connection()
+        try:
+            names = [r[0] for r in conn.execute("SELECT name FROM users ORDER BY id")]
+        finally:
+            conn.close()
+        self.assertEqual(names, ["a", "c"])
+
+
+class ExecuteReturningTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        db.DB_PATH = Path(self.temp_dir.name) / "test.db"
+        db.init_db()
+        self.conn = db.connect()
+
+    def tearDown(self):
+        self.conn.close()
+        db.SUPPORTS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+        self.temp_dir.cleanup()
+
+    def _roundtrip(self):
+        cur = self.conn.cursor()
+        row = db.execute_returning(
+            cur,
+            "INSERT INTO users (name, phone, created_at) VALUES (?, ?, ?)",
+            ("a", "13000000001", "2024-01-01"),
+            "users",
+        )
+        self.assertEqual(row["name"], "a")
+        updated = db.execute_returning(
+            cur, "UPDATE users SET name = ? WHERE id = ?", ("b", row["id"]), "users", row["id"]
+        )
+        self.assertEqual((updated["id"], updated["name"]), (row["id"], "b"))
+        missing = db.execute_returning(
+            cur, "UPDATE users SET name = ? WHERE id = ?", ("c", 999), "users", 999
+        )
+        self.assertIsNone(missing)
+
+    def test_returning(self):
+        if not db.SUPPORTS_RETURNING:
+            self.skipTest("SQLite < 3.35")
+        self._roundtrip()
+
+    def test_fallback_without_returning(self):
+        db.SUPPORTS_RETURNING = False
+        self._roundtrip()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -55,7 +55,13 @@ class DoctorPatientCrudTests(unittest.TestCase):
         # 列表查询
         list_resp = list_doctors_service()
         self.assertEqual(list_resp.code, 200)
-        self.assertGreaterEqual(len(list_resp.data), 1)
+        self.assertGreaterEqual(len(list_resp.data.rows), 1)
+
+        # 按科室筛选
+        filtered = list_doctors_service(department="ENT")
+        self.assertEqual([d.id for d in filtered.data.rows], [doctor_id])
+        self.assertEqual(filtered.data.total, 1)
+        self.assertEqual(list_doctors_service(department="Cardiology").data.total, 0)
 
         # 删除医生
         delete_resp = delete_doctor_service(doctor_id)
@@ -100,7 +106,7 @@ class DoctorPatientCrudTests(unittest.TestCase):
         # 列表查询
         list_resp = list_patients_service()
         self.assertEqual(list_resp.code, 200)
-        self.assertGreaterEqual(len(list_resp.data), 1)
+        self.assertGreaterEqual(len(list_resp.data.rows), 1)
 
         # 删除患者
         delete_resp = delete_patient_service(patient_id)
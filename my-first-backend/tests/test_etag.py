@@ -0,0 +1,77 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from starlette.requests import Request
+
+from app import db
+from app.etag import entity_etag, if_none_match, list_response, parse_if_match, table_version
+from app.schemas.doctor import CreateDoctor, UpdateDoctor
+from app.schemas.user import ErrorCode, PageParams
+from app.services.doctor import create_doctor_service, update_doctor_service
+from app.services.user import get_all_users
+
+
+def _request(**headers) -> Request:
+    raw = [(k.replace("_", "-").encode(), v.encode()) for k, v in headers.items()]
+    return Request({"type": "http", "headers": raw, "query_string": b""})
+
+
+class ETagTests(unittest.TestCase):
+    def setUp(self):
+        # 每个测试用独立临时库，避免互相污染
+        self.temp_dir = tempfile.TemporaryDirectory()
+        db.DB_PATH = Path(self.temp_dir.name) / "test.db"
+        db.init_db()
+
+    def tearDown(self):
+        db.close_pool()
+        self.temp_dir.cleanup()
+
+    def test_row_version_drives_etag_and_if_match(self):
+        doctor = create_doctor_service(CreateDoctor(name="王医生")).data
+        etag = entity_etag("doctors", doctor)
+        self.assertEqual(etag, f'"doctors-{doctor.id}-1"')
+
+        expected = parse_if_match(etag, "doctors", doctor.id)
+        first = update_doctor_service(doctor.id, UpdateDoctor(title="主任医师"), expected)
+        self.assertEqual((first.code, first.data.row_version), (200, 2))
+
+        # 仍用旧 ETag 提交：版本不一致
+        stale = update_doctor_service(doctor.id, UpdateDoctor(title="副主任医师"), expected)
+        self.assertEqual(stale.code, ErrorCode.PRECONDITION_FAILED)
+        missing = update_doctor_service(999, UpdateDoctor(title="x"), expected)
+        self.assertEqual(missing.code, ErrorCode.NOT_FOUND)
+
+    def test_table_version_moves_on_writes(self):
+        before = table_version("doctors")
+        doctor = create_doctor_service(CreateDoctor(name="王医生")).data
+        update_doctor_service(doctor.id, UpdateDoctor(title="主任医师"))
+        self.assertEqual(table_version("doctors"), before + 2)
+
+    def test_list_etag_only_on_success(self):
+        ok = list_response(get_all_users(PageParams()), '"users-list"')
+        self.assertEqual(ok.headers["etag"], '"users-list"')
+        # 参数错误的响应不带 ETag，客户端不能用它换来 304
+        bad = list_response(get_all_users(PageParams(cursor="not-a-cursor")), '"users-list"')
+        self.assertNotIn("etag", bad.headers)
+
+    def test_header_parsing(self):
+        self.assertTrue(if_none_match(_request(if_none_match='W/"a", "b"'), '"a"'))
+        self.assertTrue(if_none_match(_request(if_none_match="*"), '"a"'))
+        self.assertFalse(if_none_match(_request(), '"a"'))
+        # 压缩响应的 ETag 带编码后缀
+        self.assertTrue(if_none_match(_request(if_none_match='"a-gzip"'), '"a"'))
+        self.assertTrue(if_none_match(_request(if_none_match='W/"x", "a-deflate"'), '"a"'))
+
+        self.assertIsNone(parse_if_match(None, "doctors", 1))
+        self.assertIsNone(parse_if_match("*", "doctors", 1))
+        self.assertEqual(parse_if_match('"doctors-1-3"', "doctors", 1), 3)
+        self.assertEqual(parse_if_match('"doctors-1-3-gzip"', "doctors", 1), 3)
+        # 弱 ETag 或其他记录的 ETag 不匹配
+        self.assertEqual(parse_if_match('W/"doctors-1-3"', "doctors", 1), -1)
+        self.assertEqual(parse_if_match('"doctors-2-3"', "doctors", 1), -1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,313 @@
+import asyncio
+import json
+import unittest
+from unittest import mock
+
+import httpx
+
+from app import llm
+from app.llm import (
+    BackendError,
+    LLMBackend,
+    MockBackend,
+    OpenAIBackend,
+    parse_openai_stream,
+    register_backend,
+)
+from app.schemas.chat import ChatRequest, Delta
+from app.services.chat import chat_stream
+
+
+def _request(model_id: int = 1) -> ChatRequest:
+    return ChatRequest(
+        user_input="你好",
+        business_scenario="consultation",
+        conversation_id="c-1",
+        model_id=model_id,
+        prompt_id=1,
+        user_role="patient",
+    )
+
+
+async def _lines(lines):
+    for line in lines:
+        yield line
+
+
+class ParseOpenAIStreamTests(unittest.TestCase):
+    def test_maps_chunks_to_events(self):
+        lines = [
+            ": keep-alive",
+            'data: {"choices":[{"delta":{"role":"assistant"}}]}',
+            "",
+            'data: {"choices":[{"delta":{"reasoning_content":"先想"}}]}',
+            'data: {"choices":[{"delta":{"content":"你好"}}]}',
+            'data: {"choices":[{"delta":{"tool_calls":[{"index":0,"id":"t1"}]}}]}',
+            'data: {"choices":[{"delta":{"content":"！"},"finish_reason":"stop"}]}',
+            "data: [DONE]",
+            'data: {"choices":[{"delta":{"content":"ignored"}}]}',
+        ]
+
+        async def run():
+            return [event async for event in parse_openai_stream(_lines(lines))]
+
+        events = asyncio.run(run())
+        self.assertEqual(
+            events,
+            [
+                ("delta", Delta(thinking_content="先想")),
+                ("delta", Delta(content="你好")),
+                ("delta", Delta(tool_calls=[{"index": 0, "id": "t1"}])),
+                ("delta", Delta(content="！")),
+                ("final", {"result_type": "text", "text": "你好！", "data": None}),
+            ],
+        )
+
+    def test_error_chunk_raises(self):
+        async def run():
+            lines = _lines(['data: {"error":{"message":"overloaded"}}'])
+            return [event async for event in parse_openai_stream(lines)]
+
+        with self.assertRaises(BackendError):
+            asyncio.run(run())
+
+
+async def _slow_events(request):
+    yield "delta", Delta(content="a")
+    await asyncio.sleep(0.05)
+    yield "final", {"result_type": "text", "text": "a", "data": None}
+
+
+def _sse_body(*chunks) -> bytes:
+    # OpenAI 兼容接口的流式响应体
+    lines = [f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n" for chunk in chunks]
+    return ("".join(lines) + "data: [DONE]\n\n").encode()
+
+
+_COMPLETION = _sse_body(
+    {"choices": [{"delta": {"role": "assistant"}}]},
+    {"choices": [{"delta": {"reasoning_content": "先想"}}]},
+    {"choices": [{"delta": {"content": "你好"}}]},
+    {"choices": [{"delta": {"content": "！"}, "finish_reason": "stop"}]},
+)
+
+
+async def _collect_events(backend, request=None):
+    return [event async for event in backend.stream(request or _request())]
+
+
+async def _stub_server(state):
+    """
+    本地 OpenAI 兼容桩服务：HTTP/1.1 keep-alive，记录连接数和请求数
+    """
+
+    async def handle(reader, writer):
+        state["connections"] += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.decode().split("\r\n")[1:]:
+                    name, _, value = line.partition(":")
+                    if name.lower() == "content-length":
+                        length = int(value)
+                state["bodies"].append(json.loads(await reader.readexactly(length)))
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                    + f"Content-Length: {len(_COMPLETION)}\r\n\r\n".encode()
+                    + _COMPLETION
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+class OpenAIBackendTests(unittest.TestCase):
+    def _backend(self, handler, **kwargs):
+        return OpenAIBackend(
+            "http://llm.test/v1", "test-model", api_key="k", transport=httpx.MockTransport(handler), **kwargs
+        )
+
+    def test_stream(self):
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=_COMPLETION)
+
+        async def run():
+            backend = self._backend(handler, extra_body={"temperature": 0.3})
+            with mock.patch.object(llm.settings, "chat_prompts", {1: "你是医生助手"}):
+                events = await _collect_events(backend)
+            await backend.aclose()
+            return events
+
+        events = asyncio.run(run())
+        self.assertEqual(
+            events,
+            [
+                ("delta", Delta(thinking_content="先想")),
+                ("delta", Delta(content="你好")),
+                ("delta", Delta(content="！")),
+                ("final", {"result_type": "text", "text": "你好！", "data": None}),
+            ],
+        )
+        request = seen[0]
+        self.assertEqual(request.url, "http://llm.test/v1/chat/completions")
+        self.assertEqual(request.headers["authorization"], "Bearer k")
+        self.assertEqual(
+            json.loads(request.content),
+            {
+                "temperature": 0.3,
+                "model": "test-model",
+                "messages": [
+                    {"role": "system", "content": "你是医生助手"},
+                    {"role": "user", "content": "你好"},
+                ],
+                "stream": True,
+            },
+        )
+
+    def test_http_error(self):
+        backend = self._backend(lambda request: httpx.Response(500, text="upstream overloaded"))
+        with self.assertRaisesRegex(BackendError, "HTTP 500: upstream overloaded"):
+            asyncio.run(_collect_events(backend))
+        # 失败后释放并发名额
+        self.assertEqual(backend.active, 0)
+
+    def test_error_chunk(self):
+        body = _sse_body(
+            {"choices": [{"delta": {"content": "你"}}]}, {"error": {"message": "context length exceeded"}}
+        )
+        backend = self._backend(lambda request: httpx.Response(200, content=body))
+        with self.assertRaisesRegex(BackendError, "context length exceeded"):
+            asyncio.run(_collect_events(backend))
+
+    def test_pool_settings(self):
+        backend = OpenAIBackend(
+            "http://llm.test/v1", "m", max_concurrency=4, connect_timeout=2, read_timeout=30, keepalive_expiry=7
+        )
+        client = backend._get_client()
+        self.assertIs(backend._get_client(), client)
+        pool = client._transport._pool
+        self.assertEqual((pool._max_connections, pool._max_keepalive_connections), (4, 4))
+        self.assertEqual(pool._keepalive_expiry, 7)
+        self.assertEqual(client.timeout, httpx.Timeout(30, connect=2))
+        asyncio.run(backend.aclose())
+
+    def test_reuses_connection_across_requests(self):
+        state = {"connections": 0, "bodies": []}
+
+        async def run():
+            server = await _stub_server(state)
+            port = server.sockets[0].getsockname()[1]
+            backend = OpenAIBackend(f"http://127.0.0.1:{port}/v1", "test-model", max_concurrency=2)
+            try:
+                results = [await _collect_events(backend) for _ in range(3)]
+            finally:
+                await backend.aclose()
+                server.close()
+                await server.wait_closed()
+            return results
+
+        results = asyncio.run(run())
+        self.assertEqual(len(state["bodies"]), 3)
+        self.assertEqual(state["connections"], 1)
+        for events in results:
+            self.assertEqual(events[-1], ("final", {"result_type": "text", "text": "你好！", "data": None}))
+
+
+class BackendTests(unittest.TestCase):
+    def tearDown(self):
+        # 恢复为按配置创建的注册表
+        llm._backends = None
+
+    def test_concurrency_limit(self):
+        async def run():
+            backend = MockBackend(_slow_events, max_concurrency=2)
+            peak = 0
+
+            async def consume():
+                nonlocal peak
+                async for _ in backend.stream(_request()):
+                    peak = max(peak, backend.active)
+
+            await asyncio.gather(*(consume() for _ in range(5)))
+            return peak, backend.active
+
+        peak, active = asyncio.run(run())
+        self.assertEqual(peak, 2)
+        self.assertEqual(active, 0)
+
+    def test_queue_timeout(self):
+        async def run():
+            backend = MockBackend(_slow_events, max_concurrency=1, queue_timeout=0.01)
+            first = backend.stream(_request())
+            await anext(first)
+            try:
+                async for _ in backend.stream(_request()):
+                    pass
+            finally:
+                await first.aclose()
+
+        with self.assertRaises(BackendError):
+            asyncio.run(run())
+
+    def test_backend_must_implement_events(self):
+        class Incomplete(LLMBackend):
+            pass
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+    def test_unconfigured_model_sends_error(self):
+        async def run():
+            return [frame async for frame in chat_stream(_request(model_id=404))]
+
+        # 已配置其他后端时，未配置的 model_id 返回 error，不回退到模拟输出
+        llm._backends = {}
+        with mock.patch.object(llm.settings, "chat_dev_mock_backend", False), mock.patch.object(
+            llm.settings, "chat_backends", {1: {"base_url": "http://llm/v1", "model": "m"}}
+        ):
+            frames = asyncio.run(run())
+        self.assertEqual(len(frames), 2)
+        self.assertIn('"event":"error"', frames[1])
+        self.assertIn("模型未配置: model_id=404", frames[1])
+
+    def test_mock_backend_when_nothing_configured(self):
+        async def run():
+            # 只取 start 之后的第一帧，不等模拟输出跑完
+            frames = chat_stream(_request(model_id=404))
+            try:
+                return [await frames.__anext__(), await frames.__anext__()]
+            finally:
+                await frames.aclose()
+
+        llm._backends = {}
+        with mock.patch.object(llm.settings, "chat_dev_mock_backend", False), mock.patch.object(
+            llm.settings, "chat_backends", {}
+        ):
+            frames = asyncio.run(run())
+        self.assertIn('"event":"delta"', frames[1])
+
+    def test_routes_by_model_id(self):
+        async def events(request):
+            yield "final", {"result_type": "text", "text": f"model {request.model_id}", "data": None}
+
+        register_backend(7, MockBackend(events))
+
+        async def run():
+            return [frame async for frame in chat_stream(_request(model_id=7))]
+
+        frames = asyncio.run(run())
+        self.assertEqual(len(frames), 2)
+        self.assertIn('"event":"start"', frames[0])
+        self.assertIn('"text":"model 7"', frames[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from app import db
+from app.coherence import get_watcher
+from app.config import settings
+from app.schemas.user import CreateUser, PageParams
+from app.services.user import create_user_service, delete_user_service, get_all_users
+
+
+class UserPaginationTests(unittest.TestCase):
+    def setUp(self):
+        # 每个测试用独立临时库，避免互相污染
+        self.temp_dir = tempfile.TemporaryDirectory()
+        db.DB_PATH = Path(self.temp_dir.name) / "test.db"
+        db.init_db()
+        for i in range(7):
+            resp = create_user_service(
+                CreateUser(
+                    name=f"user{i}",
+                    email=f"user{i}@example.com",
+                    phone=f"1380000{i:04d}",
+                    role="doctor" if i % 2 else "patient",
+                )
+            )
+            self.assertEqual(resp.code, 200)
+
+    def tearDown(self):
+        db.close_pool()
+        self.temp_dir.cleanup()
+
+    def test_cursor_walks_all_rows(self):
+        seen = []
+        cursor = None
+        while True:
+            resp = get_all_users(PageParams(pageSize=3, cursor=cursor))
+            self.assertEqual(resp.code, 200)
+            self.assertEqual(resp.data.total, 7)
+            seen.extend(row.id for row in resp.data.rows)
+            cursor = resp.data.nextCursor
+            if cursor is None:
+                break
+        self.assertEqual(seen, [7, 6, 5, 4, 3, 2, 1])
+
+    def test_cursor_matches_offset_pages(self):
+        first = get_all_users(PageParams(pageNum=1, pageSize=3))
+        second_by_offset = get_all_users(PageParams(pageNum=2, pageSize=3))
+        second_by_cursor = get_all_users(
+            PageParams(pageSize=3, cursor=first.data.nextCursor)
+        )
+        self.assertEqual(
+            [u.id for u in second_by_offset.data.rows],
+            [u.id for u in second_by_cursor.data.rows],
+        )
+
+    def test_cursor_respects_filters(self):
+        first = get_all_users(PageParams(pageSize=2), role="doctor")
+        self.assertEqual(first.data.total, 3)
+        rest = get_all_users(
+            PageParams(pageSize=2, cursor=first.data.nextCursor), role="doctor"
+        )
+        self.assertEqual([u.role for u in rest.data.rows], ["doctor"])
+        self.assertIsNone(rest.data.nextCursor)
+
+    def test_invalid_cursor(self):
+        resp = get_all_users(PageParams(cursor="not-a-cursor"))
+        self.assertEqual(resp.code, 400)
+
+    def test_unfiltered_total_uses_maintained_counter(self):
+        delete_user_service(1)
+        conn = db.get_connection()
+        try:
+            counter = conn.execute(
+                "SELECT row_count FROM table_counts WHERE table_name = 'users'"
+            ).fetchone()[0]
+        finally:
+            conn.close()
+        self.assertEqual(counter, 6)
+        self.assertEqual(get_all_users(PageParams()).data.total, 6)
+
+    def test_total_modes(self):
+        omitted = get_all_users(PageParams(totalMode="none"))
+        self.assertIsNone(omitted.data.total)
+        self.assertEqual(len(omitted.data.rows), 7)
+
+        approx = get_all_users(PageParams(totalMode="approx"), role="patient")
+        self.assertEqual(approx.data.total, 4)
+        # 近似模式下筛选总数走短期缓存；本进程的增删在提交后清空缓存
+        delete_user_service(1)
+        self.assertEqual(get_all_users(PageParams(totalMode="approx"), role="patient").data.total, 3)
+        create_user_service(CreateUser(name="user7", email="user7@example.com", phone="13800000007", role="patient"))
+        self.assertEqual(get_all_users(PageParams(totalMode="approx"), role="patient").data.total, 4)
+
+        # 其他 worker 的写入在检查间隔（及 TTL）内仍返回旧值
+        get_watcher().interval = 3600
+        conn = db.connect()
+        conn.execute("DELETE FROM users WHERE role = 'patient'")
+        conn.commit()
+        conn.close()
+        cached = get_all_users(PageParams(totalMode="approx"), role="patient")
+        self.assertEqual(cached.data.total, 4)
+        exact = get_all_users(PageParams(totalMode="exact"), role="patient")
+        self.assertEqual(exact.data.total, 0)
+
+    def test_page_size_clamped(self):
+        page = PageParams(pageNum=0, pageSize=settings.max_page_size + 50)
+        self.assertEqual(page.pageNum, 1)
+        self.assertEqual(page.pageSize, settings.max_page_size)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from app import db
+from app.dataloader import DataLoader
+from app.repositories.doctor_repo import repo as doctor_repo
+from app.schemas.doctor import CreateDoctor
+from app.schemas.patient import CreatePatient
+from app.schemas.user import PageParams
+from app.services.doctor import (
+    create_doctor_service,
+    list_doctor_patients_service,
+    list_doctors_service,
+)
+from app.services.patient import create_patient_service, list_patients_service
+
+
+class DataLoaderTests(unittest.TestCase):
+    def test_dedupes_and_batches(self):
+        calls = []
+
+        def batch(keys):
+            calls.append(keys)
+            return {k: k * 10 for k in keys if k != 3}
+
+        loader = DataLoader(batch)
+        self.assertEqual(loader.load_many([1, None, 2, 1, 3]), [10, None, 20, 10, None])
+        self.assertEqual(loader.load(2), 20)
+        self.assertEqual(calls, [[1, 2, 3]])
+
+
+class RelationTests(unittest.TestCase):
+    def setUp(self):
+        # 每个测试用独立临时库，避免互相污染
+        self.temp_dir = tempfile.TemporaryDirectory()
+        db.DB_PATH = Path(self.temp_dir.name) / "test.db"
+        db.init_db()
+        self.doctors = [
+            create_doctor_service(CreateDoctor(name=f"医生{i}")).data.id for i in range(3)
+        ]
+        for i, doctor_id in enumerate([self.doctors[0], self.doctors[1], self.doctors[0], None]):
+            create_patient_service(CreatePatient(name=f"患者{i}", primary_doctor_id=doctor_id))
+
+    def tearDown(self):
+        db.close_pool()
+        self.temp_dir.cleanup()
+
+    def test_batch_get_by_ids_keeps_request_order(self):
+        resp = list_doctors_service(PageParams(), ids="3,1,99,1")
+        self.assertEqual([d.id for d in resp.data.rows], [3, 1])
+        self.assertEqual(list_doctors_service(PageParams(), ids="1,x").code, 400)
+
+    def test_expand_primary_doctor_in_one_query(self):
+        calls = []
+        original = doctor_repo._load_many
+        doctor_repo.cache.clear()
+        doctor_repo._load_many = lambda ids: calls.append(ids) or original(ids)
+        try:
+            rows = list_patients_service(PageParams(), expand="primary_doctor").data.rows
+        finally:
+            del doctor_repo._load_many
+
+        self.assertEqual(calls, [[self.doctors[0], self.doctors[1]]])
+        self.assertEqual(
+            [r.primary_doctor.id if r.primary_doctor else None for r in rows],
+            [None, self.doctors[0], self.doctors[1], self.doctors[0]],
+        )
+
+    def test_doctor_patients(self):
+        resp = list_doctor_patients_service(self.doctors[0], PageParams())
+        self.assertEqual(resp.data.total, 2)
+        self.assertTrue(all(p.primary_doctor_id == self.doctors[0] for p in resp.data.rows))
+        self.assertEqual(list_doctor_patients_service(999, PageParams()).code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
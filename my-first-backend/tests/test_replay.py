@@ -0,0 +1,160 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from app import llm
+from app.cache import TTLCache, clear_caches
+from app.llm import MockBackend, register_backend
+from app.replay import ReplayStream
+from app.schemas.chat import ChatRequest, Delta
+from app.services import chat
+
+
+async def _frames(count, delay=0.0, state=None):
+    try:
+        for i in range(count):
+            if delay:
+                await asyncio.sleep(delay)
+            yield f"data: {i}\n\n"
+    except asyncio.CancelledError:
+        if state is not None:
+            state["cancelled"] = True
+        raise
+
+
+class ReplayStreamTests(unittest.TestCase):
+    def test_resume_replays_then_follows_live_tail(self):
+        async def run():
+            stream = ReplayStream(_frames(6, delay=0.01), maxlen=100, grace=1)
+            first = []
+            async for frame in stream.subscribe():
+                first.append(frame)
+                if len(first) == 2:
+                    break
+            # 断开期间生成继续；从 id 2 之后续传，与完整订阅的输出一致
+            resumed = [frame async for frame in stream.subscribe(2)]
+            full = [frame async for frame in stream.subscribe(0)]
+            return first, resumed, full
+
+        first, resumed, full = asyncio.run(run())
+        self.assertEqual(first, ["id: 1\ndata: 0\n\n", "id: 2\ndata: 1\n\n"])
+        self.assertEqual(first + resumed, full)
+        self.assertEqual(full[-1], "id: 6\ndata: 5\n\n")
+
+    def test_evicted_frames_cannot_resume(self):
+        async def run():
+            stream = ReplayStream(_frames(5), maxlen=2, grace=1)
+            while not stream.done:
+                await asyncio.sleep(0)
+            frames = [frame async for frame in stream.subscribe(3)]
+            return stream, frames
+
+        stream, frames = asyncio.run(run())
+        self.assertEqual(frames, ["id: 4\ndata: 3\n\n", "id: 5\ndata: 4\n\n"])
+        self.assertTrue(stream.can_resume(5))
+        self.assertFalse(stream.can_resume(2))
+        self.assertFalse(stream.can_resume(6))
+
+    def test_generation_cancelled_after_grace(self):
+        state = {"cancelled": False}
+
+        async def run():
+            stream = ReplayStream(
+                _frames(100, delay=0.01, state=state), maxlen=10, grace=0.05, on_cancel=lambda: "error\n\n"
+            )
+            async for _ in stream.subscribe():
+                break
+            await asyncio.sleep(0.3)
+            return stream
+
+        stream = asyncio.run(run())
+        self.assertTrue(state["cancelled"])
+        self.assertTrue(stream.done)
+        self.assertLess(stream.last_id, 50)
+        self.assertEqual(stream.buffer[-1][1], f"id: {stream.last_id}\nerror\n\n")
+
+    def test_reconnect_within_grace_keeps_generating(self):
+        state = {"cancelled": False}
+
+        async def run():
+            stream = ReplayStream(_frames(20, delay=0.01, state=state), maxlen=100, grace=0.1)
+            async for _ in stream.subscribe():
+                break
+            await asyncio.sleep(0.05)
+            return [frame async for frame in stream.subscribe(1)]
+
+        frames = asyncio.run(run())
+        self.assertFalse(state["cancelled"])
+        self.assertEqual(len(frames), 19)
+
+    def test_cancelled_without_first_subscriber(self):
+        state = {"cancelled": False}
+
+        async def run():
+            stream = ReplayStream(_frames(100, delay=0.01, state=state), maxlen=10, grace=0.05)
+            await asyncio.sleep(0.3)
+            return stream
+
+        with mock.patch("app.replay._FIRST_SUBSCRIBER_WAIT", 0.05):
+            stream = asyncio.run(run())
+        self.assertTrue(state["cancelled"])
+        self.assertTrue(stream.done)
+
+
+async def _paced_events(request):
+    for i in range(10):
+        await asyncio.sleep(0.02)
+        yield "delta", Delta(content=str(i))
+    yield "final", {"result_type": "text", "text": "", "data": None}
+
+
+class ChatResumeTests(unittest.TestCase):
+    def setUp(self):
+        register_backend(1, MockBackend(_paced_events))
+
+    def tearDown(self):
+        llm._backends = None
+
+    def test_running_stream_outlives_ttl_and_eviction(self):
+        request = ChatRequest(
+            user_input="你好", business_scenario="x", conversation_id="c", model_id=1, prompt_id=1, user_role="patient"
+        )
+
+        async def run():
+            request_id = chat.start_chat_stream(request)
+            # 其他流挤占容量、超过 TTL 后，生成中的流仍可续传
+            for _ in range(3):
+                chat.start_chat_stream(request)
+            await asyncio.sleep(0.05)
+            frames = chat.subscribe_chat_stream(request_id, 0)
+            self.assertNotIsInstance(frames, chat.ApiResponse)
+            out = [frame async for frame in frames]
+            # 结束后移入 TTL 缓存
+            self.assertNotIn(request_id, chat._running)
+            return out
+
+        with mock.patch.object(chat, "_streams", TTLCache(maxsize=1, ttl=0.01)):
+            out = asyncio.run(run())
+        self.assertEqual(len(out), 12)
+        self.assertIn('"event":"final"', out[-1])
+
+    def test_finished_stream_survives_clear_caches(self):
+        request = ChatRequest(
+            user_input="你好", business_scenario="x", conversation_id="c", model_id=1, prompt_id=1, user_role="patient"
+        )
+
+        async def run():
+            request_id = chat.start_chat_stream(request)
+            first = [frame async for frame in chat.subscribe_chat_stream(request_id, 0)]
+            # 关闭连接池、切换数据库文件时会清空所有命名缓存，续传缓冲不受影响
+            clear_caches()
+            frames = chat.subscribe_chat_stream(request_id, 0)
+            self.assertNotIsInstance(frames, chat.ApiResponse)
+            return first, [frame async for frame in frames]
+
+        first, again = asyncio.run(run())
+        self.assertEqual(again, first)
+
+
+if __name__ == "__main__":
+    unittest.main()
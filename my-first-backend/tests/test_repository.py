@@ -0,0 +1,145 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from app import db
+from app.coherence import get_watcher
+from app.repositories.doctor_repo import repo as doctor_repo
+from app.repositories.user_repo import repo as user_repo
+from app.schemas.doctor import Doctor
+from app.schemas.user import User
+
+
+class BaseRepositoryTests(unittest.TestCase):
+    def setUp(self):
+        # 每个测试用独立临时库，避免互相污染
+        self.temp_dir = tempfile.TemporaryDirectory()
+        db.DB_PATH = Path(self.temp_dir.name) / "test.db"
+        db.init_db()
+
+    def tearDown(self):
+        db.close_pool()
+        self.temp_dir.cleanup()
+
+    def test_rows_are_built_as_models(self):
+        created = doctor_repo.create({"name": "王医生", "department": "内科"})
+        self.assertIsInstance(created, Doctor)
+        self.assertEqual(created.department, "内科")
+
+        fetched = doctor_repo.get(created.id)
+        self.assertIsInstance(fetched, Doctor)
+        self.assertEqual(fetched.model_dump(), created.model_dump())
+
+        rows, total = doctor_repo.list_page(10, 0, department="内科")
+        self.assertEqual(total, 1)
+        self.assertIsInstance(rows[0], Doctor)
+
+    def test_insert_defaults_and_update(self):
+        user = user_repo.create(
+            {"name": "A", "email": "a@example.com", "phone": "13000000001", "role": "admin"}
+        )
+        self.assertIsInstance(user, User)
+        self.assertEqual(user.status, 1)
+
+        updated = user_repo.update(user.id, {"status": 0, "email": None})
+        self.assertEqual((updated.status, updated.email), (0, "a@example.com"))
+        # 没有可更新字段时返回当前数据；记录不存在时返回 None
+        self.assertEqual(user_repo.update(user.id, {}).status, 0)
+        self.assertIsNone(user_repo.update(999, {"name": "B"}))
+
+    def test_get_is_cached_and_invalidated_by_writes(self):
+        created = doctor_repo.create({"name": "王医生"})
+        before = doctor_repo.cache.stats()
+        doctor_repo.get(created.id)
+        doctor_repo.get(created.id)
+        after = doctor_repo.cache.stats()
+        self.assertEqual(after["misses"] - before["misses"], 1)
+        self.assertEqual(after["hits"] - before["hits"], 1)
+
+        doctor_repo.update(created.id, {"title": "主任医师"})
+        self.assertEqual(doctor_repo.get(created.id).title, "主任医师")
+
+        doctor_repo.delete(created.id)
+        self.assertIsNone(doctor_repo.get(created.id))
+
+    def test_write_from_other_process_drops_cached_rows(self):
+        created = doctor_repo.create({"name": "王医生"})
+        get_watcher().interval = 0
+        self.assertIsNone(doctor_repo.get(created.id).title)
+
+        # 模拟另一个 worker 直接写库（不经过本进程的仓储和缓存失效）
+        conn = db.connect()
+        conn.execute("UPDATE doctors SET title = ? WHERE id = ?", ("主任医师", created.id))
+        conn.commit()
+        conn.close()
+
+        self.assertEqual(doctor_repo.get(created.id).title, "主任医师")
+        # 没有新的写入时不再清空缓存
+        hits = doctor_repo.cache.stats()["hits"]
+        doctor_repo.get(created.id)
+        self.assertEqual(doctor_repo.cache.stats()["hits"], hits + 1)
+
+    def test_local_write_keeps_unrelated_cached_rows(self):
+        first = doctor_repo.create({"name": "王医生"})
+        second = doctor_repo.create({"name": "李医生"})
+        watcher = get_watcher()
+        watcher.interval = 0
+        doctor_repo.get(first.id)
+        doctor_repo.get(second.id)
+
+        # 本进程的写入只按主键失效，其他记录仍然命中缓存
+        doctor_repo.update(first.id, {"title": "主任医师"})
+        hits = doctor_repo.cache.stats()["hits"]
+        doctor_repo.get(second.id)
+        self.assertEqual(doctor_repo.cache.stats()["hits"], hits + 1)
+        self.assertEqual(doctor_repo.get(first.id).title, "主任医师")
+        self.assertGreater(watcher.stats()["local_skips"], 0)
+
+        # 本进程写入之后其他进程的写入仍然整表失效
+        doctor_repo.update(first.id, {"title": "副主任医师"})
+        conn = db.connect()
+        conn.execute("UPDATE doctors SET title = ? WHERE id = ?", ("住院医师", second.id))
+        conn.commit()
+        conn.close()
+        self.assertEqual(doctor_repo.get(second.id).title, "住院医师")
+
+    def test_local_ranges_are_bounded(self):
+        watcher = get_watcher()
+        watcher.interval = 3600  # 只写不读：不会触发 check()
+        with mock.patch("app.coherence._MAX_LOCAL_RANGES", 5):
+            for i in range(20):
+                doctor_repo.create({"name": f"医生{i}"})
+        self.assertLessEqual(len(watcher._local["doctors"]), 5)
+
+        # 检查后，早于已观察版本号的区间在下一次写入时清理
+        watcher.interval = 0
+        doctor_repo.get(1)
+        doctor_repo.create({"name": "新医生"})
+        self.assertEqual(len(watcher._local["doctors"]), 1)
+
+    def test_unknown_filter_rejected(self):
+        with self.assertRaises(TypeError):
+            doctor_repo.list_page(10, 0, office="A101")
+
+    def test_sparse_fields(self):
+        created = doctor_repo.create({"name": "王医生", "department": "内科", "office": "A101"})
+        fields = doctor_repo.resolve_fields("department, name")
+        # 按模型字段顺序，总是包含主键
+        self.assertEqual(fields, ("id", "name", "department"))
+        with self.assertRaises(ValueError):
+            doctor_repo.resolve_fields("name,password")
+
+        rows, _ = doctor_repo.list_page(10, 0, fields=fields)
+        self.assertEqual(rows[0].model_dump(), {"id": created.id, "name": "王医生", "department": "内科"})
+
+        # 缓存未命中时只查询这些列，命中时从完整记录裁剪，结果一致
+        partial = doctor_repo.get(created.id, fields)
+        self.assertEqual(partial.model_dump(), rows[0].model_dump())
+        doctor_repo.get(created.id)
+        self.assertEqual(doctor_repo.get(created.id, fields).model_dump(), partial.model_dump())
+        self.assertEqual(doctor_repo.get_many([created.id], fields)[created.id].model_dump(), partial.model_dump())
+
+
+if __name__ == "__main__":
+    unittest.main()
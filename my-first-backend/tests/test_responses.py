@@ -0,0 +1,49 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app import db
+from app.responses import api_response, dumps
+from app.schemas.user import ApiResponse, CreateUser, PageParams, PageResponse, User
+from app.services.user import create_user_service, get_all_users
+
+
+class FastResponseTests(unittest.TestCase):
+    def setUp(self):
+        # 每个测试用独立临时库，避免互相污染
+        self.temp_dir = tempfile.TemporaryDirectory()
+        db.DB_PATH = Path(self.temp_dir.name) / "test.db"
+        db.init_db()
+
+    def tearDown(self):
+        db.close_pool()
+        self.temp_dir.cleanup()
+
+    def test_body_matches_response_model_serialization(self):
+        for i in range(3):
+            create_user_service(
+                CreateUser(name=f"用户{i}", email=f"u{i}@example.com", phone=f"1380000000{i}", role="admin")
+            )
+        result = get_all_users(PageParams(pageSize=2))
+        self.assertEqual(len(result.data.rows), 2)
+
+        # FastAPI 默认路径：按 response_model 重新校验后用 JSONResponse 序列化
+        validated = ApiResponse[PageResponse[User]].model_validate(result.model_dump())
+        expected = JSONResponse(jsonable_encoder(validated)).body
+
+        response = api_response(result, headers={"ETag": '"users-v1"'})
+        self.assertEqual(response.body, expected)
+        self.assertEqual(response.headers["etag"], '"users-v1"')
+        self.assertEqual(response.media_type, "application/json")
+
+    def test_dumps_plain_data(self):
+        # 非模型数据（如运行指标）与标准库 json 紧凑输出一致，中文不转义
+        self.assertEqual(dumps({"名称": [1, None, True]}), '{"名称":[1,null,true]}'.encode())
+        self.assertEqual(dumps({"data": ApiResponse.success(1)}), b'{"data":{"code":200,"msg":"success","data":1}}')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from app import db
+from app.search import FTS_COLUMNS, has_fts
+from app.schemas.patient import CreatePatient, UpdatePatient
+from app.schemas.user import PageParams
+from app.services.patient import (
+    create_patient_service,
+    delete_patient_service,
+    list_patients_service,
+    update_patient_service,
+)
+
+
+class PatientSearchTests(unittest.TestCase):
+    def setUp(self):
+        # 每个测试用独立临时库，避免互相污染
+        self.temp_dir = tempfile.TemporaryDirectory()
+        db.DB_PATH = Path(self.temp_dir.name) / "test.db"
+        db.init_db()
+        self.ids = {}
+        for name, address in [
+            ("张三丰", "北京市海淀区"),
+            ("李四", "上海市浦东新区"),
+            ("王五", "北京市朝阳区张三丰路"),
+        ]:
+            resp = create_patient_service(CreatePatient(name=name, address=address))
+            self.ids[name] = resp.data.id
+
+    def tearDown(self):
+        db.close_pool()
+        self.temp_dir.cleanup()
+
+    def _search(self, q, **page):
+        resp = list_patients_service(PageParams(**page), q=q)
+        self.assertEqual(resp.code, 200)
+        return resp.data
+
+    def test_trigram_search_ranks_name_and_address(self):
+        data = self._search("张三丰")
+        self.assertEqual(data.total, 2)
+        self.assertEqual(
+            {p.id for p in data.rows}, {self.ids["张三丰"], self.ids["王五"]}
+        )
+        self.assertIsNone(data.nextCursor)
+
+    def test_short_keyword_falls_back_to_like(self):
+        data = self._search("李四")
+        self.assertEqual([p.id for p in data.rows], [self.ids["李四"]])
+
+    def test_index_follows_updates_and_deletes(self):
+        update_patient_service(self.ids["李四"], UpdatePatient(address="北京市西城区"))
+        self.assertEqual(self._search("北京市").total, 3)
+
+        delete_patient_service(self.ids["王五"])
+        self.assertEqual(self._search("北京市").total, 2)
+        self.assertEqual(self._search("上海市").total, 0)
+
+    def test_missing_fts_tables_built_on_startup(self):
+        # 模拟旧版 SQLite 上执行过的迁移：版本号已是最新，但没有建立全文检索表
+        conn = db.connect()
+        for table in FTS_COLUMNS:
+            for event in ("insert", "delete", "update"):
+                conn.execute(f"DROP TRIGGER trg_{table}_fts_{event}")
+            conn.execute(f"DROP TABLE {table}_fts")
+        conn.commit()
+        self.assertFalse(has_fts(conn.cursor(), "patients"))
+        conn.close()
+        create_patient_service(CreatePatient(name="赵六", address="北京市东城区"))
+
+        # 再次启动时补建，并索引已有数据
+        db.init_db()
+        conn = db.connect()
+        self.assertTrue(all(has_fts(conn.cursor(), table) for table in FTS_COLUMNS))
+        conn.close()
+        self.assertEqual(self._search("北京市").total, 3)
+
+    def test_cursor_not_supported_with_search(self):
+        first = list_patients_service(PageParams(pageSize=1))
+        resp = list_patients_service(
+            PageParams(pageSize=1, cursor=first.data.nextCursor), q="北京市"
+        )
+        self.assertEqual(resp.code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
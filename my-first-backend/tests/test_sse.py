@@ -0,0 +1,212 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+from app.schemas.chat import ChatRequest, Delta, DeltaData, FinalData, SSEEventData, ToolData
+from app.services.chat import _coalesce_options
+from app.sse import SSEEncoder, coalesce_deltas, keepalive
+
+
+def _model_frame(event: str, conversation_id: str, request_id: str, data=None) -> str:
+    # 原实现：每帧经过 Pydantic 模型
+    frame = SSEEventData(
+        event=event, conversation_id=conversation_id, request_id=request_id, data=data
+    )
+    return f"data: {frame.model_dump_json()}\n\n"
+
+
+class SSEEncoderTests(unittest.TestCase):
+    conversation_id = 'c-"1"\\'
+    request_id = "780634bc-d2be-4abc-9afd-5ff090dceb40"
+
+    def setUp(self):
+        self.encoder = SSEEncoder(self.conversation_id, self.request_id)
+
+    def test_delta_matches_model_dump_json(self):
+        samples = [
+            "",
+            "感谢您的咨询。",
+            "\n1. ",
+            '引号 " 反斜杠 \\ 制表\t回车\r',
+            "控制字符 \x00\x1f\x7f   表情 😀 </script>",
+        ]
+        for text in samples:
+            for delta in (Delta(content=text), Delta(thinking_content=text)):
+                expected = _model_frame(
+                    "delta",
+                    self.conversation_id,
+                    self.request_id,
+                    DeltaData(**delta._asdict()).model_dump(),
+                )
+                self.assertEqual(self.encoder.encode("delta", delta), expected)
+
+    def test_other_events_match_model_dump_json(self):
+        tool = ToolData(
+            tool_name="evidence_conclusion",
+            tool_output={"evidence_list": [{"file_name": "CT.jpg", "size": 1.5, "ok": True}]},
+        ).model_dump()
+        final = FinalData(result_type="text", text="祝您早日康复！").model_dump()
+        tool_calls = Delta(tool_calls=[{"name": "search", "arguments": "{}"}])
+        cases = [
+            ("start", None),
+            ("tool", tool),
+            ("final", final),
+            ("error", None),
+            ("delta", tool_calls),
+        ]
+        for event, data in cases:
+            expected_data = data._asdict() if isinstance(data, Delta) else data
+            self.assertEqual(
+                self.encoder.encode(event, data),
+                _model_frame(event, self.conversation_id, self.request_id, expected_data),
+            )
+
+
+async def _scripted(steps):
+    # 按脚本产生事件：(等待秒数, 事件类型, 数据)；数据为异常时抛出
+    for delay, event, data in steps:
+        if delay:
+            await asyncio.sleep(delay)
+        if isinstance(data, Exception):
+            raise data
+        yield event, data
+
+
+async def _collect(events):
+    out = []
+    try:
+        async for event, data in events:
+            out.append((event, data))
+    except Exception as e:
+        out.append(("raised", str(e)))
+    return out
+
+
+class CoalesceTests(unittest.TestCase):
+    def test_merges_deltas_and_flushes_before_other_events(self):
+        steps = [
+            (0, "delta", Delta(thinking_content="先")),
+            (0, "delta", Delta(thinking_content="想")),
+            (0, "delta", Delta(content="\n1. ")),
+            (0, "delta", Delta(content="及时就医。")),
+            (0, "tool", {"tool_name": "evidence_conclusion"}),
+            (0, "delta", Delta(content="祝您")),
+            (0, "final", {"result_type": "text"}),
+        ]
+        out = asyncio.run(_collect(coalesce_deltas(_scripted(steps), window=1.0)))
+        self.assertEqual(
+            out,
+            [
+                ("delta", Delta(content="\n1. 及时就医。", thinking_content="先想")),
+                ("tool", {"tool_name": "evidence_conclusion"}),
+                ("delta", Delta(content="祝您")),
+                ("final", {"result_type": "text"}),
+            ],
+        )
+
+    def test_window_bounds_latency(self):
+        # 上游停顿超过窗口：不等下一个事件，窗口到期即发送
+        steps = [
+            (0, "delta", Delta(content="a")),
+            (0, "delta", Delta(content="b")),
+            (0.3, "delta", Delta(content="c")),
+        ]
+
+        async def run():
+            times = []
+            start = time.monotonic()
+            async for event, data in coalesce_deltas(_scripted(steps), window=0.05):
+                times.append((data.content, time.monotonic() - start))
+            return times
+
+        times = asyncio.run(run())
+        self.assertEqual([content for content, _ in times], ["ab", "c"])
+        self.assertLess(times[0][1], 0.2)
+
+    def test_byte_budget_and_error_flush(self):
+        steps = [
+            (0, "delta", Delta(content="一二")),  # 6 字节
+            (0, "delta", Delta(content="三")),
+            (0, "delta", Delta(content="四")),
+            (0, "delta", RuntimeError("upstream failed")),
+        ]
+        out = asyncio.run(_collect(coalesce_deltas(_scripted(steps), window=1.0, max_bytes=8)))
+        self.assertEqual(
+            out,
+            [
+                ("delta", Delta(content="一二三")),
+                ("delta", Delta(content="四")),
+                ("raised", "upstream failed"),
+            ],
+        )
+
+    def test_options_precedence(self):
+        base = dict(
+            user_input="你好", conversation_id="c", model_id=1, prompt_id=1, user_role="patient"
+        )
+        scenarios = {"mobile": {"window_ms": 80, "max_bytes": 2048}}
+        with mock.patch("app.services.chat.settings") as settings:
+            settings.chat_coalesce_scenarios = scenarios
+            settings.chat_coalesce_window_ms = 0
+            settings.chat_coalesce_max_bytes = 0
+            self.assertEqual(_coalesce_options(ChatRequest(business_scenario="web", **base)), (0, 0))
+            self.assertEqual(
+                _coalesce_options(ChatRequest(business_scenario="mobile", **base)), (0.08, 2048)
+            )
+            request = ChatRequest(business_scenario="mobile", coalesce_window_ms=0, **base)
+            self.assertEqual(_coalesce_options(request), (0, 2048))
+
+
+class KeepaliveTests(unittest.TestCase):
+    def test_ping_when_idle(self):
+        async def frames():
+            yield "a"
+            await asyncio.sleep(0.25)
+            yield "b"
+
+        async def run():
+            return [frame async for frame in keepalive(frames(), lambda: "ping", interval=0.1)]
+
+        out = asyncio.run(run())
+        self.assertEqual(out[0], "a")
+        self.assertEqual(out[-1], "b")
+        self.assertEqual(out[1:-1], ["ping", "ping"])
+
+    def test_disconnect_cancels_upstream(self):
+        state = {"frames": 0, "cancelled": False, "checks": 0}
+
+        async def frames():
+            try:
+                while True:
+                    state["frames"] += 1
+                    yield "delta"
+                    # 模拟等待上游模型输出
+                    await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                state["cancelled"] = True
+                raise
+
+        async def is_disconnected():
+            state["checks"] += 1
+            return state["checks"] >= 2
+
+        async def run():
+            start = time.monotonic()
+            out = [
+                frame
+                async for frame in keepalive(
+                    frames(), lambda: "ping", interval=0, is_disconnected=is_disconnected, poll_interval=0.05
+                )
+            ]
+            return out, time.monotonic() - start
+
+        out, elapsed = asyncio.run(run())
+        self.assertEqual(out, ["delta"])
+        self.assertLess(elapsed, 1)
+        self.assertTrue(state["cancelled"])
+        self.assertEqual(state["frames"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()